@@ -0,0 +1,157 @@
+"""
+In-process LRU and a response cache keyed on model version stamps.
+
+``cache_response`` includes the version stamps (see ``core.versions``) of
+the models a view reads in its cache key, so a write makes every dependent
+entry unreachable without having to find and delete it. Cached responses
+live in two tiers: a small per-process LRU and the shared Django cache.
+A local hit reads nothing from the shared cache when the version stamps
+are still held locally (``VERSION_LOCAL_TTL``); otherwise one round trip
+to the shared cache reads them. Stacked on ``conditional``, the stamps that
+decorator read for the request are reused.
+"""
+
+import functools
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .versions import request_versions
+
+
+class LocalCache:
+    """Thread-safe LRU of finished outcomes with a short time to live."""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry[1]
+
+    def set(self, cache_key, value):
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+####
+#  Response cache
+####
+
+local_responses = LocalCache(
+    max_entries=getattr(settings, "RESPONSE_CACHE_LOCAL_SIZE", 512),
+    ttl=getattr(settings, "RESPONSE_CACHE_LOCAL_TTL", 60),
+)
+
+
+class CacheStats:
+    """Per-view hit/miss counters of this process."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, outcome):
+        with self._lock:
+            self._counts[(name, outcome)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        views = {}
+        for (name, outcome), count in counts.items():
+            views.setdefault(name, {"local_hit": 0, "hit": 0, "miss": 0})
+            views[name][outcome] = count
+        return {"local_entries": len(local_responses), "views": views}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+response_cache_stats = CacheStats()
+
+
+def response_key(request, versions):
+    """Path, sorted query parameters and the model versions read."""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    stamps = ".".join(str(version) for version in versions)
+    digest = hashlib.sha1(f"{request.path}?{query}".encode()).hexdigest()
+    return f"response:{digest}:{stamps}"
+
+
+def cache_response(*models, timeout=None):
+    """
+    Cache the data of successful ``GET`` responses of a ViewSet action for
+    ``timeout`` seconds (``RESPONSE_CACHE_TIMEOUT``), keyed on the request
+    and the versions of ``models``. The ``X-Cache`` header reports
+    ``LOCAL-HIT``, ``HIT`` or ``MISS``.
+    """
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view_method(self, request, *args, **kwargs)
+
+            name = f"{type(self).__name__}.{view_method.__name__}"
+            key = response_key(request, request_versions(request, *models))
+
+            data = local_responses.get(key)
+            if data is not None:
+                response_cache_stats.record(name, "local_hit")
+                return _cached(data, "LOCAL-HIT")
+
+            data = cache.get(key)
+            if data is not None:
+                response_cache_stats.record(name, "hit")
+                local_responses.set(key, data)
+                return _cached(data, "HIT")
+
+            response_cache_stats.record(name, "miss")
+            response = view_method(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                cache.set(
+                    key,
+                    response.data,
+                    timeout or getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300),
+                )
+                local_responses.set(key, response.data)
+                response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _cached(data, outcome):
+    response = Response(data)
+    response["X-Cache"] = outcome
+    return response
@@ -0,0 +1,65 @@
+"""
+Conditional GET for list endpoints, validated by model version stamps.
+
+The ``ETag`` and ``Last-Modified`` of a response are derived from the
+version stamps (see ``core.versions``) of the models the view reads, not
+from the rendered body, so ``If-None-Match``/``If-Modified-Since`` are
+answered with ``304 Not Modified`` before any query or serialization runs.
+"""
+
+import functools
+import hashlib
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .versions import request_versions
+
+
+def validators(request, versions):
+    """``(etag, last_modified)`` for ``request`` at the given model versions."""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    media_type = getattr(request, "accepted_media_type", "")
+    stamps = ".".join(str(version) for version in versions)
+    digest = hashlib.sha1(
+        f"{request.path}?{query}|{media_type}|{stamps}".encode()
+    ).hexdigest()
+    # Stamps are nanoseconds; HTTP dates have a one second resolution
+    return f"W/{quote_etag(digest)}", max(versions) // 10**9
+
+
+def conditional(*models):
+    """
+    Emit ``ETag``/``Last-Modified`` on successful ``GET`` responses of a
+    ViewSet action and answer matching conditional requests with a 304
+    without running the action. ``models`` are every model it reads.
+    """
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view_method(self, request, *args, **kwargs)
+
+            etag, last_modified = validators(
+                request, request_versions(request, *models)
+            )
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                # A 304 carries the validators the 200 would have
+                not_modified["ETag"] = etag
+                not_modified["Last-Modified"] = http_date(last_modified)
+                return not_modified
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response.setdefault("ETag", etag)
+                response.setdefault("Last-Modified", http_date(last_modified))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,287 @@
+"""
+Query parameter filters restricted to indexed fields, with a cost guard.
+
+A view declares the filters it accepts::
+
+    filter_fields = {"price": ["gte", "lte", "range"], "category": ["exact", "in"]}
+    residual_filter_fields = ["is_active"]
+
+and ``IndexedFilterBackend`` compiles ``?price__gte=10&category__in=1,2``
+into one ``filter()`` call. ``field=value`` is ``exact``; ``in`` and
+``range`` take comma separated values. Sorting is left to the paginator's
+``ordering`` (``KeysetPagination`` only sorts on indexed keys).
+
+Every lookup in ``filter_fields`` must be one an index of the model serves
+(``index_lookups``); the declaration is checked the first time a view is
+used and a lookup without an index is ``ImproperlyConfigured``.
+``residual_filter_fields`` are flags like ``is_active``: a few large groups
+no index pays off for, so they only narrow what an indexed predicate found
+(``exact`` only, never on their own).
+
+Each request passes a cost guard before the query runs: parameters that are
+not declared filters (nor the paginator's or the view's
+``reserved_query_params``) are rejected, ``in`` lists are capped
+(``QUERY_FILTER_MAX_IN``), filtering needs at least one indexed predicate
+and, on PostgreSQL, the planner must not pick a sequential scan of a
+large table for filters it expects to match a large share of it
+(``QUERY_FILTER_PLAN_CHECK``, ``QUERY_FILTER_SCAN_MIN_ROWS``,
+``QUERY_FILTER_SCAN_SHARE``).
+"""
+
+import datetime
+import functools
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.indexes import OpClass
+from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .pagination import estimate_count, query_plan
+
+# Lookups a B-tree index on the field serves
+BTREE_LOOKUPS = {"exact", "in", "gt", "gte", "lt", "lte", "range"}
+# Lookups served by an operator class on the field (or UPPER(field))
+OPCLASS_LOOKUPS = {
+    "text_pattern_ops": {"startswith"},
+    "varchar_pattern_ops": {"startswith"},
+    "gin_trgm_ops": {"contains", "startswith"},
+}
+UPPER_LOOKUPS = {"startswith": "istartswith", "contains": "icontains"}
+
+# Query parameters of the paginators, never filters
+PAGINATOR_PARAMS = (
+    "cursor_query_param",
+    "ordering_query_param",
+    "page_query_param",
+    "page_size_query_param",
+)
+
+
+@functools.cache
+def index_lookups(model):
+    """
+    ``{field name: lookups}`` that the indexes of ``model`` can serve:
+    the comparisons on the leading column of a B-tree index (primary
+    keys, unique fields, foreign keys, ``Meta.indexes``) and the pattern
+    lookups of ``*_pattern_ops``/``gin_trgm_ops`` indexes, on the column or
+    on ``UPPER(column)`` for the case-insensitive ones. Partial indexes
+    only serve queries repeating their condition, so they do not count.
+    """
+    lookups = defaultdict(set)
+    meta = model._meta
+    for field in meta.concrete_fields:
+        if field.primary_key or field.unique or field.db_index:
+            lookups[field.name] |= BTREE_LOOKUPS
+    for fields in meta.unique_together:
+        lookups[fields[0]] |= BTREE_LOOKUPS
+    for constraint in meta.total_unique_constraints:
+        lookups[constraint.fields[0]] |= BTREE_LOOKUPS
+
+    for index in meta.indexes:
+        if index.condition is not None:
+            continue
+        if index.fields:
+            name = index.fields[0].lstrip("-")
+            if index.opclasses:
+                # Pattern operator classes keep equality, not ordering
+                lookups[name] |= {"exact", *OPCLASS_LOOKUPS.get(index.opclasses[0], ())}
+            elif type(index) is models.Index:
+                lookups[name] |= BTREE_LOOKUPS
+            continue
+        expression = index.expressions[0]
+        if not isinstance(expression, OpClass):
+            continue
+        (source,) = expression.get_source_expressions()
+        if isinstance(source, Upper):
+            (column,) = source.get_source_expressions()
+            for lookup in OPCLASS_LOOKUPS.get(expression.extra["name"], ()):
+                lookups[column.name].add(UPPER_LOOKUPS[lookup])
+    return dict(lookups)
+
+
+class IndexedFilterBackend(BaseFilterBackend):
+    """Filters from the view's ``filter_fields``/``residual_filter_fields``."""
+
+    scan_message = (
+        "These filters match too much of the table to be served from an "
+        "index; add a narrower filter."
+    )
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_query_filters(request, queryset, view)
+        if not filters:
+            return queryset
+        queryset = queryset.filter(**filters)
+        if getattr(settings, "QUERY_FILTER_PLAN_CHECK", True) and self.scans_table(
+            queryset
+        ):
+            raise ValidationError({"filters": [self.scan_message]})
+        return queryset
+
+    def get_query_filters(self, request, queryset, view):
+        """
+        The ``filter()`` keyword arguments of the request's query
+        parameters, validated but not yet checked against the plan.
+        """
+        model = queryset.model
+        allowed = self.get_filters(view, model)
+        reserved = {"format", *getattr(view, "reserved_query_params", ())} | {
+            getattr(view.paginator, attr)
+            for attr in PAGINATOR_PARAMS
+            if getattr(view.paginator, attr, None)
+        }
+
+        filters, errors = {}, {}
+        for param in request.query_params:
+            if param in reserved:
+                continue
+            name, _, lookup = param.partition("__")
+            lookup = lookup or "exact"
+            if lookup not in allowed.get(name, ()):
+                errors[param] = [self.unknown_message(allowed)]
+                continue
+            try:
+                filters[f"{name}__{lookup}"] = self.parse(
+                    model._meta.get_field(name), lookup, request.query_params[param]
+                )
+            except (DjangoValidationError, ValueError) as error:
+                messages = getattr(error, "messages", None) or [str(error)]
+                errors[param] = messages
+        if errors:
+            raise ValidationError(errors)
+
+        residual = set(getattr(view, "residual_filter_fields", ()))
+        if filters and all(key.partition("__")[0] in residual for key in filters):
+            raise ValidationError(
+                {
+                    "filters": [
+                        f"Filtering on {', '.join(sorted(residual))} needs "
+                        "another filter as well."
+                    ]
+                }
+            )
+        return filters
+
+    def get_filters(self, view, model):
+        """``{field: lookups}`` accepted by ``view``, checked against the indexes."""
+        return _checked_filters(
+            model,
+            tuple(
+                (name, tuple(lookups))
+                for name, lookups in getattr(view, "filter_fields", {}).items()
+            ),
+            tuple(getattr(view, "residual_filter_fields", ())),
+        )
+
+    def unknown_message(self, allowed):
+        params = sorted(
+            name if lookup == "exact" else f"{name}__{lookup}"
+            for name, lookups in allowed.items()
+            for lookup in lookups
+        )
+        return f"Not a filter. Filters: {', '.join(params)}."
+
+    def parse(self, field, lookup, raw):
+        """The value of ``field__lookup`` from the query parameter ``raw``."""
+        if lookup == "in":
+            values = [value for value in raw.split(",") if value]
+            limit = getattr(settings, "QUERY_FILTER_MAX_IN", 100)
+            if not values or len(values) > limit:
+                raise ValueError(f"Give 1 to {limit} comma separated values.")
+            return [self.to_python(field, value) for value in values]
+        if lookup == "range":
+            values = raw.split(",")
+            if len(values) != 2:
+                raise ValueError("Give two comma separated values: lower,upper.")
+            return tuple(self.to_python(field, value) for value in values)
+        if lookup in ("startswith", "istartswith", "contains", "icontains"):
+            if not raw:
+                raise ValueError("This field may not be blank.")
+            return raw
+        return self.to_python(field, raw)
+
+    def to_python(self, field, raw):
+        if field.is_relation:
+            field = field.target_field
+        if isinstance(field, models.BooleanField):
+            if raw.lower() in ("true", "1"):
+                return True
+            if raw.lower() in ("false", "0"):
+                return False
+            raise ValueError("Must be true or false.")
+        value = field.to_python(raw)
+        if (
+            isinstance(value, datetime.datetime)
+            and settings.USE_TZ
+            and timezone.is_naive(value)
+        ):
+            value = timezone.make_aware(value)
+        return value
+
+    def scans_table(self, queryset):
+        """
+        Whether PostgreSQL would read the whole table for ``queryset``
+        because the filters match much of it: a sequential scan whose row
+        estimate is at least ``QUERY_FILTER_SCAN_SHARE`` of the table's
+        rows (``pg_class.reltuples``). Tables under
+        ``QUERY_FILTER_SCAN_MIN_ROWS`` rows are cheap to scan and pass.
+        """
+        plan = query_plan(queryset.order_by())
+        table = queryset.model._meta.db_table
+        scans, nodes = [], [plan] if plan else []
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"].endswith("Seq Scan") and (
+                node.get("Relation Name") == table
+            ):
+                scans.append(node)
+            nodes.extend(node.get("Plans", ()))
+        if not scans:
+            return False
+        rows = estimate_count(queryset.model._base_manager.using(queryset.db).all())
+        if rows < getattr(settings, "QUERY_FILTER_SCAN_MIN_ROWS", 10_000):
+            return False
+        share = getattr(settings, "QUERY_FILTER_SCAN_SHARE", 0.5)
+        return any(node["Plan Rows"] >= share * rows for node in scans)
+
+    def get_schema_operation_parameters(self, view):
+        model = view.get_queryset().model
+        return [
+            {
+                "name": name if lookup == "exact" else f"{name}__{lookup}",
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Comma separated values"
+                    if lookup in ("in", "range")
+                    else f"{lookup} filter on {name}"
+                ),
+                "schema": {"type": "string"},
+            }
+            for name, lookups in self.get_filters(view, model).items()
+            for lookup in lookups
+        ]
+
+
+@functools.cache
+def _checked_filters(model, filter_fields, residual_fields):
+    indexed = index_lookups(model)
+    filters = {}
+    for name, lookups in filter_fields:
+        missing = set(lookups) - indexed.get(name, set())
+        if missing:
+            raise ImproperlyConfigured(
+                f"No index of {model.__name__} serves the "
+                f"{', '.join(sorted(missing))} lookups on {name!r}."
+            )
+        filters[name] = lookups
+    for name in residual_fields:
+        model._meta.get_field(name)
+        filters[name] = ("exact",)
+    return filters
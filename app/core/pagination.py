@@ -0,0 +1,446 @@
+"""
+Shared pagination classes for the module viewsets.
+"""
+
+import base64
+import binascii
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.encoding import force_str
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+####
+#  Page numbers with cheap counts
+####
+
+
+def query_plan(queryset):
+    """
+    The root node of the PostgreSQL ``EXPLAIN (FORMAT JSON)`` plan of
+    ``queryset`` (planned, not run); ``None`` on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def estimate_count(queryset):
+    """
+    Planner estimate of ``queryset.count()`` on PostgreSQL, ``None``
+    elsewhere. Unfiltered tables use ``pg_class.reltuples``; anything else
+    the row estimate of ``EXPLAIN``. Neither reads the table.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    queryset = queryset.order_by()
+    if not queryset.query.where and not queryset.query.distinct:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:  # -1: never analyzed
+            return row[0]
+    return int(query_plan(queryset)["Plan Rows"])
+
+
+def cached_count(queryset, ttl):
+    """Exact ``COUNT(*)`` shared for ``ttl`` seconds by identical queries."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f"{queryset.db}:{sql}:{params!r}".encode()).hexdigest()
+    return cache.get_or_set(f"pagination-count:{digest}", queryset.count, ttl)
+
+
+class CountStrategyPage(Page):
+    """A page that knows whether another one follows without a total."""
+
+    has_more = None
+
+    def has_next(self):
+        if self.has_more is None:
+            return super().has_next()
+        return self.has_more
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    ``Paginator`` whose ``count`` is a planner estimate above
+    ``estimate_threshold`` rows and a cached exact count below it.
+
+    Neither is exact for the request at hand, so ``count`` is only
+    reported and never bounds the page numbers: a page is one ``LIMIT
+    per_page + 1`` query, whether another page follows comes from the
+    extra row, and a page is only missing when it is empty. Rows added
+    since a count was cached are still listed.
+    """
+
+    def __init__(self, *args, estimate_threshold, cache_ttl, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimate_threshold = estimate_threshold
+        self.cache_ttl = cache_ttl
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            self.estimated = True
+            return estimate
+        return cached_count(self.object_list, self.cache_ttl)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        page = self._get_page(rows[: self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return CountStrategyPage(*args, **kwargs)
+
+
+class CountStrategyPagination(pagination.PageNumberPagination):
+    """
+    ``PageNumberPagination`` that stops paying for ``COUNT(*)`` on large
+    lists: above ``count_estimate_threshold`` rows the total comes from the
+    planner, below it the exact count is cached for ``count_cache_ttl``
+    seconds. ``count_is_estimate`` in the response tells which one it is:
+    clients should present an estimated ``count`` as approximate.
+    """
+
+    count_estimate_threshold = getattr(
+        settings, "PAGINATION_COUNT_ESTIMATE_THRESHOLD", 100_000
+    )
+    count_cache_ttl = getattr(settings, "PAGINATION_COUNT_CACHE_TTL", 30)
+
+    @property
+    def django_paginator_class(self):
+        return functools.partial(
+            CountStrategyPaginator,
+            estimate_threshold=self.count_estimate_threshold,
+            cache_ttl=self.count_cache_ttl,
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.page.paginator.count,
+                "count_is_estimate": self.page.paginator.estimated,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"]["description"] = (
+            "Total number of results; a planner estimate when count_is_estimate "
+            "is true."
+        )
+        response_schema["properties"]["count_is_estimate"] = {
+            "type": "boolean",
+            "description": "Whether count is an approximate planner estimate "
+            "rather than an exact (possibly cached) count.",
+        }
+        response_schema["required"] = [
+            *response_schema.get("required", []),
+            "count_is_estimate",
+        ]
+        return response_schema
+
+
+####
+#  Keyset
+####
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Keyset ("seek") pagination over a composite, indexed sort key.
+
+    Instead of ``COUNT(*)`` plus ``OFFSET n``, each page is one query of the
+    form ``WHERE (price, id) > (last_price, last_id) ORDER BY price, id
+    LIMIT page_size + 1``, which costs the same on page 1 and page 10,000
+    when an index on the sort key exists. There is no total count.
+
+    ``orderings`` maps the values accepted in ``?ordering=`` to the sort
+    key. The last field of every key must be unique (normally ``id``) and
+    no field may be nullable. Cursors are opaque base64 tokens holding the
+    key of the row on either side of the page.
+
+    Subclass and override ``orderings``/``default_ordering`` per endpoint.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+    }
+    default_ordering = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering_name = self.get_ordering_name(request)
+        self.ordering = self.orderings[self.ordering_name]
+        fields = [
+            queryset.model._meta.get_field(name.lstrip("-")) for name in self.ordering
+        ]
+
+        position, reverse = self.decode_cursor(request, fields)
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        # One extra row tells whether there is a further page
+        results = self.fetch(queryset, ordering, position, self.page_size + 1)
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.first_key = self.key(results[0]) if results else None
+        self.last_key = self.key(results[-1]) if results else None
+        if not results and position is not None:
+            # Ran off either end: link back to where the cursor pointed
+            self.first_key = self.last_key = position
+            self.has_next, self.has_previous = reverse, not reverse
+        return results
+
+    def fetch(self, queryset, ordering, position, limit):
+        """Up to ``limit`` rows of ``queryset`` after ``position`` in ``ordering``."""
+        return list(seek(queryset, ordering, position)[:limit])
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return pagination._positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering_name(self, request):
+        name = request.query_params.get(self.ordering_query_param)
+        if name is None:
+            return self.default_ordering
+        if name not in self.orderings:
+            raise ValidationError(
+                {
+                    self.ordering_query_param: (
+                        f"Must be one of: {', '.join(self.orderings)}."
+                    )
+                }
+            )
+        return name
+
+    def key(self, item):
+        """The sort key of one result row (a model instance or a dict)."""
+        return row_key(item, self.ordering)
+
+    ####
+    #  Cursors
+    ####
+
+    def encode_cursor(self, key, reverse):
+        payload = {"o": self.ordering_name, "k": key}
+        if reverse:
+            payload["r"] = 1
+        token = json.dumps(payload, separators=(",", ":"), default=force_str)
+        cursor = base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, fields):
+        """Return ``(key, reverse)``; ``(None, False)`` without a cursor."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            payload = json.loads(token)
+            if payload["o"] != self.ordering_name or len(payload["k"]) != len(fields):
+                raise ValueError
+            key = [field.to_python(value) for field, value in zip(fields, payload["k"])]
+            if any(value is None for value in key):
+                raise ValueError
+        except (
+            binascii.Error,
+            DjangoValidationError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return key, bool(payload.get("r"))
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_key is None:
+            return None
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    ####
+    #  Response and schema
+    ####
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque cursor from a previous response's links",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.ordering_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Sort key",
+                "schema": {"type": "string", "enum": list(self.orderings)},
+            },
+        ]
+        if self.page_size_query_param:
+            parameters.append(
+                {
+                    "name": self.page_size_query_param,
+                    "required": False,
+                    "in": "query",
+                    "description": "Number of results to return per page",
+                    "schema": {"type": "integer"},
+                }
+            )
+        return parameters
+
+
+####
+#  Seeking and walking
+####
+
+
+def row_key(row, ordering):
+    """The values of the ``ordering`` fields of a model instance or dict."""
+    names = [name.lstrip("-") for name in ordering]
+    if isinstance(row, dict):
+        return [row[name] for name in names]
+    return [getattr(row, name) for name in names]
+
+
+def seek(queryset, ordering, after=None):
+    """
+    ``queryset`` sorted by ``ordering``, starting strictly after the key
+    ``after`` (a value per ordering field) if given. Slice it for the next
+    ``n`` rows: with an index on the sort key, ``seek(qs, key, k)[:n]``
+    costs the same wherever ``k`` is, where ``qs[offset:offset + n]`` reads
+    and discards ``offset`` rows first. The same rules as for
+    ``KeysetPagination.orderings`` apply to ``ordering``.
+    """
+    queryset = queryset.order_by(*ordering)
+    if after is not None:
+        queryset = queryset.filter(_seek(ordering, after))
+    return queryset
+
+
+def keyset_chunks(queryset, ordering, size, after=None):
+    """
+    Lists of up to ``size`` rows covering ``queryset`` in ``ordering``
+    (after the key ``after``), one ``seek()`` query each: a full walk reads
+    every row once, however large the table. Rows may be instances or
+    ``values()`` dicts holding the ordering fields. Each chunk is its own
+    query, so a walk sees rows written meanwhile ahead of its position.
+    """
+    while True:
+        chunk = list(seek(queryset, ordering, after)[:size])
+        if chunk:
+            yield chunk
+        if len(chunk) < size:
+            return
+        after = row_key(chunk[-1], ordering)
+
+
+def _reverse_ordering(ordering):
+    return tuple(name[1:] if name.startswith("-") else f"-{name}" for name in ordering)
+
+
+def _seek(ordering, key):
+    """
+    Rows strictly after ``key`` in ``ordering``: the expanded form of the
+    row comparison ``(a, b) > (x, y)``, which also handles mixed sort
+    directions. The leading ``a >= x`` lets the planner range-scan the index.
+    """
+    lookups = [
+        (name.lstrip("-"), "lt" if name.startswith("-") else "gt") for name in ordering
+    ]
+    after = None
+    for (name, op), value in reversed(list(zip(lookups, key))):
+        step = Q(**{f"{name}__{op}": value})
+        after = step if after is None else step | (Q(**{name: value}) & after)
+    first, op = lookups[0]
+    return Q(**{f"{first}__{op}e": key[0]}) & after
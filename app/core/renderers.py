@@ -0,0 +1,34 @@
+"""
+Content negotiation between the nested and the normalized output of a view.
+
+``NormalizedJSONRenderer`` renders plain JSON under its own media type, so
+``Accept: application/vnd.normalized+json`` (or ``?format=normalized``)
+selects it; views with ``NormalizedResponseMixin`` check ``normalized`` to
+build the side-loaded shape (``core.serializers.normalized``) instead of the
+nested one. Responses vary on ``Accept``.
+"""
+
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+
+class NormalizedJSONRenderer(JSONRenderer):
+    media_type = "application/vnd.normalized+json"
+    format = "normalized"
+
+
+class NormalizedResponseMixin:
+    """Offer ``NormalizedJSONRenderer`` after the default renderers."""
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NormalizedJSONRenderer]
+
+    @property
+    def normalized(self):
+        renderer = getattr(self.request, "accepted_renderer", None)
+        return isinstance(renderer, NormalizedJSONRenderer)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ["Accept"])
+        return response
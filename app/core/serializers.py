@@ -0,0 +1,317 @@
+"""
+Read-only serializers compiled to flat row-to-dict functions.
+
+``ModelSerializer(many=True).data`` walks every field of every instance
+through DRF's field machinery (``get_attribute``, ``to_representation``,
+``ReturnDict``), which dominates the request on lists of thousands of rows.
+``compiled(SerializerClass)`` reads the field definitions once, works out
+the ``values_list()`` columns they need (following forward and reverse
+one-to-one/foreign key joins of nested serializers) and builds the list of
+``(key, getter)`` pairs of the output dict once: an ``itemgetter`` of the
+row column, wrapped in the field's ``to_representation`` where the value
+needs converting. A row's dict has the same keys, order and representations
+as the serializer's.
+
+``serialize_groups`` evaluates several named predicates over one queryset
+in a single query, serializing every row once whatever the number of
+groups it falls in.
+
+``normalized(SerializerClass)`` gives the side-loaded form of a serializer
+with nested objects: rows hold the pks of related objects, which are
+serialized once each in keyed collections next to the rows.
+
+Only what can be read from columns compiles: plain model fields,
+``PrimaryKeyRelatedField`` and nested single-object serializers. Method
+fields, ``many=True`` nesting and non-field sources raise
+``ImproperlyConfigured`` when compiling, not per request.
+"""
+
+import functools
+import operator
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import BooleanField, ExpressionWrapper, QuerySet
+from rest_framework import serializers
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+)
+
+
+class CompiledSerializer:
+    """
+    ``serialize(rows)`` turns a queryset (or ``values_list(*columns)``
+    tuples) into the list ``serializer_class(rows, many=True).data`` would
+    produce; ``to_dict``/``from_values`` build the dict of one tuple or one
+    ``values(*columns)`` dict.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.columns = []
+        plan = self._compile(serializer_class(), serializer_class.Meta.model, "")
+        self.columns = tuple(self.columns)
+        self.to_dict = _builder(plan, lambda index: index)
+        self.from_values = _builder(plan, self.columns.__getitem__)
+
+    def serialize(self, rows):
+        if isinstance(rows, QuerySet):
+            rows = rows.values_list(*self.columns)
+        to_dict = self.to_dict
+        return [to_dict(row) for row in rows]
+
+    def serialize_groups(self, queryset, groups):
+        """
+        ``{name: serialize(queryset.filter(predicate))}`` for the ``Q``
+        predicates in ``groups``, from one query: the rows matching any
+        predicate are read once, with a flag column per predicate, and the
+        groups share the dict of a row they have in common. Predicates must
+        not span to-many relations, whose joins would repeat rows.
+        """
+        if not groups:
+            return {}
+        flags = {
+            f"_group_{i}": ExpressionWrapper(predicate, output_field=BooleanField())
+            for i, predicate in enumerate(groups.values())
+        }
+        rows = (
+            queryset.filter(functools.reduce(operator.or_, groups.values()))
+            .annotate(**flags)
+            .values_list(*self.columns, *flags)
+        )
+        data = {name: [] for name in groups}
+        members = list(data.values())
+        width, to_dict = len(self.columns), self.to_dict
+        for row in rows:
+            item = to_dict(row)
+            for group, flag in zip(members, row[width:]):
+                if flag:
+                    group.append(item)
+        return data
+
+    def _column(self, lookup):
+        """Index of ``lookup`` in the columns, added if needed."""
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        return self.columns.index(lookup)
+
+    def _compile(self, serializer, model, prefix):
+        """
+        ``(name, column, to_representation, nested plan)`` of each output
+        key. ``column`` of a nested serializer is its pk column when the
+        relation can be missing, None otherwise.
+        """
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            lookup, target, nullable = self._resolve(serializer, field, model)
+            if isinstance(field, serializers.BaseSerializer):
+                if isinstance(field, serializers.ListSerializer):
+                    self._unsupported(
+                        serializer, name, "many=True nesting is not supported"
+                    )
+                nested = self._compile(field, target, f"{prefix}{lookup}__")
+                pk = self._column(f"{prefix}{lookup}__pk") if nullable else None
+                plan.append((name, pk, None, nested))
+                continue
+
+            column = self._column(f"{prefix}{lookup}")
+            if isinstance(field, PASSTHROUGH_FIELDS) or (
+                isinstance(field, serializers.PrimaryKeyRelatedField)
+                and field.pk_field is None
+            ):
+                plan.append((name, column, None, None))
+            else:
+                plan.append((name, column, field.to_representation, None))
+        return plan
+
+    def _resolve(self, serializer, field, model):
+        """
+        ``(lookup, model at the end of it, whether it can be NULL)`` for the
+        source of ``field`` on ``model``.
+        """
+        if field.source == "*" or isinstance(
+            field, (serializers.SerializerMethodField, serializers.HiddenField)
+        ):
+            self._unsupported(
+                serializer, field.field_name, "only model field sources are supported"
+            )
+        nullable = False
+        for attr in field.source_attrs:
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                self._unsupported(
+                    serializer,
+                    field.field_name,
+                    f"{attr!r} is not a field of {model.__name__}",
+                )
+            if model_field.many_to_many or model_field.one_to_many:
+                self._unsupported(
+                    serializer, field.field_name, "to-many relations are not supported"
+                )
+            # Reverse one-to-one relations have no column to be NOT NULL
+            nullable = nullable or model_field.null or not model_field.concrete
+            if model_field.is_relation:
+                model = model_field.related_model
+        return "__".join(field.source_attrs), model, nullable
+
+    def _unsupported(self, serializer, name, reason):
+        raise ImproperlyConfigured(
+            f"Cannot compile {type(serializer).__name__}.{name}: {reason}"
+        )
+
+
+def _builder(plan, key):
+    """
+    Function building the dict of ``plan`` from a row, whose value of
+    column ``index`` is ``row[key(index)]``.
+    """
+    getters = []
+    for name, column, convert, nested in plan:
+        get = None if column is None else operator.itemgetter(key(column))
+        if nested is not None:
+            get = _nested(get, _builder(nested, key))
+        elif convert is not None:
+            get = _converted(get, convert)
+        getters.append((name, get))
+
+    def to_dict(row):
+        return {name: get(row) for name, get in getters}
+
+    return to_dict
+
+
+def _converted(get, convert):
+    """``convert`` of the value of ``get``, keeping NULL as None."""
+
+    def value(row):
+        value = get(row)
+        return None if value is None else convert(value)
+
+    return value
+
+
+def _nested(pk, build):
+    """``build(row)``, or None where the ``pk`` getter finds no related row."""
+    if pk is None:
+        return build
+    return lambda row: None if pk(row) is None else build(row)
+
+
+@functools.cache
+def compiled(serializer_class):
+    """The ``CompiledSerializer`` of ``serializer_class``, built once."""
+    return CompiledSerializer(serializer_class)
+
+
+class NormalizedSerializer:
+    """
+    ``serialize(queryset)`` normalizes the output of ``serializer_class``.
+    Nested single-object serializers (foreign keys and one-to-one
+    relations) become the related object's pk in the rows. The related
+    objects are serialized once each into ``{pk: data}`` collections next
+    to ``results``::
+
+        {"results": [{"id": 1, "category": 5}, ...], "categories": {5: {...}}}
+
+    ``collections`` names the collection of each nested field by field
+    name; the default is the field name. ``many=True`` lists stay in their
+    rows, and their items are normalized the same way. Each collection is
+    one query, selecting the related objects of ``queryset`` by subquery.
+    Rows and collections go through ``compiled()`` serializers when they
+    compile.
+    """
+
+    def __init__(self, serializer_class, collections=None):
+        self.collections = collections or {}
+        # (collection, serializer class, its compiled form, lookup from a row)
+        self.side_loads = []
+        self.row_class = self._references(serializer_class, "")
+        self._rows = _compiled_or_none(self.row_class)
+
+    def serialize(self, queryset):
+        if self._rows is not None:
+            results = self._rows.serialize(queryset)
+        else:
+            results = self.row_class(queryset, many=True).data
+        data = {"results": results}
+        for collection, serializer_class, fast, lookup in self.side_loads:
+            related = serializer_class.Meta.model._base_manager.filter(
+                pk__in=queryset.order_by().values(lookup)
+            )
+            if fast is None:
+                items = {obj.pk: serializer_class(obj).data for obj in related}
+            else:
+                to_dict = fast.to_dict
+                items = {
+                    row[-1]: to_dict(row)
+                    for row in related.values_list(*fast.columns, "pk")
+                }
+            data.setdefault(collection, {}).update(items)
+        return data
+
+    def _references(self, serializer_class, prefix):
+        """``serializer_class`` with pks in place of its nested objects."""
+        model = serializer_class.Meta.model
+        declared = {}
+        for name, field in serializer_class().fields.items():
+            if not isinstance(field, serializers.BaseSerializer):
+                continue
+            lookup = prefix + _query_lookup(model, field.source_attrs)
+            source = {} if field.source == name else {"source": field.source}
+            if isinstance(field, serializers.ListSerializer):
+                child = self._references(type(field.child), f"{lookup}__")
+                declared[name] = child(many=True, read_only=True, **source)
+                continue
+            nested = type(field)
+            self.side_loads.append(
+                (
+                    self.collections.get(name, name),
+                    nested,
+                    _compiled_or_none(nested),
+                    lookup,
+                )
+            )
+            declared[name] = serializers.PrimaryKeyRelatedField(
+                read_only=True, **source
+            )
+        if not declared:
+            return serializer_class
+        return type(
+            f"Normalized{serializer_class.__name__}", (serializer_class,), declared
+        )
+
+
+def _query_lookup(model, attrs):
+    """The ORM lookup of the attribute path ``attrs`` (reverse accessors too)."""
+    names = []
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            field = next(
+                rel
+                for rel in model._meta.related_objects
+                if rel.get_accessor_name() == attr
+            )
+        names.append(field.name)
+        model = field.related_model
+    return "__".join(names)
+
+
+def _compiled_or_none(serializer_class):
+    try:
+        return compiled(serializer_class)
+    except ImproperlyConfigured:
+        return None
+
+
+@functools.cache
+def normalized(serializer_class, **collections):
+    """The ``NormalizedSerializer`` of ``serializer_class``, built once."""
+    return NormalizedSerializer(serializer_class, collections)
@@ -97,6 +97,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+
+# Model version stamps (core.versions) must be shared by every process, or
+# cached responses and ETags outlive writes made by other workers and
+# management commands; a per-process backend fails the system checks.
+# Create the table with "python manage.py createcachetable".
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+        "OPTIONS": {"MAX_ENTRIES": 50_000},
+    }
+}
+
+# Each process keeps the stamps it read this long (seconds) before reading
+# them from the shared cache again: writes of other processes are seen that
+# much later
+VERSION_LOCAL_TTL = 1
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -144,6 +165,66 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,  # Number of records per page
 }
 
+# Lists above this many rows report a planner estimate instead of COUNT(*);
+# exact counts below it are cached (seconds)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 100_000
+PAGINATION_COUNT_CACHE_TTL = 30
+
+# Versioned response cache: shared tier timeout and per-process LRU (seconds)
+RESPONSE_CACHE_TIMEOUT = 300
+RESPONSE_CACHE_LOCAL_SIZE = 512
+RESPONSE_CACHE_LOCAL_TTL = 60
+
+# Idempotency-Key support on module4 write endpoints (seconds)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+# How long a request may hold its key before a retry can take it over
+IDEMPOTENCY_LOCK_TIMEOUT = 5 * 60
+IDEMPOTENCY_LOCAL_CACHE_TTL = 60
+IDEMPOTENCY_LOCAL_CACHE_SIZE = 1024
+
+# Stock reservations: sub-counters per product and pending lifetime (seconds)
+STOCK_SHARDS = 8
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Lower edges of the product price histogram buckets; the last one is open.
+# Run rebuild_price_stats after changing them.
+PRICE_STATS_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000]
+
+# Product search: the in-process n-gram index, or pg_trgm on PostgreSQL
+# ("inventory.search.TrigramSearch"). When the n-gram index sees a product
+# write it did not follow, it re-reads the rows changed since its last poll,
+# reaching back LAG seconds for slow transactions; it is rebuilt in the
+# background every MAX_AGE seconds. PRELOAD builds it when a worker starts
+# instead of on first use.
+PRODUCT_SEARCH_BACKEND = "inventory.search.NgramSearch"
+PRODUCT_SEARCH_LAG = 5
+PRODUCT_SEARCH_MAX_AGE = 300
+PRODUCT_SEARCH_PRELOAD = False
+
+# Query parameter filters (core.filters): most values an "__in" filter takes,
+# and whether PostgreSQL's plan is checked for full table scans first. A scan
+# is rejected when the table has at least MIN_ROWS rows and the planner
+# expects the filters to match at least SHARE of them.
+QUERY_FILTER_MAX_IN = 100
+QUERY_FILTER_PLAN_CHECK = True
+QUERY_FILTER_SCAN_MIN_ROWS = 10_000
+QUERY_FILTER_SCAN_SHARE = 0.5
+
+# Facet counts of a filtered product set stay cached this long (seconds);
+# product writes switch to fresh counts at once (version stamps)
+FACET_CACHE_TIMEOUT = 300
+
+# In-memory columnar snapshot of the product filter columns (inventory.snapshot,
+# needs numpy): rows changed since the last poll are read when the product
+# version stamp moves, reaching back LAG seconds for slow transactions; the
+# whole snapshot is reloaded every MAX_AGE seconds
+PRODUCT_SNAPSHOT_ENABLED = False
+PRODUCT_SNAPSHOT_LAG = 5
+PRODUCT_SNAPSHOT_MAX_AGE = 300
+
+# Products per seek query of the catalog stream (module6 ProductStreamViewSet)
+PRODUCT_STREAM_CHUNK_SIZE = 1000
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Your Project API",
     "DESCRIPTION": "Your project description",
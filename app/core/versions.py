@@ -0,0 +1,164 @@
+"""
+Per-model version stamps in the shared Django cache.
+
+A tracked model's stamp is replaced whenever one of its rows changes:
+``post_save``/``post_delete`` for single objects and
+``VersionedQuerySetMixin`` for bulk writes, always once the transaction
+commits. Anything derived from a model's rows can be keyed (or validated)
+on its stamp instead of being invalidated explicitly.
+
+The stamps are only useful when every process sees the same ones, so the
+default cache must be shared: ``check_shared_cache`` fails the system
+checks on a local-memory or dummy backend. Reading them from the shared
+cache is a round trip (a query with ``DatabaseCache``), so each process
+keeps the stamps it read for ``VERSION_LOCAL_TTL`` seconds: writes of other
+processes are seen that much later, this process's own writes at once.
+``request_versions`` reads them once per request.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+
+VERSION_KEY = "model-version:{}"
+
+# Backends that do not share stamps between processes
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+class LocalStamps:
+    """The stamps this process read last, each kept for a short time."""
+
+    def __init__(self):
+        self._stamps = {}  # {key: (expires, stamp)}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            entries = {key: self._stamps.get(key) for key in keys}
+        return {
+            key: entry[1] for key, entry in entries.items() if entry and entry[0] > now
+        }
+
+    def set_many(self, stamps):
+        expires = time.monotonic() + getattr(settings, "VERSION_LOCAL_TTL", 1)
+        with self._lock:
+            self._stamps.update(
+                (key, (expires, stamp)) for key, stamp in stamps.items()
+            )
+
+    def clear(self):
+        with self._lock:
+            self._stamps.clear()
+
+
+local_stamps = LocalStamps()
+
+
+def model_versions(*models):
+    """
+    Current version stamps of ``models``: from this process's short-lived
+    copies, else in one shared cache round trip. A model without a stamp
+    (e.g. after eviction) gets a fresh one.
+    """
+    keys = [_version_key(model) for model in models]
+    stamps = local_stamps.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        shared = cache.get_many(missing)
+        for key in missing:
+            if key not in shared:
+                cache.add(key, time.time_ns(), None)
+                shared[key] = cache.get(key)
+        local_stamps.set_many(shared)
+        stamps.update(shared)
+    return tuple(stamps[key] for key in keys)
+
+
+def request_versions(request, *models):
+    """
+    ``model_versions(*models)`` read once per request, so the decorators of
+    one view (``conditional``, ``cache_response``) agree on them.
+    """
+    read = request.__dict__.setdefault("_model_versions", {})
+    if models not in read:
+        read[models] = model_versions(*models)
+    return read[models]
+
+
+def bump_version(model):
+    """Give ``model`` a new version stamp once the current transaction commits."""
+
+    def bump():
+        key, stamp = _version_key(model), time.time_ns()
+        cache.set(key, stamp, None)
+        local_stamps.set_many({key: stamp})
+
+    transaction.on_commit(bump)
+
+
+def _bump_sender(sender, **kwargs):
+    bump_version(sender)
+
+
+def track_versions(model):
+    """Bump the version of ``model`` on every ``post_save``/``post_delete``."""
+    uid = f"version-{model._meta.label_lower}"
+    post_save.connect(_bump_sender, sender=model, dispatch_uid=uid)
+    post_delete.connect(_bump_sender, sender=model, dispatch_uid=uid)
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """System check: the default cache must be shared by every process."""
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_BACKENDS:
+        return []
+    return [
+        checks.Error(
+            f"The default cache ({backend}) is not shared between processes.",
+            hint="Model version stamps bumped by other workers or management "
+            "commands would never be seen, so cached responses and ETags "
+            "would go stale. Configure a shared backend (e.g. DatabaseCache "
+            "or RedisCache) in CACHES.",
+            id="core.E001",
+        )
+    ]
+
+
+class VersionedQuerySetMixin:
+    """Bump the model version on bulk writes, which send no signals."""
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            bump_version(self.model)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            bump_version(self.model)
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        rows = super().bulk_update(objs, *args, **kwargs)
+        if rows:
+            bump_version(self.model)
+        return rows
+
+
+class VersionedQuerySet(VersionedQuerySetMixin, models.QuerySet):
+    pass
@@ -11,6 +11,13 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, "PRODUCT_SEARCH_PRELOAD", False):
+    from inventory.search import product_search
+
+    product_search().prepare()
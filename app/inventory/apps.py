@@ -4,3 +4,38 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from core.versions import check_shared_cache, track_versions
+        from django.core.checks import Tags, register
+
+        # Stamps must be shared by every process (fails on LocMemCache)
+        register(check_shared_cache, Tags.caches)
+
+        # Response caches and ETags are keyed on these version stamps
+        for name in (
+            "Category",
+            "Product",
+            "PromotionEvent",
+            "ProductPromotionEvent",
+            "StockManagement",
+            "Order",
+            "OrderProduct",
+        ):
+            track_versions(self.get_model(name))
+
+        from .summaries import track_products
+
+        # Price statistics and product counters follow product writes
+        track_products()
+
+        from .search import track_search
+
+        # The in-process search index follows single product writes
+        track_search()
+
+        from .snapshot import check_snapshot_numpy, track_snapshot
+
+        # The columnar snapshot, when enabled, drops deleted products
+        register(check_snapshot_numpy)
+        track_snapshot()
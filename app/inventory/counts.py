@@ -0,0 +1,139 @@
+"""
+Per-category product counters kept in ``CategoryProductCount``.
+
+Every category with products has a row holding its total and active
+product counts, so "categories that have products" is a scan of a small
+partial index and the count of a category a primary key lookup, instead of
+a ``DISTINCT`` over, or a join against, the product table.
+
+Counters move in the same transaction as the product write: single saves
+and deletes adjust them with ``F()`` updates (see ``inventory.summaries``),
+bulk writes rebuild the categories they touched. ``check_product_counts``
+reports drift, for instance after raw SQL writes, and
+``rebuild_product_counts`` repairs it.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Category, CategoryProductCount, Product
+
+# Product fields the counters depend on
+COUNT_FIELDS = {"category", "category_id", "is_active"}
+
+COUNTER_FIELDS = ["products", "active_products"]
+
+
+def count_key(product):
+    """The ``(category_id, is_active)`` pair of a product instance."""
+    return product.category_id, bool(product.is_active)
+
+
+def _deltas(keys, sign):
+    """``{category_id: (products, active_products)}``, in lock order."""
+    deltas = {}
+    for category_id, is_active in keys:
+        products, active = deltas.get(category_id, (0, 0))
+        deltas[category_id] = (products + sign, active + sign * is_active)
+    return dict(sorted(deltas.items()))
+
+
+def _apply(deltas, create):
+    if not deltas:
+        return
+    with transaction.atomic():
+        if create:
+            CategoryProductCount.objects.bulk_create(
+                [
+                    CategoryProductCount(category_id=category_id)
+                    for category_id in deltas
+                ],
+                ignore_conflicts=True,
+            )
+        for category_id, (products, active) in deltas.items():
+            CategoryProductCount.objects.filter(category_id=category_id).update(
+                products=F("products") + products,
+                active_products=F("active_products") + active,
+            )
+
+
+def add_counts(keys):
+    """Count ``(category_id, is_active)`` pairs of new products in."""
+    _apply(_deltas(keys, 1), create=True)
+
+
+def remove_counts(keys):
+    """Count ``(category_id, is_active)`` pairs of removed products out."""
+    # No rows are created: the category may be on its way out in a cascade
+    _apply(_deltas(keys, -1), create=False)
+
+
+def _actual(category_ids):
+    queryset = Product.objects.all()
+    if category_ids is not None:
+        queryset = queryset.filter(category_id__in=category_ids)
+    return {
+        category_id: (products, active)
+        for category_id, products, active in queryset.values("category_id")
+        .annotate(
+            products=Count("pk"),
+            active_products=Count("pk", filter=Q(is_active=True)),
+        )
+        .values_list("category_id", "products", "active_products")
+        .order_by()
+    }
+
+
+def check_product_counts(category_ids=None):
+    """
+    ``{category_id: (stored, actual)}`` of the categories whose counters
+    (``(products, active_products)``) do not match their products.
+    """
+    actual = _actual(category_ids)
+    stored = CategoryProductCount.objects.all()
+    if category_ids is not None:
+        stored = stored.filter(category_id__in=category_ids)
+    stored = {
+        category_id: (products, active)
+        for category_id, products, active in stored.values_list(
+            "category_id", *COUNTER_FIELDS
+        )
+    }
+    return {
+        category_id: (stored.get(category_id, (0, 0)), actual.get(category_id, (0, 0)))
+        for category_id in stored.keys() | actual.keys()
+        if stored.get(category_id, (0, 0)) != actual.get(category_id, (0, 0))
+    }
+
+
+def rebuild_product_counts(category_ids=None):
+    """
+    Recount the products of ``category_ids`` (every category when None).
+    Rows are rewritten in place under the locks the incremental updates
+    take, so concurrent product writes are neither lost nor counted twice.
+    Returns the number of counters that changed.
+    """
+    with transaction.atomic():
+        categories = Category.objects.all()
+        if category_ids is not None:
+            categories = categories.filter(pk__in=category_ids)
+        category_ids = list(categories.order_by("pk").values_list("pk", flat=True))
+
+        CategoryProductCount.objects.bulk_create(
+            [CategoryProductCount(category_id=pk) for pk in category_ids],
+            ignore_conflicts=True,
+        )
+        rows = list(
+            CategoryProductCount.objects.select_for_update()
+            .filter(category_id__in=category_ids)
+            .order_by("category_id")
+        )
+        actual = _actual(category_ids)
+        changed = []
+        for row in rows:
+            counts = actual.get(row.category_id, (0, 0))
+            if (row.products, row.active_products) != counts:
+                row.products, row.active_products = counts
+                changed.append(row)
+        CategoryProductCount.objects.bulk_update(changed, COUNTER_FIELDS)
+        return len(changed)
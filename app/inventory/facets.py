@@ -0,0 +1,138 @@
+"""
+Facet counts of a product set, all facets in one query.
+
+Facets with a fixed set of values (``is_active``, ``is_digital``, the price
+buckets of ``PRICE_STATS_BUCKETS``) are conditional aggregates:
+``COUNT(*) FILTER (WHERE ...)`` per value. Facets whose values come from
+the data (``category``, ``created_month``) are grouped on instead, and the
+counts of each facet are summed up from the groups. Asking only for fixed
+facets reads one row; grouping facets read one row per combination of
+their values present in the set.
+
+``cached_facet_counts`` keeps the result in the shared cache under the SQL
+of the product set and the ``Product`` version stamp, so any product write
+moves on to fresh counts.
+"""
+
+import hashlib
+from collections import Counter, namedtuple
+
+from core.versions import model_versions
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncMonth
+
+from .models import Product
+from .prices import bucket_edges, bucket_range
+
+# A facet either groups on ``expression`` or counts each of ``choices``,
+# ``(value, Q)`` pairs
+Facet = namedtuple("Facet", ["expression", "choices"], defaults=[None, None])
+
+
+def _price_choices():
+    edges = bucket_edges()
+    choices = []
+    for bucket in range(len(edges)):
+        lower, upper = bucket_range(bucket, edges)
+        bounds = Q()
+        if lower is not None:
+            bounds &= Q(price__gte=lower)
+        if upper is not None:
+            bounds &= Q(price__lt=upper)
+        value = {
+            "min_price": f"{edges[bucket]:.2f}",
+            "max_price": None if upper is None else f"{upper:.2f}",
+        }
+        choices.append((value, bounds))
+    return choices
+
+
+def _flag_choices(name):
+    return [(True, Q(**{name: True})), (False, Q(**{name: False}))]
+
+
+def facets():
+    """``{name: Facet}`` of the product facets, in response order."""
+    return {
+        "category": Facet(expression=F("category_id")),
+        "is_active": Facet(choices=_flag_choices("is_active")),
+        "is_digital": Facet(choices=_flag_choices("is_digital")),
+        "price": Facet(choices=_price_choices()),
+        "created_month": Facet(expression=TruncMonth("created_at")),
+    }
+
+
+FACET_NAMES = tuple(facets())
+
+
+def facet_counts(products, names=FACET_NAMES):
+    """
+    ``{facet: [{"value": ..., "count": n}, ...]}`` over ``products`` for the
+    facets in ``names``, from a single query. Fixed facets list every value,
+    grouping facets the values present, most frequent first.
+    """
+    selected = {name: facet for name, facet in facets().items() if name in names}
+    groups = {
+        f"facet_{name}": facet.expression
+        for name, facet in selected.items()
+        if facet.expression is not None
+    }
+    aggregates = {"facet_total": Count("pk")}
+    for name, facet in selected.items():
+        for i, (_, condition) in enumerate(facet.choices or ()):
+            aggregates[f"facet_{name}_{i}"] = Count("pk", filter=condition)
+
+    rows = products.order_by()
+    if groups:
+        rows = rows.annotate(**groups).values(*groups)
+        rows = rows.annotate(**aggregates)
+    else:
+        rows = [rows.aggregate(**aggregates)]
+
+    totals = {name: Counter() for name in selected}
+    for row in rows:
+        for name, facet in selected.items():
+            if facet.expression is not None:
+                totals[name][row[f"facet_{name}"]] += row["facet_total"]
+            else:
+                for i in range(len(facet.choices)):
+                    totals[name][i] += row[f"facet_{name}_{i}"]
+
+    counts = {}
+    for name, facet in selected.items():
+        if facet.expression is not None:
+            counts[name] = [
+                {"value": _value(value), "count": count}
+                for value, count in sorted(
+                    totals[name].items(), key=lambda item: (-item[1], item[0])
+                )
+            ]
+        else:
+            counts[name] = [
+                {"value": value, "count": totals[name][i]}
+                for i, (value, _) in enumerate(facet.choices)
+            ]
+    return counts
+
+
+def _value(value):
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m")
+    return value
+
+
+def cached_facet_counts(products, names=FACET_NAMES):
+    """``facet_counts`` shared for ``FACET_CACHE_TIMEOUT`` seconds per product set."""
+    sql, params = products.order_by().query.sql_with_params()
+    (version,) = model_versions(Product)
+    digest = hashlib.sha1(
+        f"{products.db}:{sql}:{params!r}:{sorted(names)}:{bucket_edges()}".encode()
+    ).hexdigest()
+    key = f"facets:{digest}:{version}"
+    counts = cache.get(key)
+    if counts is None:
+        counts = facet_counts(products, names)
+        cache.set(key, counts, getattr(settings, "FACET_CACHE_TIMEOUT", 300))
+    return counts
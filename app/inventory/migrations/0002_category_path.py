@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    """
+    Compute path and level for existing categories, walking each tree
+    depth first from its root so a parent's path is known before its
+    children's.
+    """
+    Category = apps.get_model("inventory", "Category")
+    children = {}
+    for pk, parent_id in Category.objects.values_list("pk", "parent_id"):
+        children.setdefault(parent_id, []).append(pk)
+
+    updates = []
+    stack = [(pk, f"/{pk}/") for pk in children.get(None, [])]
+    while stack:
+        pk, path = stack.pop()
+        updates.append(Category(pk=pk, path=path, level=path.count("/") - 2))
+        stack.extend((child, f"{path}{child}/") for child in children.get(pk, []))
+    Category.objects.bulk_update(updates, ["path", "level"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to='inventory.category'),
+        ),
+        migrations.AlterField(
+            model_name='stockmanagement',
+            name='last_checked_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ),
+        migrations.AddField(
+            model_name='pricebucket',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_buckets', to='inventory.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='pricebucket',
+            constraint=models.UniqueConstraint(fields=('category', 'bucket'), name='price_bucket_category_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='pricebucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('bucket',), name='price_bucket_overall_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_price_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryProductCount',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='product_count', serialize=False, to='inventory.category')),
+                ('products', models.IntegerField(default=0)),
+                ('active_products', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('products__gt', 0)), fields=['category'], name='category_count_nonempty_idx')],
+            },
+        ),
+    ]
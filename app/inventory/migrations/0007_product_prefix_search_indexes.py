@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    ``AddIndex`` that only changes the schema on PostgreSQL: operator
+    classes do not exist elsewhere. The model state is updated everywhere.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0006_product_partial_indexes"),
+    ]
+
+    operations = [
+        AddPostgresIndex(
+            model_name="product",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"),
+                    name="text_pattern_ops",
+                ),
+                name="product_name_upper_idx",
+            ),
+        ),
+        AddPostgresIndex(
+            model_name="product",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("slug"),
+                    name="text_pattern_ops",
+                ),
+                name="product_slug_upper_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    ``AddIndex`` that only changes the schema on PostgreSQL: operator
+    classes do not exist elsewhere. The model state is updated everywhere.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0007_product_prefix_search_indexes"),
+    ]
+
+    operations = [
+        # Provides gin_trgm_ops; a no-op on other databases
+        TrigramExtension(),
+        AddPostgresIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"),
+                    name="gin_trgm_ops",
+                ),
+                name="product_name_trgm_idx",
+            ),
+        ),
+        AddPostgresIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("slug"),
+                    name="gin_trgm_ops",
+                ),
+                name="product_slug_trgm_idx",
+            ),
+        ),
+        AddPostgresIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("description"),
+                    name="gin_trgm_ops",
+                ),
+                name="product_description_trgm_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0008_product_trigram_indexes"),
+    ]
+
+    operations = [
+        # auto_now leaves the column as it is. Altering it anyway would
+        # make SQLite rebuild the table with the PostgreSQL-only indexes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="product",
+                    name="updated_at",
+                    field=models.DateTimeField(auto_now=True, null=True),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["updated_at"], name="product_updated_idx"),
+        ),
+    ]
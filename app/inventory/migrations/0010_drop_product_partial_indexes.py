@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0009_product_updated_at"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_active_price_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_active_category_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_active_name_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_inactive_idx",
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def drop_overall_rows(apps, schema_editor):
+    """All-products statistics are summed from the category rows now."""
+    PriceBucket = apps.get_model("inventory", "PriceBucket")
+    PriceBucket.objects.filter(category__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0010_drop_product_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="pricebucket",
+            name="price_bucket_overall_uniq",
+        ),
+        migrations.RunPython(drop_overall_rows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="pricebucket",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="price_buckets",
+                to="inventory.category",
+            ),
+        ),
+    ]
@@ -1,4 +1,108 @@
-from django.db import models
+from core.versions import VersionedQuerySet, VersionedQuerySetMixin
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Length, Now, Replace, Substr, Upper
+from django.utils import timezone
+
+
+class TreeCycleError(ValueError):
+    """A category cannot be moved under itself or one of its descendants."""
+
+
+def path_level(path):
+    """Depth of a materialized path: "/1/" is level 0, "/1/5/" level 1."""
+    return path.count("/") - 2
+
+
+class CategoryQuerySet(VersionedQuerySetMixin, models.QuerySet):
+    """
+    Tree helpers backed by the materialized ``path`` ("/<root id>/.../<id>/").
+    Each helper is a single query on the indexed ``path`` column (or the pk).
+    Bulk writes bump the ``Category`` version stamp.
+    """
+
+    def descendants(self, category, include_self=False):
+        queryset = self.filter(path__startswith=category.path)
+        return queryset if include_self else queryset.exclude(pk=category.pk)
+
+    def with_products(self, active=False):
+        """Categories with (active) products, from the maintained counters."""
+        if active:
+            return self.filter(product_count__active_products__gt=0)
+        return self.filter(product_count__products__gt=0)
+
+    def ancestors(self, category, include_self=False):
+        pks = [int(pk) for pk in category.path.strip("/").split("/") if pk]
+        if not include_self:
+            pks = pks[:-1]
+        return self.filter(pk__in=pks)
+
+    def sync_paths(self, categories):
+        """
+        Bring ``path`` and ``level`` of ``categories`` (saved instances) in
+        line with their ``parent``, in the database and on the instances. A
+        category whose path changes takes its whole subtree along with one
+        UPDATE. Raises ``TreeCycleError`` if a move would create a cycle.
+        """
+        rows = {
+            pk: (path, parent_id, parent_path, level)
+            for pk, path, parent_id, parent_path, level in self.model._base_manager.filter(
+                pk__in=[category.pk for category in categories]
+            ).values_list("pk", "path", "parent_id", "parent__path", "level")
+        }
+        current = {pk: row[0] for pk, row in rows.items()}
+        result, new_rows = {}, []
+
+        for pk in _parents_first(rows):
+            _, parent_id, parent_path, level = rows[pk]
+            path = current[pk]
+            parent_path = current.get(parent_id, parent_path) if parent_id else "/"
+            new_path = f"{parent_path}{pk}/"
+            new_level = path_level(new_path)
+
+            if path and path != new_path:
+                if new_path.startswith(path):
+                    raise TreeCycleError(
+                        f"Category {pk} cannot be moved under its own subtree"
+                    )
+                # Rewrite the prefix of the whole subtree; levels follow
+                # from the number of separators in the rewritten path
+                self.model._base_manager.filter(path__startswith=path).update(
+                    path=Concat(Value(new_path), Substr("path", len(path) + 1)),
+                    level=Length("path")
+                    - Length(Replace("path", Value("/"), Value("")))
+                    + (new_level - path_level(path) - 2),
+                )
+                for other, other_path in current.items():
+                    if other_path.startswith(path):
+                        current[other] = new_path + other_path[len(path) :]
+            elif path != new_path or level != new_level:
+                new_rows.append(self.model(pk=pk, path=new_path, level=new_level))
+                current[pk] = new_path
+            result[pk] = (new_path, new_level)
+
+        if new_rows:
+            self.model._base_manager.bulk_update(new_rows, ["path", "level"])
+        for category in categories:
+            category.path, category.level = result[category.pk]
+
+
+def _parents_first(rows):
+    """Order ``{pk: (path, parent_id, ...)}`` so parents come before children."""
+    ordered, placed = [], set()
+    pending = list(rows)
+    while pending:
+        remaining = [
+            pk for pk in pending if rows[pk][1] in rows and rows[pk][1] not in placed
+        ]
+        ready = [pk for pk in pending if pk not in remaining]
+        if not ready:
+            raise TreeCycleError(f"Categories {sorted(remaining)} form a cycle")
+        ordered.extend(ready)
+        placed.update(ready)
+        pending = remaining
+    return ordered
 
 
 # Category Model
@@ -7,11 +111,40 @@ class Category(models.Model):
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=55, unique=True)
     is_active = models.BooleanField(default=False)
+    # Kept in sync with ``parent`` by save() / Category.objects.sync_paths()
     level = models.SmallIntegerField(default=0)
+    path = models.CharField(max_length=255, default="", editable=False)
+
+    objects = CategoryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL use the index for LIKE 'x%'
+            models.Index(
+                fields=["path"],
+                name="category_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if (
+            self.pk
+            and self.parent_id
+            and self.path
+            and self.parent.path.startswith(self.path)
+        ):
+            raise TreeCycleError(
+                f"Category {self.pk} cannot be moved under its own subtree"
+            )
+        super().save(*args, **kwargs)
+        if update_fields is None or "parent" in update_fields:
+            Category.objects.sync_paths([self])
+
 
 # Promotion Event Model
 class PromotionEvent(models.Model):
@@ -20,10 +153,81 @@ class PromotionEvent(models.Model):
     end_date = models.DateTimeField()
     price_reduction = models.IntegerField()
 
+    objects = VersionedQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(VersionedQuerySetMixin, models.QuerySet):
+    """
+    Bulk writes keep the product summaries (``inventory.summaries``)
+    current: inserts are counted in, updates of the fields a summary
+    depends on rebuild the categories involved.
+    """
+
+    def in_category_tree(self, category):
+        """Products of ``category`` and all of its descendants (one join)."""
+        return self.filter(category__path__startswith=category.path)
+
+    def update(self, **kwargs):
+        from .summaries import TRACKED_FIELDS, rebuild
+
+        kwargs.setdefault("updated_at", Now())
+        if not TRACKED_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            category_ids = set(
+                self.order_by().values_list("category_id", flat=True).distinct()
+            )
+            rows = super().update(**kwargs)
+            target = kwargs.get("category", kwargs.get("category_id"))
+            if isinstance(target, Category):
+                target = target.pk
+            if target is not None and not isinstance(target, int):
+                category_ids = None  # an expression: any category may be hit
+            elif target is not None:
+                category_ids.add(target)
+            if rows:
+                rebuild(category_ids, kwargs.keys())
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .summaries import products_added, rebuild
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+                # Which rows were written is unknown
+                rebuild({obj.category_id for obj in objs})
+            else:
+                products_added(objs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        from .summaries import TRACKED_FIELDS, rebuild
+
+        objs, fields = list(objs), [*fields]
+        if "updated_at" not in fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            fields.append("updated_at")
+        if not TRACKED_FIELDS & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            category_ids = set(
+                self.model._base_manager.filter(pk__in=[obj.pk for obj in objs])
+                .order_by()
+                .values_list("category_id", flat=True)
+                .distinct()
+            )
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            rebuild(category_ids | {obj.category_id for obj in objs}, fields)
+        return rows
+
+
 # Product Model
 class Product(models.Model):
     category = models.ForeignKey(
@@ -35,18 +239,129 @@ class Product(models.Model):
     is_digital = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(null=True, blank=True)
+    # Set on every write, bulk ones included (ProductQuerySet), so changed
+    # rows can be polled for (inventory.snapshot)
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Sort keys for keyset pagination
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            # Changed rows since a point in time (inventory.snapshot)
+            models.Index(fields=["updated_at"], name="product_updated_idx"),
+            # Per-category price extremes and price bucket ranges
+            models.Index(
+                fields=["category", "price"], name="product_category_price_idx"
+            ),
+            # name/slug__istartswith compile to UPPER(col) LIKE 'X%', which
+            # needs the expression under a pattern opclass (PostgreSQL)
+            models.Index(
+                OpClass(Upper("name"), name="text_pattern_ops"),
+                name="product_name_upper_idx",
+            ),
+            models.Index(
+                OpClass(Upper("slug"), name="text_pattern_ops"),
+                name="product_slug_upper_idx",
+            ),
+            # icontains compiles to UPPER(col) LIKE '%X%': pg_trgm indexes
+            # serve leading wildcards too (inventory.search.TrigramSearch)
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="product_name_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(Upper("slug"), name="gin_trgm_ops"),
+                name="product_slug_trgm_idx",
+            ),
+            GinIndex(
+                OpClass(Upper("description"), name="gin_trgm_ops"),
+                name="product_description_trgm_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields and "updated_at" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "updated_at"]
+        super().save(*args, **kwargs)
+
+
+# Price Bucket Model
+class PriceBucket(models.Model):
+    """
+    Product count, price total and extremes of the products of one category
+    in one price bucket (see ``inventory.prices``). Maintained on product
+    writes.
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="price_buckets"
+    )
+    bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    min_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    max_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "bucket"], name="price_bucket_category_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Price bucket {self.bucket} of {self.category_id}"
+
+
+# Category Product Count Model
+class CategoryProductCount(models.Model):
+    """
+    Total and active product counts of one category, maintained on product
+    writes (see ``inventory.counts``).
+    """
+
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="product_count",
+    )
+    products = models.IntegerField(default=0)
+    active_products = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # "Categories that have products" without touching the rest
+            models.Index(
+                fields=["category"],
+                condition=models.Q(products__gt=0),
+                name="category_count_nonempty_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.products} products in category {self.category_id}"
+
 
 # Product Promotion Event Model
 class ProductPromotionEvent(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     promotion_event = models.ForeignKey(PromotionEvent, on_delete=models.CASCADE)
 
+    objects = VersionedQuerySet.as_manager()
+
     class Meta:
         unique_together = ("product", "promotion_event")
 
@@ -60,6 +375,8 @@ class StockManagement(models.Model):
     quantity = models.IntegerField(default=0)
     last_checked_at = models.DateTimeField(auto_now=True)
 
+    objects = VersionedQuerySet.as_manager()
+
     def __str__(self):
         return f"Stock for {self.product.name}"
 
@@ -80,6 +397,8 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = VersionedQuerySet.as_manager()
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -90,6 +409,8 @@ class OrderProduct(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
 
+    objects = VersionedQuerySet.as_manager()
+
     class Meta:
         unique_together = ("product", "order")
 
@@ -0,0 +1,281 @@
+"""
+Product price statistics kept in the ``PriceBucket`` summary table.
+
+Prices are split into buckets by the lower edges in ``PRICE_STATS_BUCKETS``;
+every (category, bucket) pair has a row holding the product count, the price
+total and the lowest and highest price. Reading the statistics of a category
+is one query over at most ``len(PRICE_STATS_BUCKETS)`` rows, whatever the
+number of products; those of all products sum the rows of every category in
+one query. There are no all-products rows: every product write would update
+them, serializing writes across categories.
+
+Single product saves and deletes adjust the affected rows in place (see
+``inventory.summaries``). A removed price only triggers a lookup when it
+was the bucket's extreme, and then it is one index probe. Bulk writes
+rebuild the categories they touched with ``rebuild_price_stats``, which is
+also the repair path after changing the bucket edges.
+"""
+
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    Max,
+    Min,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Category, PriceBucket, Product
+
+DEFAULT_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+
+# Product fields the statistics depend on
+PRICE_FIELDS = {"category", "category_id", "price"}
+
+STAT_FIELDS = ["count", "total", "min_price", "max_price"]
+
+
+def bucket_edges():
+    edges = getattr(settings, "PRICE_STATS_BUCKETS", DEFAULT_BUCKETS)
+    return tuple(Decimal(str(edge)) for edge in edges)
+
+
+def bucket_of(price, edges):
+    """Index of the bucket of ``price``; prices below the first edge go in 0."""
+    return max(bisect_right(edges, price) - 1, 0)
+
+
+def bucket_range(bucket, edges):
+    """``(lower, upper)`` price bounds of ``bucket``; ``upper`` is exclusive or None."""
+    upper = edges[bucket + 1] if bucket + 1 < len(edges) else None
+    return (None if bucket == 0 else edges[bucket]), upper
+
+
+def _bucket_expression(edges):
+    return Case(
+        *(When(price__lt=edge, then=Value(i)) for i, edge in enumerate(edges[1:])),
+        default=Value(len(edges) - 1),
+    )
+
+
+####
+#  Incremental maintenance
+####
+
+
+def _group(prices, edges):
+    """
+    ``{(category_id, bucket): (count, total, min, max)}`` of ``(category_id,
+    price)`` pairs.
+    """
+    groups = {}
+    for category_id, price in prices:
+        key = (category_id, bucket_of(price, edges))
+        count, total, low, high = groups.get(key, (0, 0, price, price))
+        groups[key] = (count + 1, total + price, min(low, price), max(high, price))
+    # In key order: every writer (and rebuild_price_stats) locks rows in
+    # this order
+    return dict(sorted(groups.items()))
+
+
+def add_prices(prices):
+    """Count ``(category_id, price)`` pairs of new products in."""
+    groups = _group(prices, bucket_edges())
+    if not groups:
+        return
+    with transaction.atomic():
+        PriceBucket.objects.bulk_create(
+            [
+                PriceBucket(category_id=category_id, bucket=bucket)
+                for category_id, bucket in groups
+            ],
+            ignore_conflicts=True,
+        )
+        for (category_id, bucket), (count, total, low, high) in groups.items():
+            PriceBucket.objects.filter(category_id=category_id, bucket=bucket).update(
+                count=F("count") + count,
+                total=F("total") + total,
+                min_price=Least(Coalesce("min_price", Value(low)), Value(low)),
+                max_price=Greatest(Coalesce("max_price", Value(high)), Value(high)),
+            )
+
+
+def remove_prices(prices):
+    """
+    Count ``(category_id, price)`` pairs of removed products out. Buckets
+    that lost their lowest or highest price look the new one up.
+    """
+    edges = bucket_edges()
+    with transaction.atomic():
+        for (category_id, bucket), (count, total, low, high) in _group(
+            prices, edges
+        ).items():
+            rows = PriceBucket.objects.filter(category_id=category_id, bucket=bucket)
+            rows.update(count=F("count") - count, total=F("total") - total)
+
+            products = Product.objects.filter(category_id=category_id)
+            lower, upper = bucket_range(bucket, edges)
+            if lower is not None:
+                products = products.filter(price__gte=lower)
+            if upper is not None:
+                products = products.filter(price__lt=upper)
+            rows.filter(Q(min_price__gte=low) | Q(max_price__lte=high)).update(
+                min_price=Subquery(products.order_by("price").values("price")[:1]),
+                max_price=Subquery(products.order_by("-price").values("price")[:1]),
+            )
+
+
+####
+#  Rebuilds
+####
+
+
+def rebuild_price_stats(category_ids=None):
+    """
+    Recompute the rows of ``category_ids`` (every category when None) from
+    the products.
+
+    Rows are rewritten in place under the same locks, taken in the same
+    order, as the incremental updates, so concurrent product writes are
+    neither lost nor counted twice.
+    """
+    edges = bucket_edges()
+    buckets = range(len(edges))
+    with transaction.atomic():
+        products, categories = Product.objects.all(), Category.objects.all()
+        if category_ids is not None:
+            products = products.filter(category_id__in=category_ids)
+            categories = categories.filter(pk__in=category_ids)
+        category_ids = list(categories.order_by("pk").values_list("pk", flat=True))
+
+        PriceBucket.objects.bulk_create(
+            [
+                PriceBucket(category_id=category_id, bucket=bucket)
+                for category_id in category_ids
+                for bucket in buckets
+            ],
+            ignore_conflicts=True,
+        )
+        PriceBucket.objects.filter(
+            category_id__in=category_ids, bucket__gte=len(edges)
+        ).delete()
+        rows = list(
+            PriceBucket.objects.select_for_update()
+            .filter(category_id__in=category_ids)
+            .order_by("category_id", "bucket")
+        )
+
+        stats = {
+            (row.pop("category_id"), row.pop("bucket")): row
+            for row in products.annotate(bucket=_bucket_expression(edges))
+            .values("category_id", "bucket")
+            .annotate(
+                count=Count("pk"),
+                total=Sum("price"),
+                min_price=Min("price"),
+                max_price=Max("price"),
+            )
+            .order_by()
+        }
+        for row in rows:
+            _assign(row, stats.get((row.category_id, row.bucket)))
+        PriceBucket.objects.bulk_update(rows, STAT_FIELDS)
+
+
+def _assign(row, stats):
+    stats = stats or {"count": 0, "total": 0, "min_price": None, "max_price": None}
+    for name in STAT_FIELDS:
+        setattr(row, name, stats[name])
+
+
+####
+#  Reads
+####
+
+
+def price_statistics(category_id=None):
+    """
+    Count, min, max, average and histogram of the prices of one category,
+    or of all products (the category rows summed per bucket) when
+    ``category_id`` is None. One query.
+    """
+    edges = bucket_edges()
+    histogram = [
+        {"min_price": edges[i], "max_price": bucket_range(i, edges)[1], "count": 0}
+        for i in range(len(edges))
+    ]
+    count, total, lows, highs = 0, Decimal(0), [], []
+    rows = PriceBucket.objects.filter(count__gt=0)
+    if category_id is not None:
+        rows = rows.filter(category_id=category_id)
+    rows = (
+        rows.values("bucket")
+        .annotate(
+            n=Sum("count"),
+            bucket_total=Sum("total"),
+            low=Min("min_price"),
+            high=Max("max_price"),
+        )
+        .values_list("bucket", "n", "bucket_total", "low", "high")
+        .order_by()
+    )
+    for bucket, n, bucket_total, low, high in rows:
+        if not n or bucket >= len(edges):
+            continue
+        histogram[bucket]["count"] = n
+        count += n
+        total += bucket_total
+        lows.append(low)
+        highs.append(high)
+
+    return {
+        "category": category_id,
+        "count": count,
+        "min_price": min(lows, default=None),
+        "max_price": max(highs, default=None),
+        "avg_price": (total / count).quantize(Decimal("0.01")) if count else None,
+        "histogram": histogram,
+    }
+
+
+def price_extremes(products=None):
+    """
+    ``(cheapest, most expensive)`` of ``products`` (all by default) in one
+    query; ``(None, None)`` when there are none. Both come from an end of
+    the ``(price, id)`` order, so equal prices go to the lowest and the
+    highest id respectively.
+    """
+    if products is None:
+        products = Product.objects.all()
+    cheapest = products.order_by("price", "id").values("pk")[:1]
+    priciest = products.order_by("-price", "-id").values("pk")[:1]
+    found = list(
+        Product.objects.filter(
+            Q(pk=Subquery(cheapest)) | Q(pk=Subquery(priciest))
+        ).order_by("price", "id")
+    )
+    if not found:
+        return None, None
+    return found[0], found[-1]
+
+
+####
+#  Product writes
+####
+
+
+def price_key(product):
+    """The ``(category_id, price)`` pair of a product instance."""
+    return product.category_id, Product._meta.get_field("price").to_python(
+        product.price
+    )
@@ -0,0 +1,362 @@
+"""
+Product search over name, slug and description.
+
+Two backends answer substring ("contains") and prefix queries behind one
+interface; ``PRODUCT_SEARCH_BACKEND`` picks the one ``product_search()``
+returns:
+
+``NgramSearch``
+    An in-process inverted index from character trigrams to product ids.
+    A query intersects the postings of its own trigrams and checks the few
+    candidates left against the indexed text, so it never scans the product
+    table. The index is built on the first search (or at startup, see
+    ``PRODUCT_SEARCH_PRELOAD``) and follows the single saves and deletes of
+    this process through model signals. Writes it did not see (bulk writes,
+    other processes) change the ``Product`` version stamp; the next search
+    then reads the rows updated since the previous poll (reaching back
+    ``PRODUCT_SEARCH_LAG`` seconds) and re-indexes those whose name, slug
+    or description changed. Deletes of other processes are not seen that
+    way: every ``PRODUCT_SEARCH_MAX_AGE`` seconds the index is rebuilt in a
+    background thread while the old one keeps answering.
+
+``TrigramSearch``
+    The same queries as ``icontains``/``istartswith`` filters, served by
+    the pg_trgm GIN indexes on ``UPPER(name|slug|description)`` on
+    PostgreSQL. Nothing is held in memory.
+
+Both rank a match the same way: per matching field, its weight times one,
+plus one for a match at the start of the field, plus the share of the field
+the query covers. Ties go to the lowest id.
+"""
+
+import datetime
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from core.versions import model_versions
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Length
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+# Searchable fields and their weight in the rank
+FIELD_WEIGHTS = {"name": 3.0, "slug": 2.0, "description": 1.0}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+DEFAULT_BACKEND = "inventory.search.NgramSearch"
+
+
+def field_score(field, text, query, prefix=False):
+    """Rank contribution of ``field`` holding ``text`` (both lowercase)."""
+    if not text or query not in text:
+        return 0.0
+    starts = text.startswith(query)
+    if prefix and not starts:
+        return 0.0
+    return FIELD_WEIGHTS[field] * (1 + starts + len(query) / len(text))
+
+
+class ProductSearch(ABC):
+    """
+    Interface of the search backends. ``search`` returns ``(product id,
+    score)`` pairs, best first; ``products`` the matching products in the
+    same order.
+    """
+
+    @abstractmethod
+    def search(self, query, prefix=False, fields=FIELDS, limit=None):
+        """``(product id, score)`` pairs of the products matching ``query``."""
+
+    def products(self, query, prefix=False, fields=FIELDS, limit=None):
+        ranked = [pk for pk, _ in self.search(query, prefix, fields, limit)]
+        found = Product.objects.in_bulk(ranked)
+        return [found[pk] for pk in ranked if pk in found]
+
+    def prepare(self):
+        """Load whatever the backend keeps in memory."""
+
+    def saved(self, product, update_fields=None):
+        """Follow a product save of this process."""
+
+    def deleted(self, product):
+        """Follow a product delete of this process."""
+
+
+####
+#  In-process n-gram index
+####
+
+N = 3
+# Marks the start and end of a field, so prefix queries have trigrams of
+# their own ("\x02wo" only occurs in texts starting with "wo")
+START, END = "\x02", "\x03"
+
+
+def grams(text):
+    padded = f"{START}{text}{END}"
+    return {padded[i : i + N] for i in range(len(padded) - N + 1)}
+
+
+class NgramSearch(ProductSearch):
+    def __init__(self):
+        self._documents = None  # {pk: {field: lowercase text}}
+        self._postings = None  # {trigram: {pk, ...}}
+        self._version = None
+        self._built_at = 0.0
+        self._polled_at = None  # timezone.now() when the last read started
+        self._rebuilding = None  # the background rebuild thread, if running
+        self._lock = threading.Lock()
+
+    def search(self, query, prefix=False, fields=FIELDS, limit=None):
+        query = query.lower()
+        if not query:
+            return []
+        self._ensure_current()
+        with self._lock:
+            scored = []
+            for pk in self._candidates(f"{START}{query}" if prefix else query):
+                document = self._documents[pk]
+                score = sum(
+                    field_score(field, document.get(field), query, prefix)
+                    for field in fields
+                )
+                if score:
+                    scored.append((pk, score))
+        scored.sort(key=lambda hit: (-hit[1], hit[0]))
+        return scored[:limit] if limit is not None else scored
+
+    def _candidates(self, needle):
+        """Ids of the documents that can contain ``needle``; a superset."""
+        if len(needle) < N:
+            # Too short for a trigram of its own: every trigram containing
+            # it (a walk over the vocabulary, not over the products)
+            found = set()
+            for gram, pks in self._postings.items():
+                if needle in gram:
+                    found |= pks
+            return found
+        # The needle's own trigrams; unlike grams() it is not padded
+        postings = [
+            self._postings.get(needle[i : i + N], set())
+            for i in range(len(needle) - N + 1)
+        ]
+        postings.sort(key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    # Building
+
+    def prepare(self):
+        self._ensure_current()
+
+    def _ensure_current(self):
+        max_age = getattr(settings, "PRODUCT_SEARCH_MAX_AGE", 300)
+        (version,) = model_versions(Product)
+        if self._documents is None:
+            self.rebuild(version)
+            return
+        if time.monotonic() - self._built_at > max_age:
+            self._rebuild_in_background()
+        if self._version != version:
+            self.poll(version)
+
+    def rebuild(self, version=None):
+        """Index every product; ``version`` is the stamp read beforehand."""
+        if version is None:
+            (version,) = model_versions(Product)
+        started = timezone.now()
+        documents, postings = {}, defaultdict(set)
+        for pk, *values in Product.objects.values_list("pk", *FIELDS).iterator():
+            document = self._document(dict(zip(FIELDS, values)))
+            documents[pk] = document
+            for gram in self._grams(document):
+                postings[gram].add(pk)
+        with self._lock:
+            self._documents, self._postings = documents, postings
+            self._version, self._polled_at = version, started
+            self._built_at = time.monotonic()
+
+    def poll(self, version):
+        """Re-index the rows whose text changed since the previous poll."""
+        started = timezone.now()
+        lag = datetime.timedelta(seconds=getattr(settings, "PRODUCT_SEARCH_LAG", 5))
+        since = self._polled_at - lag
+        changed = list(
+            Product.objects.filter(
+                Q(updated_at__gte=since) | Q(created_at__gte=since)
+            ).values_list("pk", *FIELDS)
+        )
+        with self._lock:
+            for pk, *values in changed:
+                document = self._document(dict(zip(FIELDS, values)))
+                if self._documents.get(pk) != document:
+                    self._put(pk, document)
+            self._version, self._polled_at = version, started
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding is not None:
+                return
+            self._rebuilding = threading.Thread(
+                target=self._background_rebuild, daemon=True
+            )
+        self._rebuilding.start()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        finally:
+            connections.close_all()  # this thread's own connections
+            self._rebuilding = None
+
+    def _document(self, values):
+        return {field: text.lower() for field, text in values.items() if text}
+
+    def _grams(self, document):
+        return set().union(*(grams(text) for text in document.values()))
+
+    # Incremental updates
+
+    def _put(self, pk, document):
+        old = self._documents.get(pk)
+        stale = self._grams(old) if old else set()
+        fresh = self._grams(document)
+        for gram in stale - fresh:
+            self._postings[gram].discard(pk)
+            if not self._postings[gram]:
+                del self._postings[gram]
+        for gram in fresh - stale:
+            self._postings.setdefault(gram, set()).add(pk)
+        self._documents[pk] = document
+
+    def _pop(self, pk):
+        old = self._documents.pop(pk, None)
+        for gram in self._grams(old) if old else ():
+            self._postings[gram].discard(pk)
+            if not self._postings[gram]:
+                del self._postings[gram]
+
+    def _follow(self, change):
+        """
+        Apply ``change`` once the write commits. The index then adopts the
+        new version stamp if it was current before the write, so its own
+        writes do not make it rebuild.
+        """
+        if self._documents is None:
+            return  # not built yet: the first search reads the table
+        current = self._version == model_versions(Product)[0]
+
+        def apply():
+            with self._lock:
+                change()
+            if current:
+                (self._version,) = model_versions(Product)
+
+        transaction.on_commit(apply)
+
+    def saved(self, product, update_fields=None):
+        if update_fields is not None and not set(FIELDS) & set(update_fields):
+            return
+        loaded = {
+            field: getattr(product, field)
+            for field in FIELDS
+            if field not in product.get_deferred_fields()
+        }
+
+        def change():
+            document = dict(self._documents.get(product.pk, {}))
+            for field, text in loaded.items():
+                if text:
+                    document[field] = text.lower()
+                else:
+                    document.pop(field, None)
+            self._put(product.pk, document)
+
+        self._follow(change)
+
+    def deleted(self, product):
+        pk = product.pk
+        self._follow(lambda: self._pop(pk))
+
+
+####
+#  pg_trgm
+####
+
+
+class TrigramSearch(ProductSearch):
+    """
+    Ranks in SQL with ``field_score``'s formula. The filters compile to
+    ``UPPER(col) LIKE UPPER(...)``, which the ``gin_trgm_ops`` indexes of
+    migration 0008 serve for both leading wildcards and prefixes.
+    """
+
+    def search(self, query, prefix=False, fields=FIELDS, limit=None):
+        if not query:
+            return []
+        matches, score = Q(), Value(0.0)
+        for field in fields:
+            lookup = f"{field}__istartswith" if prefix else f"{field}__icontains"
+            matches |= Q(**{lookup: query})
+            score = score + self._score(field, query, prefix)
+        ranked = (
+            Product.objects.filter(matches)
+            .annotate(search_score=score)
+            .order_by("-search_score", "pk")
+            .values_list("pk", "search_score")
+        )
+        return list(ranked[:limit] if limit is not None else ranked)
+
+    def _score(self, field, query, prefix):
+        weight = FIELD_WEIGHTS[field]
+        coverage = Value(weight * len(query)) / Cast(Length(field), FloatField())
+        cases = [
+            When(
+                Q(**{f"{field}__istartswith": query}),
+                then=Value(weight * 2) + coverage,
+            )
+        ]
+        if not prefix:
+            cases.append(
+                When(Q(**{f"{field}__icontains": query}), then=Value(weight) + coverage)
+            )
+        return Case(*cases, default=Value(0.0), output_field=FloatField())
+
+
+####
+#  Backend and signals
+####
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def product_search():
+    """The ``PRODUCT_SEARCH_BACKEND`` instance of this process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, "PRODUCT_SEARCH_BACKEND", DEFAULT_BACKEND)
+                _backend = import_string(path)()
+    return _backend
+
+
+def _saved(sender, instance, update_fields=None, **kwargs):
+    product_search().saved(instance, update_fields)
+
+
+def _deleted(sender, instance, **kwargs):
+    product_search().deleted(instance)
+
+
+def track_search():
+    """Keep the search backend in step with single product writes."""
+    post_save.connect(_saved, sender=Product, dispatch_uid="product-search")
+    post_delete.connect(_deleted, sender=Product, dispatch_uid="product-search")
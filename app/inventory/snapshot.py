@@ -0,0 +1,381 @@
+"""
+In-process columnar snapshot of the product columns the list filters use.
+
+Filters on ``id``, ``price``, ``category``, ``created_at``, ``is_active``
+and ``is_digital`` match most of a large table, so the database answers
+them with a scan or a long index walk. ``CatalogSnapshot`` holds those
+columns as NumPy arrays (one entry per product: prices in cents, times in
+epoch microseconds) and answers them with vectorized masks. A page is
+selected in memory and only its rows are read from the database, by
+primary key.
+
+The snapshot stays current incrementally. When the ``Product`` version
+stamp moves (every product write changes it), the rows created or updated
+since the previous poll are read through the ``updated_at`` index, which
+``ProductQuerySet`` maintains on bulk writes too. Polls reach back
+``PRODUCT_SNAPSHOT_LAG`` seconds to catch writes whose transaction was
+still open during the previous poll. Deletes are not visible that way.
+This process's deletes are applied through ``post_delete``. The selected
+rows are read again with the filters, and any that vanished or stopped
+matching are refreshed from the table before the page is selected again.
+Every ``PRODUCT_SNAPSHOT_MAX_AGE`` seconds the snapshot is reloaded in
+full.
+
+NumPy is optional: ``product_snapshot()`` is ``None`` unless
+``PRODUCT_SNAPSHOT_ENABLED`` is set, and then it needs NumPy installed
+(``check_snapshot_numpy`` fails at startup otherwise).
+"""
+
+import datetime
+import math
+import threading
+import time
+
+from core.versions import model_versions
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # optional, see product_snapshot()
+    np = None
+
+# Filter and ordering fields -> snapshot column (a values_list() name)
+COLUMNS = {
+    "id": "id",
+    "price": "price",
+    "category": "category_id",
+    "created_at": "created_at",
+    "is_active": "is_active",
+    "is_digital": "is_digital",
+}
+FLAGS = {"is_active", "is_digital"}
+LOOKUPS = {"exact", "in", "gt", "gte", "lt", "lte", "range"}
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _micros(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return (value - EPOCH) // MICROSECOND
+
+
+def _bounds(column, lookup, value):
+    """
+    ``(lower, upper)`` inclusive integer bounds of ``column__lookup=value``,
+    either may be ``None``; ``False`` when nothing can match. Prices are
+    rounded inwards, so ``price__gt=9.999`` is ``cents >= 1000``.
+    """
+    if lookup == "range":
+        lower, _ = _bounds(column, "gte", value[0])
+        _, upper = _bounds(column, "lte", value[1])
+        return lower, upper
+    if column == "price":
+        cents = value * 100
+        if lookup == "exact":
+            return (int(cents), int(cents)) if cents == int(cents) else False
+        return {
+            "gt": (math.floor(cents) + 1, None),
+            "gte": (math.ceil(cents), None),
+            "lt": (None, math.ceil(cents) - 1),
+            "lte": (None, math.floor(cents)),
+        }[lookup]
+    value = _micros(value) if column == "created_at" else int(value)
+    return {
+        "exact": (value, value),
+        "gt": (value + 1, None),
+        "gte": (value, None),
+        "lt": (None, value - 1),
+        "lte": (None, value),
+    }[lookup]
+
+
+def _scalar(column, value):
+    """The snapshot representation of one value of ``column``."""
+    if column == "price":
+        return int(value * 100)
+    if column == "created_at":
+        return _micros(value)
+    if column in FLAGS:
+        return bool(value)
+    return int(value)
+
+
+class CatalogSnapshot:
+    """
+    ``select()`` picks the ids of a page; ``page()`` also reads them.
+    Filters are ``{"field__lookup": value}`` dicts as ``filter()`` takes
+    them, with the parsed values ``IndexedFilterBackend`` produces.
+    """
+
+    def __init__(self):
+        self._columns = None  # {column: int64/bool array}, sorted by id
+        self._live = None  # False for deleted rows, until the next reload
+        self._orders = {}  # {ascending key: permutation of _ids}
+        self._version = None
+        self._loaded_at = 0.0
+        self._polled_at = None  # timezone.now() when the last poll started
+        self._lock = threading.Lock()
+
+    @property
+    def _ids(self):
+        return self._columns["id"]
+
+    def supports(self, filters):
+        """Whether every filter in ``filters`` can be answered from memory."""
+        for key in filters:
+            name, _, lookup = key.partition("__")
+            if name not in COLUMNS or (lookup or "exact") not in LOOKUPS:
+                return False
+            if name in FLAGS and lookup not in ("", "exact"):
+                return False
+        return True
+
+    ####
+    #  Selecting
+    ####
+
+    def select(self, filters, ordering, position=None, limit=None):
+        """
+        Array of the ids matching ``filters``, sorted by ``ordering`` (a
+        keyset pagination sort key ending in ``id``), strictly after the
+        key ``position`` if given, at most ``limit`` of them.
+        """
+        self.refresh()
+        with self._lock:
+            mask = self._live.copy()
+            for key, value in filters.items():
+                name, _, lookup = key.partition("__")
+                mask &= self._mask(COLUMNS[name], lookup or "exact", value)
+            if position is not None:
+                mask &= self._after(ordering, position)
+            order = self._order(ordering)
+            hits = order[mask[order]]
+            return self._ids[hits[:limit]]
+
+    def page(self, queryset, filters, ordering, position=None, limit=None):
+        """
+        The rows of ``queryset`` ``select()`` picks, in order. They are read
+        with ``filters`` applied again: any row that was deleted or no longer
+        matches since the last poll is refreshed and the page selected anew.
+        """
+        queryset = queryset.filter(**filters)
+        for _ in range(3):
+            ids = self.select(filters, ordering, position, limit).tolist()
+            rows = queryset.in_bulk(ids)
+            stale = [pk for pk in ids if pk not in rows]
+            if not stale:
+                break
+            self.reload(stale)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def _mask(self, column, lookup, value):
+        values = self._columns[column]
+        if lookup == "in":
+            if column == "price":
+                wanted = [v * 100 for v in value]
+                wanted = [int(cents) for cents in wanted if cents == int(cents)]
+            else:
+                wanted = [_scalar(column, v) for v in value]
+            return np.isin(values, wanted)
+        if column in FLAGS:
+            return values == bool(value)
+        bounds = _bounds(column, lookup, value)
+        if bounds is False:
+            return np.zeros(len(values), dtype=bool)
+        lower, upper = bounds
+        mask = np.ones(len(values), dtype=bool)
+        if lower is not None:
+            mask &= values >= lower
+        if upper is not None:
+            mask &= values <= upper
+        return mask
+
+    def _after(self, ordering, position):
+        """Mask of the rows strictly after ``position``, as ``_seek`` filters."""
+        after = None
+        for name, value in reversed(list(zip(ordering, position))):
+            column = COLUMNS[name.lstrip("-")]
+            values, value = self._columns[column], _scalar(column, value)
+            step = values < value if name.startswith("-") else values > value
+            after = step if after is None else step | ((values == value) & after)
+        return after
+
+    def _order(self, ordering):
+        """Positions of ``_ids`` sorted by ``ordering``; cached per sort key."""
+        descending = [name.startswith("-") for name in ordering]
+        if all(descending):
+            # The key ends in the unique id: descending is ascending reversed
+            return self._order(tuple(name[1:] for name in ordering))[::-1]
+        key = tuple(ordering)
+        if key not in self._orders:
+            if key == ("id",):
+                order = np.arange(len(self._ids))
+            else:
+                # np.lexsort sorts by the last key first
+                keys = []
+                for name in reversed(ordering):
+                    values = self._columns[COLUMNS[name.lstrip("-")]]
+                    keys.append(-values if name.startswith("-") else values)
+                order = np.lexsort(keys)
+            self._orders[key] = order
+        return self._orders[key]
+
+    ####
+    #  Loading and polling
+    ####
+
+    def refresh(self):
+        """Reload when too old, read the changed rows when the stamp moved."""
+        max_age = getattr(settings, "PRODUCT_SNAPSHOT_MAX_AGE", 300)
+        (version,) = model_versions(Product)
+        if self._columns is None or time.monotonic() - self._loaded_at > max_age:
+            self.load(version)
+        elif self._version != version:
+            self.poll(version)
+
+    def load(self, version=None):
+        """Read every product; ``version`` is the stamp read beforehand."""
+        if version is None:
+            (version,) = model_versions(Product)
+        started = timezone.now()
+        columns = self._arrays(Product.objects.order_by("pk"))
+        with self._lock:
+            self._columns = columns
+            self._live = np.ones(len(columns["id"]), dtype=bool)
+            self._orders = {}
+            self._version, self._polled_at = version, started
+            self._loaded_at = time.monotonic()
+
+    def poll(self, version):
+        """Apply the rows created or updated since the previous poll."""
+        started = timezone.now()
+        lag = datetime.timedelta(seconds=getattr(settings, "PRODUCT_SNAPSHOT_LAG", 5))
+        since = self._polled_at - lag
+        self._apply(
+            Product.objects.filter(
+                Q(updated_at__gte=since) | Q(created_at__gte=since)
+            ).order_by("pk")
+        )
+        with self._lock:
+            self._version, self._polled_at = version, started
+
+    def reload(self, ids):
+        """Read the rows of ``ids`` again; the ones gone are marked deleted."""
+        self._apply(Product.objects.filter(pk__in=ids).order_by("pk"), ids)
+
+    def deleted(self, pk):
+        if self._columns is None:
+            return
+
+        def apply():
+            with self._lock:
+                self._kill([pk])
+
+        transaction.on_commit(apply)
+
+    def _arrays(self, queryset):
+        rows = list(queryset.values_list(*COLUMNS.values()))
+        values = list(zip(*rows)) or [()] * len(COLUMNS)
+        columns = {}
+        for column, column_values in zip(COLUMNS.values(), values):
+            if column in FLAGS:
+                columns[column] = np.array(column_values, dtype=bool)
+            else:
+                columns[column] = np.array(
+                    [_scalar(column, value) for value in column_values],
+                    dtype=np.int64,
+                )
+        return columns
+
+    def _apply(self, queryset, expected=()):
+        columns = self._arrays(queryset)
+        ids = columns["id"]
+        with self._lock:
+            self._kill(set(expected) - set(ids.tolist()))
+            if not len(ids):
+                return
+            positions, known = self._positions(ids)
+            for column, values in columns.items():
+                self._columns[column][positions[known]] = values[known]
+            self._live[positions[known]] = True
+            new = ~known
+            if new.any():
+                order = np.argsort(np.concatenate([self._ids, ids[new]]))
+                for column, values in columns.items():
+                    self._columns[column] = np.concatenate(
+                        [self._columns[column], values[new]]
+                    )[order]
+                self._live = np.concatenate(
+                    [self._live, np.ones(new.sum(), dtype=bool)]
+                )[order]
+            self._orders = {}
+
+    def _kill(self, ids):
+        if ids:
+            positions, found = self._positions(np.fromiter(ids, dtype=np.int64))
+            self._live[positions[found]] = False
+
+    def _positions(self, ids):
+        """Positions of ``ids`` in ``_ids`` and which of them are there."""
+        positions = np.searchsorted(self._ids, ids)
+        found = positions < len(self._ids)
+        found[found] = self._ids[positions[found]] == ids[found]
+        return positions, found
+
+
+####
+#  Instance and signals
+####
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def product_snapshot():
+    """
+    The ``CatalogSnapshot`` of this process, ``None`` unless
+    ``PRODUCT_SNAPSHOT_ENABLED``.
+    """
+    global _snapshot
+    if not getattr(settings, "PRODUCT_SNAPSHOT_ENABLED", False):
+        return None
+    if np is None:
+        raise ImproperlyConfigured("PRODUCT_SNAPSHOT_ENABLED needs numpy installed.")
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = CatalogSnapshot()
+    return _snapshot
+
+
+def check_snapshot_numpy(app_configs=None, **kwargs):
+    """System check: an enabled snapshot needs NumPy installed."""
+    if np is not None or not getattr(settings, "PRODUCT_SNAPSHOT_ENABLED", False):
+        return []
+    return [
+        checks.Error(
+            "PRODUCT_SNAPSHOT_ENABLED is set but numpy is not installed.",
+            hint="Install numpy (see requirements.txt) or disable the snapshot.",
+            id="inventory.E001",
+        )
+    ]
+
+
+def _deleted(sender, instance, **kwargs):
+    if _snapshot is not None:
+        _snapshot.deleted(instance.pk)
+
+
+def track_snapshot():
+    """Drop deleted products from the snapshot; polling misses deletes."""
+    post_delete.connect(_deleted, sender=Product, dispatch_uid="product-snapshot")
@@ -0,0 +1,102 @@
+"""
+Summary tables derived from products, kept in step with product writes.
+
+Each summary (price statistics in ``inventory.prices``, product counters in
+``inventory.counts``) declares the product fields it depends on, how to
+count products in and out, and how to rebuild categories from scratch.
+Single saves and deletes are applied incrementally through model signals;
+``ProductQuerySet`` bulk writes, the chunked cascade delete and COPY
+imports go through ``products_added``/``rebuild``.
+"""
+
+from collections import namedtuple
+
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import counts, prices
+from .models import Product
+
+Summary = namedtuple("Summary", ["fields", "key", "add", "remove", "rebuild"])
+
+SUMMARIES = (
+    Summary(
+        prices.PRICE_FIELDS,
+        prices.price_key,
+        prices.add_prices,
+        prices.remove_prices,
+        prices.rebuild_price_stats,
+    ),
+    Summary(
+        counts.COUNT_FIELDS,
+        counts.count_key,
+        counts.add_counts,
+        counts.remove_counts,
+        counts.rebuild_product_counts,
+    ),
+)
+
+# Product fields any summary depends on
+TRACKED_FIELDS = set().union(*(summary.fields for summary in SUMMARIES))
+
+
+def affected(fields):
+    """The summaries that a write of ``fields`` can change."""
+    return [summary for summary in SUMMARIES if summary.fields & set(fields)]
+
+
+def products_added(products):
+    """Count new ``Product`` instances (saved or not) in."""
+    products = list(products)
+    for summary in SUMMARIES:
+        summary.add([summary.key(product) for product in products])
+
+
+def rebuild(category_ids=None, fields=TRACKED_FIELDS):
+    """Rebuild the summaries depending on ``fields`` for ``category_ids``."""
+    for summary in affected(fields):
+        summary.rebuild(category_ids)
+
+
+####
+#  Signals
+####
+
+
+def _stash(sender, instance, update_fields=None, **kwargs):
+    instance._stored_product = None
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not TRACKED_FIELDS & set(update_fields):
+        return
+    instance._stored_product = (
+        Product._base_manager.filter(pk=instance.pk)
+        .values("category_id", "price", "is_active")
+        .first()
+    )
+
+
+def _saved(sender, instance, created, **kwargs):
+    stored = instance.__dict__.pop("_stored_product", None)
+    if not created and stored is None:
+        return  # no tracked field was written
+    old = Product(**stored) if stored else None
+    for summary in SUMMARIES:
+        new_key = summary.key(instance)
+        old_key = summary.key(old) if old else None
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            summary.remove([old_key])
+        summary.add([new_key])
+
+
+def _deleted(sender, instance, **kwargs):
+    for summary in SUMMARIES:
+        summary.remove([summary.key(instance)])
+
+
+def track_products():
+    """Maintain the summaries on single product saves and deletes."""
+    pre_save.connect(_stash, sender=Product, dispatch_uid="product-summaries")
+    post_save.connect(_saved, sender=Product, dispatch_uid="product-summaries")
+    post_delete.connect(_deleted, sender=Product, dispatch_uid="product-summaries")
@@ -1,3 +1,1318 @@
-from django.test import TestCase
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from inspect import getmembers, isclass
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from core import filters as core_filters
+from core import pagination as core_pagination
+from core.cache import local_responses
+from core.filters import IndexedFilterBackend, index_lookups
+from core.pagination import CountStrategyPaginator, _seek, keyset_chunks
+from core.serializers import compiled
+from core.versions import VERSION_KEY, check_shared_cache, local_stamps
+from django.apps import apps
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import EmptyPage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from module5 import views as module5_views
+from module6 import views as module6_views
+from module6.serializers import ProductSerializer as Module6ProductSerializer
+from module7 import serializers as module7_serializers
+from module7 import views as module7_views
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import ViewSetMixin
+
+from . import snapshot as snapshot_module
+from .counts import check_product_counts, rebuild_product_counts
+from .facets import facet_counts
+from .models import (
+    Category,
+    CategoryProductCount,
+    OrderProduct,
+    PriceBucket,
+    Product,
+    ProductPromotionEvent,
+    PromotionEvent,
+    StockManagement,
+    TreeCycleError,
+)
+from .prices import bucket_edges, bucket_of, price_statistics, rebuild_price_stats
+from .search import (
+    FIELDS,
+    NgramSearch,
+    ProductSearch,
+    TrigramSearch,
+    product_search,
+)
+from .snapshot import CatalogSnapshot, check_snapshot_numpy, np, product_snapshot
+
+backfill_paths = import_module("inventory.migrations.0002_category_path").backfill_paths
+
+# Keeps the stamp reads of the shared (database) cache out of query counts
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Tables a sequential scan must never have to filter
+LARGE_MODELS = (Product, StockManagement, ProductPromotionEvent, OrderProduct)
+LARGE_TABLES = {model._meta.db_table for model in LARGE_MODELS}
+PARTIAL_INDEXES = {
+    index.name
+    for model in LARGE_MODELS
+    for index in model._meta.indexes
+    if index.condition is not None
+}
+
+# Filters no index can serve, so a scan is the right plan: negations and
+# boolean flags, which return most of the table (indexes on them cost every
+# write and pay off for no query). Leading wildcard matches have trigram
+# indexes.
+UNINDEXABLE_FILTERS = (
+    re.compile(r"<>"),
+    re.compile(r"^\(*(NOT )?(is_active|is_digital)\)*$"),
+)
+
+# Query strings per endpoint; the others are requested bare
+ENDPOINT_QUERIES = {
+    module5_views.ProductListViewSet: [
+        "",
+        "?page=2",
+        "?cursor=",
+        "?cursor=&ordering=price",
+        "?cursor=&ordering=-created_at",
+    ],
+    module6_views.ProductQueryViewSet: [
+        "",
+        "?id__range=1,20&is_active=true",
+        "?price__range=100,101&ordering=-price",
+        "?name__istartswith=women%20skirt%2010",
+    ],
+    module6_views.ProductSearchViewSet: [
+        "?q=skirt",
+        "?q=wom&prefix=true",
+    ],
+}
+
+# The querysets of the _1_x challenge solutions
+CHALLENGE_SOLUTIONS = {
+    "ch_1_1": lambda: Product.objects.filter(is_active=True).order_by("-name"),
+    "ch_1_2": lambda: Product.objects.only("name", "price").order_by("-price"),
+    "ch_1_3": lambda: Product.objects.order_by("created_at")[:1],
+    "ch_1_4": lambda: Product.objects.order_by("-created_at")[:1],
+    "ch_1_5": lambda: Product.objects.exclude(is_active=True),
+    "ch_1_6": lambda: Product.objects.filter(price=19.99).exclude(category=3),
+}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def unindexed_scans(plan):
+    """
+    Nodes of an ``EXPLAIN (FORMAT JSON)`` plan that filter a large table
+    without an index condition: sequential scans, and full scans of a
+    non-partial index.
+    """
+    for node in plan_nodes(plan):
+        if node.get("Relation Name") not in LARGE_TABLES or "Filter" not in node:
+            continue
+        if node["Node Type"].endswith("Seq Scan") or (
+            node["Node Type"] in ("Index Scan", "Index Only Scan")
+            and "Index Cond" not in node
+            and node.get("Index Name") not in PARTIAL_INDEXES
+        ):
+            if not any(
+                pattern.search(node["Filter"]) for pattern in UNINDEXABLE_FILTERS
+            ):
+                yield node
+
+
+def endpoint_requests():
+    """``(viewset, query string)`` for every list endpoint of modules 5-7."""
+    for module in (module5_views, module6_views, module7_views):
+        for _, view in getmembers(module, isclass):
+            if (
+                issubclass(view, ViewSetMixin)
+                and view.__module__ == module.__name__
+                and hasattr(view, "list")
+            ):
+                for query in ENDPOINT_QUERIES.get(view, [""]):
+                    yield view, query
+
+
+class UnindexedScanTests(SimpleTestCase):
+    def scan(self, node_type, **node):
+        return {
+            "Node Type": "Limit",
+            "Plans": [
+                {
+                    "Node Type": node_type,
+                    "Relation Name": Product._meta.db_table,
+                    **node,
+                }
+            ],
+        }
+
+    def test_filtered_seq_scan_is_reported(self):
+        plan = self.scan("Seq Scan", Filter="(price = 19.99)")
+        self.assertEqual(len(list(unindexed_scans(plan))), 1)
+
+    def test_flag_filters_are_fine(self):
+        for flag in ("(NOT is_active)", "is_active", "is_digital"):
+            with self.subTest(flag=flag):
+                plan = self.scan("Seq Scan", Filter=flag)
+                self.assertEqual(list(unindexed_scans(plan)), [])
+        plan = self.scan("Seq Scan", Filter="(is_active AND (price = 19.99))")
+        self.assertEqual(len(list(unindexed_scans(plan))), 1)
+
+    def test_unfiltered_seq_scan_is_fine(self):
+        self.assertEqual(list(unindexed_scans(self.scan("Seq Scan"))), [])
+
+    def test_unindexable_filters_are_fine(self):
+        plan = self.scan("Seq Scan", Filter="(category_id <> ALL ('{1,2}'::bigint[]))")
+        self.assertEqual(list(unindexed_scans(plan)), [])
+
+    def test_wildcard_match_is_reported(self):
+        plan = self.scan("Seq Scan", Filter="(upper((name)::text) ~~ '%SKIRT%'::text)")
+        self.assertEqual(len(list(unindexed_scans(plan))), 1)
+
+    def test_index_scan_without_condition(self):
+        full = self.scan(
+            "Index Scan", **{"Index Name": "inventory_product_pkey", "Filter": "x"}
+        )
+        partial = self.scan(
+            "Index Scan", **{"Index Name": "product_partial_idx", "Filter": "x"}
+        )
+        self.assertEqual(len(list(unindexed_scans(full))), 1)
+        with mock.patch(f"{__name__}.PARTIAL_INDEXES", {"product_partial_idx"}):
+            self.assertEqual(list(unindexed_scans(partial)), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "query plans are checked on PostgreSQL")
+class IndexUsageTests(TestCase):
+    """
+    Run the querysets of every module 5-7 list endpoint and of the _1_x
+    challenge solutions under ``EXPLAIN`` with sequential scans disabled:
+    the planner then only scans a large table when no index can serve the
+    query's filters at all, whatever the size of the test data.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        prefixes = ["Women", "Men", "Mountain", "Classic", "Bestselling"]
+        categories = Category.objects.bulk_create(
+            Category(name=f"Category {i}", slug=f"category-{i}", is_active=i % 3 > 0)
+            for i in range(20)
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                category=categories[i % len(categories)],
+                name=f"{prefixes[i % len(prefixes)]} Skirt {i}",
+                slug=f"{prefixes[i % len(prefixes)].lower()}-skirt-{i}",
+                description="Comfortable" if i % 7 == 0 else None,
+                price=Decimal(i % 1000) + Decimal("0.99"),
+                is_active=i % 4 > 0,
+            )
+            for i in range(2000)
+        )
+        StockManagement.objects.bulk_create(
+            StockManagement(product=product, quantity=i % 50)
+            for i, product in enumerate(products)
+        )
+        now = timezone.now()
+        event = PromotionEvent.objects.create(
+            name="Sale",
+            start_date=now,
+            end_date=now + timedelta(days=7),
+            price_reduction=10,
+        )
+        ProductPromotionEvent.objects.bulk_create(
+            ProductPromotionEvent(product=product, promotion_event=event)
+            for product in products[::10]
+        )
+        with connection.cursor() as cursor:
+            for table in sorted(LARGE_TABLES):
+                cursor.execute(f'ANALYZE "{table}"')
+
+    def setUp(self):
+        cache.clear()
+        local_responses.clear()
+        local_stamps.clear()
+
+    def explain(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            try:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute("RESET enable_seqscan")
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+
+    def assertIndexed(self, sql, params=None):
+        scans = list(unindexed_scans(self.explain(sql, params)))
+        self.assertFalse(
+            scans,
+            "Unindexed scan of "
+            + ", ".join(f"{n['Relation Name']} ({n['Filter']})" for n in scans)
+            + f" in: {sql}",
+        )
+
+    def test_endpoint_queries_use_indexes(self):
+        factory = APIRequestFactory()
+        for view, query in endpoint_requests():
+            with self.subTest(view=view.__name__, query=query):
+                with CaptureQueriesContext(connection) as queries:
+                    response = view.as_view({"get": "list"})(factory.get(f"/{query}"))
+                self.assertEqual(response.status_code, 200)
+                for captured in queries:
+                    sql = captured["sql"]
+                    if sql.lstrip().upper().startswith("SELECT") and any(
+                        f'"{table}"' in sql or f" {table} " in sql
+                        for table in LARGE_TABLES
+                    ):
+                        self.assertIndexed(sql)
+
+    def test_challenge_solutions_use_indexes(self):
+        for label, queryset in CHALLENGE_SOLUTIONS.items():
+            with self.subTest(challenge=label):
+                self.assertIndexed(*queryset().query.sql_with_params())
+
+    def test_trigram_search_uses_indexes(self):
+        for query, prefix in (("skirt", False), ("fortab", False), ("wom", True)):
+            with self.subTest(query=query, prefix=prefix):
+                with CaptureQueriesContext(connection) as queries:
+                    TrigramSearch().search(query, prefix)
+                self.assertIndexed(queries[-1]["sql"])
+
+
+class ProductSearchTests(TestCase):
+    queries = ["skirt", "wom", "classic sk", "-skirt-1", "fortab", "a", "k", "zzz"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Skirts", slug="skirts")
+        prefixes = ["Women", "Men", "Classic"]
+        Product.objects.bulk_create(
+            Product(
+                category=cls.category,
+                name=f"{prefixes[i % 3]} Skirt {i}",
+                slug=f"{prefixes[i % 3].lower()}-skirt-{i}",
+                description="Comfortable" if i % 4 == 0 else None,
+                price=Decimal("9.99"),
+            )
+            for i in range(30)
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_stamps.clear()
+
+    def expected(self, query, prefix, fields):
+        lookup = "istartswith" if prefix else "icontains"
+        matches = Q()
+        for field in fields:
+            matches |= Q(**{f"{field}__{lookup}": query})
+        return set(Product.objects.filter(matches).values_list("pk", flat=True))
+
+    def test_backends_agree_with_lookups(self):
+        ngram, trigram = NgramSearch(), TrigramSearch()
+        for query in self.queries:
+            for prefix in (False, True):
+                for fields in (FIELDS, ["name"], ["description"]):
+                    with self.subTest(query=query, prefix=prefix, fields=fields):
+                        hits = ngram.search(query, prefix, fields)
+                        self.assertEqual(
+                            {pk for pk, _ in hits}, self.expected(query, prefix, fields)
+                        )
+                        ranked = trigram.search(query, prefix, fields)
+                        self.assertEqual(
+                            [pk for pk, _ in hits], [pk for pk, _ in ranked]
+                        )
+                        for (_, score), (_, sql_score) in zip(hits, ranked):
+                            self.assertAlmostEqual(score, sql_score)
+
+    def test_backends_implement_search(self):
+        with self.assertRaises(TypeError):
+            ProductSearch()
+
+    def test_rank(self):
+        hits = NgramSearch().search("skirt 1", limit=3)
+        names = Product.objects.in_bulk([pk for pk, _ in hits])
+        # The shortest name containing the query wins
+        self.assertEqual(names[hits[0][0]].name, "Men Skirt 1")
+        self.assertEqual(len(hits), 3)
+
+    def test_follows_saves_and_deletes(self):
+        search = product_search()
+        search.prepare()
+        built_at = search._built_at
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                category=self.category, name="Wrap Dress", slug="wrap-dress", price=1
+            )
+        self.assertEqual([pk for pk, _ in search.search("dress")], [product.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Wrap Gown"
+            product.save(update_fields=["name"])
+        self.assertEqual(search.search("dress", fields=["name"]), [])
+        self.assertEqual([pk for pk, _ in search.search("wrap-dr")], [product.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(search.search("wrap"), [])
+        # Its own writes did not make the index rebuild
+        self.assertEqual(search._built_at, built_at)
+
+    def test_polls_unseen_writes(self):
+        search = NgramSearch()
+        search.prepare()
+        built_at = search._built_at
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name="Men Skirt 1").update(name="Men Kilt 1")
+        self.assertEqual(len(search.search("kilt")), 1)
+        self.assertEqual(
+            {pk for pk, _ in search.search("men skirt 1", fields=["name"])},
+            self.expected("men skirt 1", False, ["name"]),
+        )
+        self.assertEqual(search._built_at, built_at)
+
+    def test_unseen_writes_of_other_fields_are_not_reindexed(self):
+        search = NgramSearch()
+        search.prepare()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(category=self.category).update(price=1)
+            Product.objects.filter(name="Women Skirt 0").update(name="Women Kilt 0")
+        with mock.patch.object(search, "_put", wraps=search._put) as put:
+            self.assertEqual(len(search.search("kilt")), 1)
+        self.assertEqual(put.call_count, 1)
+
+    def test_rebuilds_in_the_background_when_old(self):
+        search = NgramSearch()
+        search.prepare()
+        search._built_at -= 3600
+        started = threading.Event()
+        with mock.patch.object(search, "rebuild", side_effect=started.wait) as rebuild:
+            # The old index answers while the rebuild runs
+            self.assertEqual(len(search.search("skirt 1")), 11)
+            thread = search._rebuilding
+            self.assertEqual(len(search.search("skirt 1")), 11)
+            started.set()
+            thread.join()
+        rebuild.assert_called_once_with()
+        self.assertIsNone(search._rebuilding)
+
+
+class SerializeGroupsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Groups", slug="groups")
+        Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"Group {i}",
+                slug=f"group-{i}",
+                description="Soft" if i % 2 else None,
+                price=Decimal(i * 10),
+                is_active=i % 3 > 0,
+            )
+            for i in range(12)
+        )
+        StockManagement.objects.create(product=Product.objects.first(), quantity=3)
+
+    def test_matches_serializer_output(self):
+        for serializer_class in (
+            Module6ProductSerializer,
+            module7_serializers.ProductSerializer,
+            module7_serializers.ProductStockSerializer,
+        ):
+            with self.subTest(serializer=serializer_class.__module__):
+                products = Product.objects.order_by("pk")
+                fast = compiled(serializer_class)
+                expected = serializer_class(products, many=True).data
+                self.assertEqual(fast.serialize(products), expected)
+                self.assertEqual(
+                    [fast.from_values(row) for row in products.values(*fast.columns)],
+                    expected,
+                )
+
+    def test_groups_match_separate_queries(self):
+        groups = {
+            "cheap": Q(price__lt=50),
+            "not_soft": ~Q(description="Soft"),
+            "active_or_dear": Q(is_active=True) | Q(price__gte=100),
+            "none": Q(pk__in=[]),
+        }
+        serializer = compiled(Module6ProductSerializer)
+        with self.assertNumQueries(1):
+            data = serializer.serialize_groups(Product.objects.order_by("pk"), groups)
+        for name, predicate in groups.items():
+            with self.subTest(group=name):
+                self.assertEqual(
+                    data[name],
+                    serializer.serialize(
+                        Product.objects.filter(predicate).order_by("pk")
+                    ),
+                )
+
+
+class IndexedFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Filters", slug="filters")
+        Product.objects.bulk_create(
+            Product(
+                category=cls.category,
+                name=f"Filter {i}",
+                slug=f"filter-{i}",
+                price=Decimal(i),
+                is_active=i % 2 == 0,
+            )
+            for i in range(10)
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_stamps.clear()
+
+    def get(self, query, view=module6_views.ProductQueryViewSet):
+        request = APIRequestFactory().get(f"/{query}")
+        response = view.as_view({"get": "list"})(request)
+        response.render()
+        return response
+
+    def test_index_lookups(self):
+        lookups = index_lookups(Product)
+        self.assertIn("range", lookups["price"])
+        self.assertIn("in", lookups["category"])
+        self.assertIn("istartswith", lookups["name"])
+        self.assertNotIn("is_active", lookups)
+        # varchar_pattern_ops serves prefixes and equality, not ranges
+        self.assertEqual(index_lookups(Category)["path"], {"exact", "startswith"})
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_filters_compile_to_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.get(
+                f"?price__range=2,7&is_active=true&category__in={self.category.pk}"
+                "&ordering=-price"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product["name"] for product in response.data["results"]],
+            ["Filter 6", "Filter 4", "Filter 2"],
+        )
+
+    def test_rejected_filters(self):
+        for query in (
+            "?description=x",  # not a declared filter
+            "?created_at=2024-01-01",  # lookup not declared
+            "?is_active=true",  # residual filters need an indexed one
+            "?price__gte=abc",
+            "?price__range=1",
+            "?id__in=" + ",".join(map(str, range(101))),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.get(query).status_code, 400)
+
+    def test_unindexed_declaration(self):
+        class UnindexedViewSet(module6_views.CategoryQueryViewSet):
+            filter_fields = {"level": ["exact"]}
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.get("?level=1", view=UnindexedViewSet)
+
+    def test_scan_check(self):
+        def plan(rows):
+            return {
+                "Node Type": "Limit",
+                "Plan Rows": 3,
+                "Plans": [
+                    {
+                        "Node Type": "Seq Scan",
+                        "Relation Name": Product._meta.db_table,
+                        "Plan Rows": rows,
+                    }
+                ],
+            }
+
+        backend = IndexedFilterBackend()
+        queryset = Product.objects.filter(price__gte=1)
+        for table_rows, plan_rows, scans in (
+            (1_000_000, 900_000, True),  # most of a large table
+            (1_000_000, 500_000, True),
+            (1_000_000, 20, False),  # few rows: the estimate is trusted
+            (5_000, 5_000, False),  # a small table is cheap to scan
+        ):
+            with self.subTest(table_rows=table_rows, plan_rows=plan_rows):
+                with (
+                    mock.patch.object(
+                        core_filters, "query_plan", return_value=plan(plan_rows)
+                    ),
+                    mock.patch.object(
+                        core_filters, "estimate_count", return_value=table_rows
+                    ),
+                ):
+                    self.assertEqual(backend.scans_table(queryset), scans)
+
+        index_scan = {"Node Type": "Index Scan", "Relation Name": "x", "Plan Rows": 1}
+        with mock.patch.object(core_filters, "query_plan", return_value=index_scan):
+            self.assertFalse(backend.scans_table(queryset))
+        with mock.patch.object(core_filters, "query_plan", return_value=None):
+            self.assertFalse(backend.scans_table(queryset))
+
+
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = Category.objects.bulk_create(
+            Category(name=f"Facets {i}", slug=f"facets-{i}") for i in range(3)
+        )
+        Product.objects.bulk_create(
+            Product(
+                category=cls.categories[i % 3],
+                name=f"Facet {i}",
+                slug=f"facet-{i}",
+                price=Decimal(i * 7),
+                is_active=i % 2 == 0,
+                is_digital=i % 5 == 0,
+            )
+            for i in range(20)
+        )
+
+    def test_counts_match_separate_queries(self):
+        products = Product.objects.filter(price__lt=100)
+        with self.assertNumQueries(1):
+            counts = facet_counts(products)
+        self.assertEqual(
+            {facet["value"]: facet["count"] for facet in counts["category"]},
+            {
+                category.pk: products.filter(category=category).count()
+                for category in self.categories
+            },
+        )
+        for flag in ("is_active", "is_digital"):
+            self.assertEqual(
+                {facet["value"]: facet["count"] for facet in counts[flag]},
+                {
+                    True: products.filter(**{flag: True}).count(),
+                    False: products.filter(**{flag: False}).count(),
+                },
+            )
+        for facet in counts["price"]:
+            bucket = products.filter(price__gte=facet["value"]["min_price"])
+            if facet["value"]["max_price"] is not None:
+                bucket = bucket.filter(price__lt=facet["value"]["max_price"])
+            self.assertEqual(facet["count"], bucket.count())
+        self.assertEqual(
+            sum(facet["count"] for facet in counts["created_month"]), products.count()
+        )
+
+    def test_selected_facets_only(self):
+        counts = facet_counts(Product.objects.none(), ["is_active", "price"])
+        self.assertEqual(set(counts), {"is_active", "price"})
+        self.assertEqual(sum(facet["count"] for facet in counts["price"]), 0)
+
+
+class NormalizedResponseTests(TestCase):
+    # view: {field holding an id: its side-loaded collection}
+    views = {
+        module7_views.ProductCategoryViewSet: {"category": "categories"},
+        module7_views.ReturnWithOnlyViewSet: {"category": "categories"},
+        module7_views.StockManagementViewSet: {"product": "products"},
+        module7_views.RevStockManagementViewSet: {"stock": "stock"},
+        module7_views.ProductPromotionEventViewSet: {
+            "promotion_event": "promotion_events"
+        },
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create(
+            Category(name=f"Normalized {i}", slug=f"normalized-{i}") for i in range(2)
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                category=categories[i % 2],
+                name=f"Normalized {i}",
+                slug=f"normalized-{i}",
+                price=Decimal(i),
+            )
+            for i in range(6)
+        )
+        StockManagement.objects.bulk_create(
+            StockManagement(product=product, quantity=i)
+            for i, product in enumerate(products[:3])
+        )
+        now = timezone.now()
+        events = PromotionEvent.objects.bulk_create(
+            PromotionEvent(
+                name=f"Sale {i}",
+                start_date=now,
+                end_date=now + timedelta(days=1),
+                price_reduction=10,
+            )
+            for i in range(2)
+        )
+        ProductPromotionEvent.objects.bulk_create(
+            ProductPromotionEvent(product=product, promotion_event=event)
+            for product in products[:2]
+            for event in events
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_stamps.clear()
+
+    def get(self, view, accept=None):
+        headers = {"HTTP_ACCEPT": accept} if accept else {}
+        response = view.as_view({"get": "list"})(
+            APIRequestFactory().get("/", **headers)
+        )
+        response.render()
+        return response
+
+    def nest(self, value, data, references):
+        """The nested form of normalized ``value``."""
+        if isinstance(value, list):
+            return [self.nest(item, data, references) for item in value]
+        if not isinstance(value, dict):
+            return value
+        return {
+            key: (
+                data[references[key]][str(item)]
+                if key in references and item is not None
+                else self.nest(item, data, references)
+            )
+            for key, item in value.items()
+        }
+
+    def test_same_data_as_nested(self):
+        for view, references in self.views.items():
+            with self.subTest(view=view.__name__):
+                nested = self.get(view)
+                response = self.get(view, "application/vnd.normalized+json")
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("Accept", response["Vary"])
+                self.assertNotEqual(response["ETag"], nested["ETag"])
+                data = json.loads(response.content)
+                self.assertTrue(data["results"])
+                self.assertEqual(
+                    self.nest(data["results"], data, references),
+                    json.loads(nested.content),
+                )
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_each_related_object_once(self):
+        with self.assertNumQueries(2):
+            response = self.get(
+                module7_views.ProductCategoryViewSet, "application/vnd.normalized+json"
+            )
+        data = json.loads(response.content)
+        self.assertEqual(len(data["results"]), 6)
+        self.assertEqual(len(data["categories"]), 2)
+
+
+class KeysetWalkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Walks", slug="walks")
+        Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"Walk {i}",
+                slug=f"walk-{i}",
+                price=Decimal(i % 4),
+            )
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_stamps.clear()
+
+    def test_chunks_cover_every_row_once(self):
+        ordering = ("-price", "-id")
+        expected = list(
+            Product.objects.order_by(*ordering).values_list("pk", flat=True)
+        )
+        with self.assertNumQueries(4):
+            chunks = list(keyset_chunks(Product.objects.all(), ordering, 7))
+        self.assertEqual([len(chunk) for chunk in chunks], [7, 7, 7, 4])
+        self.assertEqual([row.pk for chunk in chunks for row in chunk], expected)
+
+    def test_window_and_stream_walk_the_catalog(self):
+        expected = list(
+            Product.objects.order_by("price", "id").values_list("pk", flat=True)
+        )
+        window = module6_views.ProductWindowViewSet.as_view({"get": "list"})
+        url, walked = "/?ordering=price&limit=10", []
+        while url:
+            response = window(APIRequestFactory().get(url))
+            walked += [product["id"] for product in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(walked, expected)
+
+        stream = module6_views.ProductStreamViewSet.as_view({"get": "list"})
+        with self.settings(PRODUCT_STREAM_CHUNK_SIZE=10):
+            response = stream(APIRequestFactory().get("/?ordering=price"))
+            lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], expected)
+
+    def test_rejected_keys(self):
+        window = module6_views.ProductWindowViewSet.as_view({"get": "list"})
+        for query in ("?ordering=name", "?ordering=price&after=1", "?after=x"):
+            with self.subTest(query=query):
+                response = window(APIRequestFactory().get(f"/{query}"))
+                self.assertEqual(response.status_code, 400)
+
+
+class SnapshotNumpyCheckTests(SimpleTestCase):
+    def test_enabled_without_numpy_fails(self):
+        with mock.patch.object(snapshot_module, "np", None):
+            self.assertEqual(check_snapshot_numpy(), [])
+            with self.settings(PRODUCT_SNAPSHOT_ENABLED=True):
+                self.assertEqual(
+                    [error.id for error in check_snapshot_numpy()], ["inventory.E001"]
+                )
+                with self.assertRaises(ImproperlyConfigured):
+                    product_snapshot()
+
+
+@skipUnless(np is not None, "the snapshot needs numpy")
+class CatalogSnapshotTests(TestCase):
+    cases = [
+        ({"price__range": (Decimal("5.5"), 30)}, ("price", "id")),
+        ({"price__gt": Decimal("9.999"), "is_active__exact": True}, ("-price", "-id")),
+        ({"price__exact": Decimal("12.5")}, ("id",)),
+        ({"is_digital__exact": False, "id__in": [1, 2, 3]}, ("-id",)),
+        ({"created_at__lte": timezone.now()}, ("created_at", "id")),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = Category.objects.bulk_create(
+            Category(name=f"Snapshot {i}", slug=f"snapshot-{i}") for i in range(2)
+        )
+        Product.objects.bulk_create(
+            Product(
+                category=cls.categories[i % 2],
+                name=f"Snapshot {i}",
+                slug=f"snapshot-{i}",
+                price=Decimal(i * 5) / 2,
+                is_active=i % 3 != 0,
+                is_digital=i % 4 == 0,
+            )
+            for i in range(24)
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_stamps.clear()
+
+    def expected(self, filters, ordering, position=None):
+        products = Product.objects.filter(**filters).order_by(*ordering)
+        if position is not None:
+            products = products.filter(_seek(ordering, position))
+        return list(products.values_list("pk", flat=True))
+
+    def test_selects_like_sql(self):
+        snapshot = CatalogSnapshot()
+        for filters, ordering in self.cases:
+            with self.subTest(filters=filters, ordering=ordering):
+                expected = self.expected(filters, ordering)
+                self.assertEqual(snapshot.select(filters, ordering).tolist(), expected)
+                if len(expected) > 2:
+                    middle = Product.objects.get(pk=expected[len(expected) // 2])
+                    position = [getattr(middle, name.lstrip("-")) for name in ordering]
+                    self.assertEqual(
+                        snapshot.select(filters, ordering, position, limit=3).tolist(),
+                        self.expected(filters, ordering, position)[:3],
+                    )
+
+    def test_follows_writes(self):
+        snapshot = CatalogSnapshot()
+        snapshot.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name="Snapshot 1").update(price=1000)
+            created = Product.objects.create(
+                category=self.categories[0], name="New", slug="new", price=1001
+            )
+        filters = {"price__gte": 1000}
+        self.assertEqual(
+            snapshot.select(filters, ("price", "id")).tolist(),
+            self.expected(filters, ("price", "id")),
+        )
+        self.assertIn(created.pk, snapshot.select(filters, ("id",)).tolist())
+
+        # Deletes are not polled for: the page read finds the row gone
+        with self.captureOnCommitCallbacks(execute=True):
+            created.delete()
+        rows = snapshot.page(Product.objects.all(), filters, ("id",))
+        self.assertEqual([row.name for row in rows], ["Snapshot 1"])
+        self.assertNotIn(created.pk, snapshot.select(filters, ("id",)).tolist())
+
+    @override_settings(
+        PRODUCT_SNAPSHOT_ENABLED=True,
+        QUERY_FILTER_PLAN_CHECK=False,
+        CACHES=LOCAL_CACHE,
+    )
+    def test_endpoint_reads_only_the_page(self):
+        product_snapshot().load()
+        view = module6_views.ProductQueryViewSet.as_view({"get": "list"})
+        query = "?price__gte=10&is_active=true&ordering=-price&page_size=5"
+        with self.assertNumQueries(1):
+            response = view(APIRequestFactory().get(f"/{query}"))
+        with self.settings(PRODUCT_SNAPSHOT_ENABLED=False):
+            sql = view(APIRequestFactory().get(f"/{query}"))
+        self.assertEqual(response.data, sql.data)
+
+
+class CategoryPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        cls.hats = Category.objects.create(name="Hats", slug="hats")
+        cls.boots = Category.objects.create(
+            name="Boots", slug="boots", parent=cls.shoes
+        )
+        cls.hiking = Category.objects.create(
+            name="Hiking", slug="hiking", parent=cls.boots
+        )
+
+    def paths(self):
+        return dict(Category.objects.values_list("slug", "path"))
+
+    def test_reparenting_moves_the_subtree(self):
+        self.boots.parent = self.hats
+        self.boots.save()
+
+        hats, boots, hiking = self.hats.pk, self.boots.pk, self.hiking.pk
+        self.assertEqual(self.boots.path, f"/{hats}/{boots}/")
+        self.assertEqual(self.paths()["hiking"], f"/{hats}/{boots}/{hiking}/")
+        self.assertEqual(Category.objects.get(pk=hiking).level, 2)
+        self.assertEqual(
+            set(Category.objects.descendants(self.hats)), {self.boots, self.hiking}
+        )
+        self.assertFalse(Category.objects.descendants(self.shoes).exists())
+        hiking = Category.objects.get(pk=hiking)
+        self.assertEqual(
+            list(Category.objects.ancestors(hiking).order_by("level")),
+            [self.hats, self.boots],
+        )
+
+    def test_moving_to_the_root(self):
+        self.boots.parent = None
+        self.boots.save(update_fields=["parent"])
+
+        self.assertEqual(self.boots.level, 0)
+        self.assertEqual(self.paths()["hiking"], f"/{self.boots.pk}/{self.hiking.pk}/")
+        hiking = Category.objects.get(pk=self.hiking.pk)
+        self.assertEqual(
+            list(Category.objects.ancestors(hiking, include_self=True)),
+            [self.boots, self.hiking],
+        )
+
+    def test_cycles_are_rejected(self):
+        before = self.paths()
+        self.shoes.parent = self.hiking
+        with self.assertRaises(TreeCycleError):
+            self.shoes.save()
+
+        # Parents swapped by a bulk write, then synced together
+        with self.assertRaises(TreeCycleError), transaction.atomic():
+            Category.objects.filter(pk=self.hats.pk).update(parent=self.shoes)
+            Category.objects.filter(pk=self.shoes.pk).update(parent=self.hats)
+            Category.objects.sync_paths([self.hats, self.shoes])
+        self.assertEqual(self.paths(), before)
+
+    def test_backfill_matches_sync(self):
+        expected = self.paths()
+        Category.objects.update(path="", level=0)
+
+        backfill_paths(apps, None)
+
+        self.assertEqual(self.paths(), expected)
+        self.assertEqual(Category.objects.get(pk=self.hiking.pk).level, 2)
+
+
+class CountStrategyPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Pages", slug="pages")
+        cls.add(5)
+
+    @classmethod
+    def add(cls, n, start=0):
+        Product.objects.bulk_create(
+            Product(
+                category=cls.category,
+                name=f"Page {i}",
+                slug=f"page-{i}",
+                price=Decimal(i),
+            )
+            for i in range(start, start + n)
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_stamps.clear()
+
+    def paginator(self):
+        return CountStrategyPaginator(
+            Product.objects.order_by("id"),
+            2,
+            estimate_threshold=10**9,
+            cache_ttl=60,
+        )
+
+    def test_cached_count_does_not_bound_pages(self):
+        self.assertEqual(self.paginator().count, 5)
+        self.add(2, start=5)
+
+        paginator = self.paginator()
+        self.assertEqual(paginator.count, 5)  # still the cached count
+        self.assertTrue(paginator.page(3).has_next())
+        last = paginator.page(4)
+        self.assertEqual([product.name for product in last], ["Page 6"])
+        self.assertFalse(last.has_next())
+        with self.assertRaises(EmptyPage):
+            paginator.page(5)
+
+    def test_endpoint_lists_rows_added_after_the_count(self):
+        view = module5_views.ProductListViewSet.as_view({"get": "list"})
+
+        def get(query):
+            response = view(APIRequestFactory().get(f"/{query}"))
+            response.render()
+            return response
+
+        first = get("?page=1")
+        self.add(2, start=5)
+        last = get("?page=4")
+
+        self.assertEqual(first.data["count"], 5)
+        self.assertIs(first.data["count_is_estimate"], False)
+        self.assertEqual(last.status_code, 200)
+        self.assertEqual(
+            [product["name"] for product in last.data["results"]], ["Page 6"]
+        )
+        self.assertIsNone(last.data["next"])
+        self.assertEqual(get("?page=5").status_code, 404)
+
+    def test_estimated_count_is_flagged(self):
+        paginator = module5_views.ProductPagination()
+        request = Request(APIRequestFactory().get("/"))
+        with mock.patch.object(core_pagination, "estimate_count", return_value=10**7):
+            paginator.paginate_queryset(Product.objects.order_by("id"), request)
+            data = paginator.get_paginated_response([]).data
+        self.assertEqual((data["count"], data["count_is_estimate"]), (10**7, True))
+
+        schema = paginator.get_paginated_response_schema({"type": "array"})
+        self.assertIn("count_is_estimate", schema["required"])
+        self.assertEqual(schema["properties"]["count_is_estimate"]["type"], "boolean")
+
+    def test_endpoint_keyset_pages_are_opt_in(self):
+        view = module5_views.ProductListViewSet.as_view({"get": "list"})
+
+        def get(url):
+            response = view(APIRequestFactory().get(url))
+            response.render()
+            return response
+
+        numbered = get("/")
+        self.assertEqual(numbered.data["count"], 5)
+        self.assertIn("page=2", numbered.data["next"])
+
+        keyset = get("/?cursor=&ordering=-price")
+        self.assertNotIn("count", keyset.data)
+        self.assertEqual(
+            [product["name"] for product in keyset.data["results"]],
+            ["Page 4", "Page 3"],
+        )
+        following = get(keyset.data["next"])
+        self.assertEqual(
+            [product["name"] for product in following.data["results"]],
+            ["Page 2", "Page 1"],
+        )
+
+
+class VersionStampTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name="Stamps", slug="stamps")
+
+    def setUp(self):
+        cache.clear()
+        local_responses.clear()
+        local_stamps.clear()
+
+    def get(self, **headers):
+        view = module5_views.CategoryListViewSet.as_view({"get": "list"})
+        response = view(APIRequestFactory().get("/", **headers))
+        if response.status_code == 200:
+            response.render()
+        return response
+
+    def test_local_memory_cache_fails_the_checks(self):
+        self.assertEqual(check_shared_cache(), [])
+        with override_settings(CACHES=LOCAL_CACHE):
+            self.assertEqual(
+                [error.id for error in check_shared_cache()], ["core.E001"]
+            )
+
+    def test_stamps_bumped_by_another_process(self):
+        self.assertEqual(self.get()["X-Cache"], "MISS")
+        self.assertEqual(self.get()["X-Cache"], "LOCAL-HIT")
+
+        # A management command or another worker: its own cache connection
+        Category.objects.create(name="Imported", slug="imported")
+        other = caches.create_connection(DEFAULT_CACHE_ALIAS)
+        other.set(VERSION_KEY.format("inventory.category"), time.time_ns(), None)
+
+        # Seen once this process's copy of the stamp expires
+        self.assertEqual(self.get()["X-Cache"], "LOCAL-HIT")
+        local_stamps.clear()
+        response = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("imported", [category["slug"] for category in response.data])
+
+    def test_hot_reads_skip_the_database(self):
+        self.get()
+        # Conditional and cached: the stamps are read once, from memory
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get()["X-Cache"], "LOCAL-HIT")
+        local_stamps.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get()["X-Cache"], "LOCAL-HIT")
+
+    def test_unchanged_resource_is_not_modified(self):
+        first = self.get()
+        etag = first["ETag"]
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_the_etag(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(slug="stamps").update(name="Renamed")
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data[0]["name"], "Renamed")
+
+
+class PriceStatisticsTests(TestCase):
+    # Buckets (default edges): [0, 10) [10, 25) [25, 50) [50, 100) ...
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        cls.hats = Category.objects.create(name="Hats", slug="hats")
+        for i, (category, price) in enumerate(
+            [
+                (cls.shoes, "5.00"),
+                (cls.shoes, "7.50"),
+                (cls.shoes, "9.99"),
+                (cls.shoes, "30.00"),
+                (cls.hats, "12.00"),
+                (cls.hats, "99.00"),
+            ]
+        ):
+            Product.objects.create(
+                category=category, name=f"Priced {i}", slug=f"priced-{i}", price=price
+            )
+
+    def expected(self, category_id=None):
+        products = Product.objects.all()
+        if category_id is not None:
+            products = products.filter(category_id=category_id)
+        prices = sorted(products.values_list("price", flat=True))
+        edges = bucket_edges()
+        histogram = [0] * len(edges)
+        for price in prices:
+            histogram[bucket_of(price, edges)] += 1
+        return {
+            "count": len(prices),
+            "min_price": prices[0] if prices else None,
+            "max_price": prices[-1] if prices else None,
+            "avg_price": (sum(prices) / len(prices)).quantize(Decimal("0.01"))
+            if prices
+            else None,
+            "histogram": histogram,
+        }
+
+    def assertCurrent(self):
+        for category_id in (None, self.shoes.pk, self.hats.pk):
+            with self.subTest(category=category_id):
+                stats = price_statistics(category_id)
+                stats["histogram"] = [row["count"] for row in stats.pop("histogram")]
+                del stats["category"]
+                self.assertEqual(stats, self.expected(category_id))
+
+    def buckets(self):
+        return sorted(
+            PriceBucket.objects.filter(count__gt=0).values_list(
+                "category_id", "bucket", "count", "total", "min_price", "max_price"
+            )
+        )
+
+    def test_saves(self):
+        self.assertCurrent()
+        Product.objects.create(
+            category=self.hats, name="Priced 6", slug="priced-6", price="0.50"
+        )
+        self.assertCurrent()
+
+    def test_price_change_across_buckets(self):
+        product = Product.objects.get(slug="priced-0")  # the cheapest shoe
+        product.price = Decimal("60.00")
+        product.save()
+        self.assertCurrent()
+
+        product.category = self.hats
+        product.price = Decimal("8.00")
+        product.save(update_fields=["category", "price"])
+        self.assertCurrent()
+
+    def test_deleting_bucket_extremes(self):
+        Product.objects.get(price="5.00").delete()  # lowest of its bucket
+        Product.objects.get(price="9.99").delete()  # highest of the same bucket
+        self.assertCurrent()
+        self.assertEqual(
+            PriceBucket.objects.get(category=self.shoes, bucket=0).min_price,
+            Decimal("7.50"),
+        )
+
+        Product.objects.get(price="7.50").delete()  # the bucket is empty now
+        self.assertCurrent()
+        row = PriceBucket.objects.get(category=self.shoes, bucket=0)
+        self.assertEqual((row.count, row.min_price, row.max_price), (0, None, None))
+
+    def test_rebuild_agrees_with_incremental_state(self):
+        Product.objects.filter(slug="priced-3").update(price="3.00")
+        Product.objects.get(slug="priced-4").delete()
+        incremental = self.buckets()
+        self.assertCurrent()
+
+        PriceBucket.objects.all().delete()
+        rebuild_price_stats()
+
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_endpoint(self):
+        view = module5_views.PriceStatisticsViewSet
+
+        def get(action, **kwargs):
+            response = view.as_view({"get": action})(
+                APIRequestFactory().get("/"), **kwargs
+            )
+            if response.status_code == 200:
+                response.render()
+            return response
+
+        data = get("list").data
+        self.assertEqual(data["count"], 6)
+        self.assertEqual(data["cheapest_product"]["name"], "Priced 0")
+        self.assertEqual(data["most_expensive_product"]["name"], "Priced 5")
+
+        data = get("retrieve", pk=str(self.hats.pk)).data
+        self.assertEqual((data["count"], data["min_price"]), (2, "12.00"))
+        self.assertEqual(get("retrieve", pk="0").status_code, 404)
+
+
+class ProductCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        cls.hats = Category.objects.create(name="Hats", slug="hats")
+        cls.empty = Category.objects.create(name="Empty", slug="empty")
+        for i, (category, is_active) in enumerate(
+            [(cls.shoes, True), (cls.shoes, False), (cls.hats, True)]
+        ):
+            Product.objects.create(
+                category=category,
+                name=f"Counted {i}",
+                slug=f"counted-{i}",
+                price="10.00",
+                is_active=is_active,
+            )
+
+    def counts(self, category):
+        row = CategoryProductCount.objects.get(category=category)
+        return row.products, row.active_products
+
+    def test_saves_and_deletes(self):
+        self.assertEqual(check_product_counts(), {})
+        self.assertEqual(self.counts(self.shoes), (2, 1))
+
+        product = Product.objects.create(
+            category=self.hats, name="Counted 3", slug="counted-3", price="10.00"
+        )
+        self.assertEqual(check_product_counts(), {})
+        product.delete()
+        Product.objects.get(slug="counted-0").delete()
+        self.assertEqual(check_product_counts(), {})
+        self.assertEqual(self.counts(self.shoes), (1, 0))
+
+    def test_is_active_toggle(self):
+        product = Product.objects.get(slug="counted-1")
+        product.is_active = True
+        product.save()
+        self.assertEqual(check_product_counts(), {})
+        self.assertEqual(self.counts(self.shoes), (2, 2))
+
+    def test_category_move(self):
+        product = Product.objects.get(slug="counted-0")
+        product.category = self.empty
+        product.save(update_fields=["category"])
+        self.assertEqual(check_product_counts(), {})
+        self.assertEqual(self.counts(self.empty), (1, 1))
+        self.assertEqual(self.counts(self.shoes), (1, 0))
+
+    def test_bulk_update(self):
+        Product.objects.filter(category=self.shoes).update(is_active=True)
+        self.assertEqual(check_product_counts(), {})
+        Product.objects.filter(slug="counted-2").update(category=self.shoes)
+        self.assertEqual(check_product_counts(), {})
+        self.assertEqual(self.counts(self.shoes), (3, 3))
+        self.assertEqual(self.counts(self.hats), (0, 0))
+
+    def test_rebuild_repairs_drift(self):
+        CategoryProductCount.objects.filter(category=self.shoes).update(
+            products=7, active_products=0
+        )
+        CategoryProductCount.objects.filter(category=self.hats).delete()
+        self.assertEqual(
+            check_product_counts(),
+            {self.shoes.pk: ((7, 0), (2, 1)), self.hats.pk: ((0, 0), (1, 1))},
+        )
+
+        self.assertEqual(rebuild_product_counts(), 2)
+        self.assertEqual(check_product_counts(), {})
+        self.assertEqual(rebuild_product_counts(), 0)
+
+    def test_distinct_category_endpoint(self):
+        view = module5_views.DistinctCategoryViewSet.as_view({"get": "list"})
+        response = view(APIRequestFactory().get("/"))
+        response.render()
+        self.assertEqual(response.data, sorted([self.shoes.pk, self.hats.pk]))
@@ -0,0 +1,390 @@
+"""
+Set-based bulk write helpers for the module4 endpoints.
+"""
+
+import uuid
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from inventory.models import Category, TreeCycleError
+from rest_framework.exceptions import ValidationError
+
+from .serializers import CategoryUpsertSerializer
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+
+CREATED = "created"
+UPDATED = "updated"
+FAILED = "failed"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+
+UPSERT_STATUSES = (CREATED, UPDATED, FAILED)
+PATCH_STATUSES = (UPDATED, UNCHANGED, NOT_FOUND, FAILED)
+
+# Unique Category fields a patch may change
+UNIQUE_FIELDS = ("name", "slug")
+
+
+def parse_batch_size(value, default=DEFAULT_BATCH_SIZE):
+    """Read a ``batch_size`` query parameter, clamped to ``MAX_BATCH_SIZE``."""
+    if value in (None, ""):
+        return default
+    try:
+        batch_size = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({"batch_size": "A valid integer is required."})
+    if batch_size < 1:
+        raise ValidationError({"batch_size": "Must be greater than zero."})
+    return min(batch_size, MAX_BATCH_SIZE)
+
+
+def chunked(items, size):
+    """Yield lists of up to ``size`` items from any iterable."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _failed(index, row, errors):
+    slug = row.get("slug") if isinstance(row, dict) else None
+    return {"index": index, "slug": slug, "status": FAILED, "errors": errors}
+
+
+def upsert_categories(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert or update categories keyed on ``slug``.
+
+    ``rows`` may be any iterable (e.g. a ``JSONStream``) and is consumed
+    ``batch_size`` rows at a time. Each chunk is validated without touching
+    the database, then uniqueness of ``name``/``slug`` and existence of
+    ``parent`` are checked with three set-based queries. Valid rows are
+    written with ``INSERT ... ON CONFLICT (slug) DO UPDATE``, each chunk in
+    its own savepoint together with its tree path update, so one bad chunk
+    does not roll back the rest of the sync. The whole sync is one
+    transaction: a ``JSONStream`` that turns out malformed or truncated
+    part way raises ``ParseError`` and nothing is written.
+
+    Returns one result dict per input row, in input order.
+    """
+    results = []
+    seen_slugs, seen_names = set(), set()
+    with transaction.atomic():
+        for chunk in chunked(rows, batch_size):
+            results.extend(_upsert_chunk(chunk, len(results), seen_slugs, seen_names))
+    return results
+
+
+def _upsert_chunk(rows, offset, seen_slugs, seen_names):
+    row_serializer = CategoryUpsertSerializer()
+    results = [None] * len(rows)
+    valid = []  # (position in chunk, validated_data)
+
+    # 1. Field-level validation only (no queries)
+    for position, row in enumerate(rows):
+        try:
+            valid.append((position, row_serializer.run_validation(row)))
+        except ValidationError as exc:
+            results[position] = _failed(offset + position, row, exc.detail)
+
+    # 2. Duplicates inside the payload: the first occurrence wins
+    slugs, names, unique_rows = set(), set(), []
+    for position, data in valid:
+        if data["slug"] in seen_slugs:
+            results[position] = _failed(
+                offset + position, data, {"slug": ["Duplicate slug in payload."]}
+            )
+        elif data["name"] in seen_names:
+            results[position] = _failed(
+                offset + position, data, {"name": ["Duplicate name in payload."]}
+            )
+        else:
+            seen_slugs.add(data["slug"])
+            seen_names.add(data["name"])
+            slugs.add(data["slug"])
+            names.add(data["name"])
+            unique_rows.append((position, data))
+
+    # 3. Set-based checks against the table
+    existing_paths = dict(
+        Category.objects.filter(slug__in=slugs).values_list("slug", "path")
+    )
+    name_owners = dict(
+        Category.objects.filter(name__in=names).values_list("name", "slug")
+    )
+    parent_ids = {data["parent"] for _, data in unique_rows if data.get("parent")}
+    parent_paths = dict(
+        Category.objects.filter(pk__in=parent_ids).values_list("pk", "path")
+    )
+
+    writable = []
+    for position, data in unique_rows:
+        owner = name_owners.get(data["name"])
+        parent_id = data.get("parent")
+        own_path = existing_paths.get(data["slug"])
+        if owner is not None and owner != data["slug"]:
+            results[position] = _failed(
+                offset + position,
+                data,
+                {"name": ["category with this name already exists."]},
+            )
+        elif parent_id and parent_id not in parent_paths:
+            results[position] = _failed(
+                offset + position, data, {"parent": [f'Invalid pk "{parent_id}".']}
+            )
+        elif parent_id and own_path and parent_paths[parent_id].startswith(own_path):
+            results[position] = _failed(
+                offset + position,
+                data,
+                {"parent": ["A category cannot be moved under its descendants."]},
+            )
+        else:
+            writable.append((position, data))
+
+    if not writable:
+        return results
+
+    # 4. INSERT ... ON CONFLICT (slug) DO UPDATE
+    categories = [
+        Category(
+            parent_id=data.get("parent"),
+            name=data["name"],
+            slug=data["slug"],
+            is_active=data.get("is_active", False),
+        )
+        for _, data in writable
+    ]
+    try:
+        with transaction.atomic():
+            Category.objects.bulk_create(
+                categories,
+                update_conflicts=True,
+                unique_fields=["slug"],
+                update_fields=["parent", "name", "is_active"],
+            )
+            Category.objects.sync_paths(categories)
+    except (IntegrityError, TreeCycleError) as exc:
+        # A concurrent writer took a name between the checks and the write,
+        # or moves inside this chunk would form a cycle
+        for position, data in writable:
+            results[position] = _failed(
+                offset + position, data, {"non_field_errors": [str(exc)]}
+            )
+        return results
+
+    for (position, data), category in zip(writable, categories):
+        results[position] = {
+            "index": offset + position,
+            "id": category.pk,
+            "slug": data["slug"],
+            "status": UPDATED if data["slug"] in existing_paths else CREATED,
+        }
+    return results
+
+
+def bulk_patch_categories(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Apply partial updates ``[{"id": <pk>, <field>: <value>, ...}]``.
+
+    ``rows`` may be any iterable and is consumed ``batch_size`` rows at a
+    time. For each chunk the targets are loaded with one query, uniqueness
+    and parents are checked with two more, and only columns whose value
+    actually changes are written: rows sharing the same change become one
+    ``UPDATE ... WHERE id IN (...)``, the rest go through ``bulk_update``
+    grouped by the set of changed columns. All chunks are written in one
+    transaction.
+
+    Returns one result dict per input row, in input order.
+    """
+    results, seen_ids = [], set()
+    with transaction.atomic():
+        for chunk in chunked(rows, batch_size):
+            results.extend(_patch_chunk(chunk, len(results), seen_ids))
+    return results
+
+
+def _patch_chunk(rows, offset, seen_ids):
+    row_serializer = CategoryUpsertSerializer(partial=True)
+    results = [None] * len(rows)
+    patches = []
+
+    # 1. Shape and field-level validation (no queries)
+    for position, row in enumerate(rows):
+        index = offset + position
+        pk = row.get("id") if isinstance(row, dict) else None
+        if not isinstance(pk, int) or isinstance(pk, bool):
+            results[position] = _failed_patch(
+                index, pk, {"id": ["A valid integer is required."]}
+            )
+            continue
+        if pk in seen_ids:
+            results[position] = _failed_patch(index, pk, {"id": ["Duplicate id."]})
+            continue
+        seen_ids.add(pk)
+        fields = {key: value for key, value in row.items() if key != "id"}
+        try:
+            patches.append((position, pk, row_serializer.run_validation(fields)))
+        except ValidationError as exc:
+            results[position] = _failed_patch(index, pk, exc.detail)
+
+    # 2. Load every target at once and keep only real changes
+    targets = Category.objects.in_bulk([pk for _, pk, _ in patches])
+    changes = []
+    for position, pk, data in patches:
+        target = targets.get(pk)
+        if target is None:
+            results[position] = {
+                "index": offset + position,
+                "id": pk,
+                "status": NOT_FOUND,
+            }
+            continue
+        diff = {
+            field: value
+            for field, value in data.items()
+            if getattr(target, "parent_id" if field == "parent" else field) != value
+        }
+        changes.append((position, pk, diff))
+
+    # 3. Set-based parent checks, then uniqueness against the batch's final
+    # state: a value is free once the row holding it takes another one
+    parent_ids = {diff["parent"] for _, _, diff in changes if diff.get("parent")}
+    parent_paths = dict(
+        Category.objects.filter(pk__in=parent_ids).values_list("pk", "path")
+    )
+    errors_at, candidates = {}, []
+    for position, pk, diff in changes:
+        parent_id = diff.get("parent")
+        if parent_id and parent_id not in parent_paths:
+            errors_at[position] = {"parent": [f'Invalid pk "{parent_id}".']}
+        elif parent_id and parent_paths[parent_id].startswith(targets[pk].path):
+            errors_at[position] = {
+                "parent": [
+                    "A category cannot be moved under itself or its descendants."
+                ]
+            }
+        elif diff:
+            candidates.append((position, pk, diff))
+
+    values = {
+        field: {diff[field] for _, _, diff in candidates if field in diff}
+        for field in UNIQUE_FIELDS
+    }
+    holders = {field: {} for field in UNIQUE_FIELDS}  # {value: pk} as stored
+    for pk, name, slug in Category.objects.filter(
+        Q(name__in=values["name"]) | Q(slug__in=values["slug"])
+    ).values_list("pk", "name", "slug"):
+        holders["name"][name] = pk
+        holders["slug"][slug] = pk
+    while True:
+        # Rows that fail keep their stored values, which may fail others:
+        # values still held by a row staying put first, then the values two
+        # rows of the batch take (the first one wins)
+        moving = {pk: diff for _, pk, diff in candidates}
+        failed = {}
+        for field in UNIQUE_FIELDS:
+            for position, pk, diff in candidates:
+                holder = holders[field].get(diff.get(field))
+                if holder is not None and field not in moving.get(holder, {}):
+                    failed.setdefault(position, []).append(field)
+        if not failed:
+            for field in UNIQUE_FIELDS:
+                claimed = {}
+                for position, pk, diff in candidates:
+                    if field in diff and claimed.setdefault(diff[field], pk) != pk:
+                        failed.setdefault(position, []).append(field)
+        if not failed:
+            break
+        for position, fields in failed.items():
+            errors_at[position] = {
+                field: [f"category with this {field} already exists."]
+                for field in fields
+            }
+        candidates = [row for row in candidates if row[0] not in failed]
+
+    writable = []
+    for position, pk, diff in changes:
+        if position in errors_at:
+            results[position] = _failed_patch(
+                offset + position, pk, errors_at[position]
+            )
+        elif not diff:
+            results[position] = {
+                "index": offset + position,
+                "id": pk,
+                "status": UNCHANGED,
+            }
+        else:
+            writable.append((position, pk, diff))
+
+    # 4. Write only the changed columns
+    same_change, by_columns = {}, {}
+    for _, pk, diff in writable:
+        same_change.setdefault(tuple(sorted(diff.items())), []).append(pk)
+    # Unique indexes are checked row by row, so rows handing a name or slug
+    # over to another row (a swap) give it up for a placeholder first
+    taken = {
+        field: {diff[field] for _, _, diff in writable if field in diff}
+        for field in UNIQUE_FIELDS
+    }
+    parked = {}
+    for _, pk, diff in writable:
+        fields = tuple(
+            field
+            for field in UNIQUE_FIELDS
+            if field in diff and getattr(targets[pk], field) in taken[field]
+        )
+        if fields:
+            placeholder = f"~{uuid.uuid4().hex}"
+            parked.setdefault(fields, []).append(
+                Category(pk=pk, **dict.fromkeys(fields, placeholder))
+            )
+    try:
+        with transaction.atomic():
+            for fields, categories in parked.items():
+                Category.objects.bulk_update(categories, fields)
+            for change, pks in same_change.items():
+                values = {
+                    "parent_id" if field == "parent" else field: value
+                    for field, value in change
+                }
+                if len(pks) == 1:
+                    columns = tuple(values)
+                    by_columns.setdefault(columns, []).append(
+                        Category(pk=pks[0], **values)
+                    )
+                    continue
+                Category.objects.filter(pk__in=pks).update(**values)
+            for columns, categories in by_columns.items():
+                Category.objects.bulk_update(categories, columns)
+            Category.objects.sync_paths(
+                [targets[pk] for _, pk, diff in writable if "parent" in diff]
+            )
+    except (IntegrityError, TreeCycleError) as exc:
+        for position, pk, _ in writable:
+            results[position] = _failed_patch(
+                offset + position, pk, {"non_field_errors": [str(exc)]}
+            )
+        return results
+
+    for position, pk, diff in writable:
+        results[position] = {
+            "index": offset + position,
+            "id": pk,
+            "status": UPDATED,
+            "fields": sorted(diff),
+        }
+    return results
+
+
+def _failed_patch(index, pk, errors):
+    return {"index": index, "id": pk, "status": FAILED, "errors": errors}
+
+
+def summarize(results, statuses=UPSERT_STATUSES):
+    summary = dict.fromkeys(statuses, 0)
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
@@ -0,0 +1,212 @@
+"""
+Chunked, set-based cascade deletes.
+
+``QuerySet.delete()`` runs Django's collector, which loads every row that
+the cascade reaches into Python before deleting anything. Here the cascade
+is walked from model metadata instead and executed as ``DELETE ... WHERE fk
+IN (subquery)`` statements, children before parents, a bounded number of
+rows per transaction. Memory stays flat however many rows hang off the
+deleted objects.
+
+Like ``QuerySet.update()``, these deletes do not send ``pre_delete`` or
+``post_delete`` signals; the version stamps of the affected models are
+bumped, and the product summaries of categories that lost products
+rebuilt in the transaction that deleted them, instead.
+"""
+
+from core.versions import bump_version
+from django.db import models, transaction
+from inventory.models import Product
+from inventory.summaries import rebuild as rebuild_summaries
+
+DEFAULT_DELETE_CHUNK_SIZE = 1000
+
+BLOCKING = (models.PROTECT, models.RESTRICT)
+SUPPORTED = (models.CASCADE, models.SET_NULL, models.DO_NOTHING, *BLOCKING)
+
+
+class DeleteBlocked(Exception):
+    """Rows outside the delete set reference it through PROTECT/RESTRICT."""
+
+    def __init__(self, blockers):
+        self.blockers = blockers
+        super().__init__(f"Delete blocked by {blockers}")
+
+
+def _relations(model):
+    """Reverse one-to-one/many relations, as Django's collector finds them."""
+    return [
+        field
+        for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created
+        and not field.concrete
+        and (field.one_to_one or field.one_to_many)
+    ]
+
+
+def _referencing(rel, queryset):
+    """Rows of ``rel.related_model`` pointing at the rows in ``queryset``."""
+    field = rel.field
+    return rel.related_model._base_manager.filter(
+        **{f"{field.attname}__in": queryset.values(field.target_field.attname)}
+    )
+
+
+class ChunkedCascadeDelete:
+    """
+    Delete ``model`` rows with primary keys ``pks`` and everything that
+    cascades from them.
+
+    Each CASCADE relation of the root model is drained ``chunk_size`` rows at
+    a time, one transaction per chunk, deleting the chunk's own dependents
+    first. The root rows are then locked, checked for blockers once more
+    and deleted in a final short transaction: a PROTECT/RESTRICT reference
+    added while draining raises ``DeleteBlocked`` with every root row still
+    in place (the chunks drained so far stay deleted). ``on_progress`` is
+    called with the running report after every chunk.
+    """
+
+    def __init__(
+        self, model, pks, chunk_size=DEFAULT_DELETE_CHUNK_SIZE, on_progress=None
+    ):
+        self.model = model
+        self.pks = list(pks)
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.report = {"deleted": {}, "chunks": 0}
+        self.product_categories = set()
+
+    @property
+    def root(self):
+        return self.model._base_manager.filter(pk__in=self.pks)
+
+    ####
+    #  Planning / dry run
+    ####
+
+    def _walk(self, model, queryset, chain=()):
+        """
+        Yield ``(rel, referencing queryset)`` for the whole cascade tree.
+        Raises ``ValueError`` for relations the chunked delete cannot
+        follow, before anything is deleted.
+        """
+        for rel in _relations(model):
+            name = f"{rel.related_model._meta.label}.{rel.field.name}"
+            if rel.on_delete not in SUPPORTED:
+                raise ValueError(
+                    f"{name} has on_delete={rel.on_delete.__name__}, which the "
+                    "chunked delete does not support"
+                )
+            if rel.on_delete is models.CASCADE and rel.related_model in (
+                *chain,
+                model,
+            ):
+                raise ValueError(
+                    f"{name} cascades back to {rel.related_model._meta.label}, "
+                    "which the chunked delete does not support"
+                )
+            related = _referencing(rel, queryset)
+            if not chain and rel.related_model is self.model:
+                # Self references inside the delete set do not count
+                related = related.exclude(pk__in=self.pks)
+            yield rel, related
+            if rel.on_delete is models.CASCADE:
+                yield from self._walk(rel.related_model, related, chain + (model,))
+
+    def blockers(self):
+        blockers = {}
+        for rel, related in self._walk(self.model, self.root):
+            if rel.on_delete in BLOCKING:
+                count = related.count()
+                if count:
+                    blockers[rel.related_model._meta.label] = count
+        return blockers
+
+    def count(self):
+        """Dry run: rows that would be deleted or updated, and any blockers."""
+        deleted = {self.model._meta.label: self.root.count()}
+        set_null = {}
+        for rel, related in self._walk(self.model, self.root):
+            label = rel.related_model._meta.label
+            if rel.on_delete is models.CASCADE:
+                deleted[label] = deleted.get(label, 0) + related.count()
+            elif rel.on_delete is models.SET_NULL:
+                set_null[label] = set_null.get(label, 0) + related.count()
+        return {"deleted": deleted, "set_null": set_null, "blocked_by": self.blockers()}
+
+    ####
+    #  Execution
+    ####
+
+    def _add(self, model, count):
+        label = model._meta.label
+        self.report["deleted"][label] = self.report["deleted"].get(label, 0) + count
+        if count:
+            bump_version(model)
+
+    def _delete_subtree(self, model, queryset):
+        """Delete ``queryset`` after its dependents; call inside a transaction."""
+        for rel in _relations(model):
+            related = _referencing(rel, queryset)
+            if rel.on_delete is models.CASCADE:
+                self._delete_subtree(rel.related_model, related)
+            elif rel.on_delete is models.SET_NULL:
+                if related.update(**{rel.field.name: None}):
+                    bump_version(rel.related_model)
+        if model is Product:
+            self.product_categories.update(
+                queryset.order_by().values_list("category_id", flat=True).distinct()
+            )
+        self._add(model, queryset._raw_delete(queryset.db))
+
+    def _rebuild_summaries(self):
+        """
+        Rebuild the summaries of the categories that lost products; call in
+        the transaction that deleted them, so a later failure cannot leave
+        committed deletes uncounted.
+        """
+        if self.product_categories:
+            rebuild_summaries(self.product_categories)
+            self.product_categories = set()
+
+    def _drain(self, rel):
+        """Delete the rows of one root relation in bounded chunks."""
+        model = rel.related_model
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    _referencing(rel, self.root)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[: self.chunk_size]
+                )
+                if not ids:
+                    return
+                self._delete_subtree(model, model._base_manager.filter(pk__in=ids))
+                self._rebuild_summaries()
+            self.report["chunks"] += 1
+            if self.on_progress:
+                self.on_progress(self.report)
+
+    def run(self):
+        blockers = self.blockers()
+        if blockers:
+            raise DeleteBlocked(blockers)
+
+        for rel in _relations(self.model):
+            if rel.on_delete is models.CASCADE and rel.related_model is not self.model:
+                self._drain(rel)
+
+        with transaction.atomic():
+            # Lock the roots so no new dependents can be attached meanwhile,
+            # check again for blockers that appeared while draining, then
+            # sweep anything that slipped in before the lock
+            list(self.root.select_for_update().values_list("pk", flat=True))
+            blockers = self.blockers()
+            if blockers:
+                raise DeleteBlocked(blockers)
+            self._delete_subtree(self.model, self.root)
+            self._rebuild_summaries()
+
+        if self.on_progress:
+            self.on_progress(self.report)
+        return self.report
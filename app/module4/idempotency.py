@@ -0,0 +1,200 @@
+"""
+``Idempotency-Key`` support for module4 write endpoints.
+
+The first request with a given key claims a row in ``IdempotencyKey``,
+runs the view and stores the response. Retries with the same key and
+payload get the stored response back without running the view again;
+the same key with a different payload is rejected. A claim is leased for
+``IDEMPOTENCY_LOCK_TIMEOUT`` seconds: a retry after that takes over the
+key of a request that never finished. Recent outcomes are
+also kept in a small in-process LRU so hot retries skip the database.
+"""
+
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from core.cache import LocalCache
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .parsers import JSONStream
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENCY_PARAMETER = OpenApiParameter(
+    name=HEADER,
+    type=str,
+    location=OpenApiParameter.HEADER,
+    description="Retries with the same key replay the first response",
+    required=False,
+)
+
+
+def key_ttl():
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+
+
+def lock_timeout():
+    return getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 5 * 60)
+
+
+local_cache = LocalCache(
+    max_entries=getattr(settings, "IDEMPOTENCY_LOCAL_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "IDEMPOTENCY_LOCAL_CACHE_TTL", 60),
+)
+
+_last_purge = 0.0
+PURGE_INTERVAL = 300  # seconds between opportunistic purges per process
+
+
+def purge_expired():
+    """Delete expired keys. Returns the number of rows removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+def _maybe_purge():
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge > PURGE_INTERVAL:
+        _last_purge = now
+        purge_expired()
+
+
+def fingerprint(request):
+    if isinstance(request.data, JSONStream):
+        # Hash streamed bodies as raw bytes rather than decoding them up front
+        payload = request.data.digest()
+    else:
+        payload = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(
+        f"{request.method} {request.path}\n{payload}".encode()
+    ).hexdigest()
+
+
+def _replay(outcome):
+    status_code, body = outcome
+    response = Response(body, status=status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _claim(scope, key, digest):
+    """
+    Claim ``(scope, key)`` for this request. Returns ``(lease, None)`` when
+    claimed, where ``lease`` is the claim's ``locked_until``, otherwise
+    ``(None, response)`` with the response to send instead of running the
+    view. A claim still in progress past its lease belonged to a worker
+    that died or timed out, and is taken over.
+    """
+    for _ in range(2):
+        now = timezone.now()
+        lease = now + timedelta(seconds=lock_timeout())
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    fingerprint=digest,
+                    locked_until=lease,
+                    expires_at=now + timedelta(seconds=key_ttl()),
+                )
+            return lease, None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if existing is None:
+            continue  # evicted in between; try to claim again
+        if existing.expires_at < now:
+            existing.delete()
+            continue
+        if existing.fingerprint != digest:
+            return None, Response(
+                {"error": f"{HEADER} was already used with a different payload"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if existing.status_code is None:
+            if existing.locked_until is not None and existing.locked_until > now:
+                return None, Response(
+                    {"error": f"A request with this {HEADER} is still in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            # Only one retry wins the takeover: the lease must be unchanged
+            taken = IdempotencyKey.objects.filter(
+                pk=existing.pk,
+                status_code__isnull=True,
+                locked_until=existing.locked_until,
+            ).update(locked_until=lease)
+            if taken:
+                return lease, None
+            continue
+        outcome = (existing.status_code, existing.response_body)
+        local_cache.set((scope, key), (digest, outcome))
+        return None, _replay(outcome)
+
+    return None, Response(
+        {"error": f"Could not claim {HEADER}, please retry"},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def idempotent(view_method):
+    """Make a ViewSet write action honour the ``Idempotency-Key`` header."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        scope = f"{type(self).__name__}.{view_method.__name__}"
+        digest = fingerprint(request)
+
+        cached = local_cache.get((scope, key))
+        if cached is not None and cached[0] == digest:
+            return _replay(cached[1])
+
+        _maybe_purge()
+        lease, conflict = _claim(scope, key, digest)
+        if conflict is not None:
+            return conflict
+
+        # Untouched if another request took the claim over meanwhile
+        claim = IdempotencyKey.objects.filter(
+            scope=scope, key=key, status_code__isnull=True, locked_until=lease
+        )
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            claim.delete()
+            raise
+
+        if response.status_code >= 500:
+            # Server errors are not stored so the client can retry
+            claim.delete()
+            return response
+
+        outcome = (response.status_code, response.data)
+        claim.update(
+            status_code=outcome[0], response_body=outcome[1], locked_until=None
+        )
+        local_cache.set((scope, key), (digest, outcome))
+        return response
+
+    return wrapper
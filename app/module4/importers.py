@@ -0,0 +1,394 @@
+"""
+Streaming bulk import of products with their stock rows.
+
+Input is read incrementally from a binary stream (CSV or NDJSON), validated
+in chunks (optionally in a process pool) and written one transaction per
+chunk, so memory is bounded by ``chunk_size`` rather than by the file size.
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from core.versions import bump_version
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from inventory.models import Category, Product, StockManagement
+from inventory.summaries import products_added
+from rest_framework.exceptions import ValidationError
+
+from .serializers import ProductImportRowSerializer
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+
+AUTO = "auto"
+COPY = "copy"
+INSERT = "insert"
+METHODS = (AUTO, COPY, INSERT)
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_MAX_ERRORS = 1000
+READ_BLOCK_SIZE = 64 * 1024
+
+PRODUCT_COLUMNS = [
+    "category_id",
+    "name",
+    "slug",
+    "description",
+    "is_digital",
+    "is_active",
+    "created_at",
+    "updated_at",
+    "price",
+]
+STOCK_COLUMNS = ["product_id", "quantity", "last_checked_at"]
+
+
+class InvalidRecord:
+    """Placeholder for an input line that could not be decoded."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+####
+#  Reading
+####
+
+
+def iter_lines(stream, block_size=READ_BLOCK_SIZE):
+    """Yield decoded lines from a binary stream, reading fixed-size blocks."""
+    pending = b""
+    first = True
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        if first:
+            block = block.removeprefix(b"\xef\xbb\xbf")  # UTF-8 BOM
+            first = False
+        pending += block
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace") + "\n"
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
+
+
+def read_records(stream, input_format):
+    """Yield ``(line_number, record)`` pairs from a CSV or NDJSON stream."""
+    if input_format == CSV:
+        reader = csv.DictReader(iter_lines(stream))
+        for record in reader:
+            # Empty cells count as "not provided" so field defaults apply
+            record = {key: value for key, value in record.items() if value != ""}
+            # Header is line 1; quoted newlines make line_num the record's end
+            yield reader.line_num, record
+    elif input_format == NDJSON:
+        for line_number, line in enumerate(iter_lines(stream), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, InvalidRecord(f"Invalid JSON: {exc.msg}")
+    else:
+        raise ValueError(f"Unknown input format {input_format!r}")
+
+
+def detect_format(content_type="", filename=""):
+    """Guess the input format from a content type or file name."""
+    if filename.endswith((".ndjson", ".jsonl")):
+        return NDJSON
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return NDJSON
+    return CSV
+
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+####
+#  Validation (no database access: may run in worker processes)
+####
+
+
+def _plain(detail):
+    """Convert DRF error details to plain lists/dicts of strings."""
+    if isinstance(detail, dict):
+        return {key: _plain(value) for key, value in detail.items()}
+    if isinstance(detail, list):
+        return [_plain(value) for value in detail]
+    return str(detail)
+
+
+def validate_chunk(chunk):
+    """Field-level validation of ``(line, record)`` pairs."""
+    serializer = ProductImportRowSerializer()
+    valid, bad = [], []
+    for line, record in chunk:
+        if isinstance(record, InvalidRecord):
+            bad.append({"line": line, "errors": {"non_field_errors": [record.message]}})
+            continue
+        try:
+            valid.append((line, dict(serializer.run_validation(record))))
+        except ValidationError as exc:
+            bad.append({"line": line, "errors": _plain(exc.detail)})
+    return valid, bad
+
+
+####
+#  Loading
+####
+
+
+def _copy_rows(cursor, table, columns, rows):
+    """Load rows with PostgreSQL ``COPY ... FROM STDIN``."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(
+        quote(table), ", ".join(quote(column) for column in columns)
+    )
+    raw_cursor = cursor.cursor
+    if hasattr(raw_cursor, "copy_expert"):  # psycopg2
+        raw_cursor.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with raw_cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+class ProductStockImporter:
+    """
+    Import products and their StockManagement rows chunk by chunk.
+
+    ``workers`` > 1 validates chunks in a process pool while the main
+    process writes. ``method`` is ``copy`` (PostgreSQL only), ``insert``
+    (multi-row INSERT via ``bulk_create``) or ``auto``. ``on_progress`` is
+    called with the running report after every chunk and ``on_error`` with
+    every bad row; the report itself keeps at most ``max_errors`` of them.
+    """
+
+    def __init__(
+        self,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        workers=0,
+        method=AUTO,
+        max_errors=DEFAULT_MAX_ERRORS,
+        on_progress=None,
+        on_error=None,
+    ):
+        if method not in METHODS:
+            raise ValueError(f"Unknown load method {method!r}")
+        if method == AUTO:
+            method = COPY if connection.vendor == "postgresql" else INSERT
+        elif method == COPY and connection.vendor != "postgresql":
+            raise ValueError("COPY loading requires PostgreSQL")
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.method = method
+        self.max_errors = max_errors
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.category_ids = {}  # slug -> id, filled lazily
+        self.report = {
+            "processed": 0,
+            "imported": 0,
+            "failed": 0,
+            "chunks": 0,
+            "errors": [],
+            "errors_truncated": False,
+        }
+
+    def run(self, records):
+        for valid, bad in self._validated_chunks(iter_chunks(records, self.chunk_size)):
+            self.report["processed"] += len(valid) + len(bad)
+            bad.extend(self._load_chunk(valid))
+            for error in bad:
+                self._record_error(error)
+            self.report["chunks"] += 1
+            if self.on_progress:
+                self.on_progress(self.report)
+        return self.report
+
+    def _validated_chunks(self, chunks):
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield validate_chunk(chunk)
+            return
+
+        # Forked workers inherit the configured Django app registry; they
+        # never touch the database, so the inherited connection is unused.
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            # Keep a bounded number of chunks in flight to cap memory
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(validate_chunk, chunk))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _record_error(self, error):
+        self.report["failed"] += 1
+        if self.on_error:
+            self.on_error(error)
+        if len(self.report["errors"]) < self.max_errors:
+            self.report["errors"].append(error)
+        else:
+            self.report["errors_truncated"] = True
+
+    def _resolve_categories(self, slugs):
+        missing = set(slugs) - self.category_ids.keys()
+        if missing:
+            self.category_ids.update(
+                Category.objects.filter(slug__in=missing).values_list("slug", "id")
+            )
+
+    def _load_chunk(self, valid):
+        """Check the chunk against the database and write it. Returns bad rows."""
+        if not valid:
+            return []
+
+        bad = []
+        self._resolve_categories({row["category"] for _, row in valid})
+        names = {row["name"] for _, row in valid}
+        slugs = {row["slug"] for _, row in valid}
+        taken_names, taken_slugs = set(), set()
+        for name, slug in Product.objects.filter(
+            Q(name__in=names) | Q(slug__in=slugs)
+        ).values_list("name", "slug"):
+            taken_names.add(name)
+            taken_slugs.add(slug)
+
+        accepted = []
+        for line, row in valid:
+            if row["category"] not in self.category_ids:
+                errors = {"category": [f'Unknown category slug "{row["category"]}".']}
+            elif row["slug"] in taken_slugs:
+                errors = {"slug": ["product with this slug already exists."]}
+            elif row["name"] in taken_names:
+                errors = {"name": ["product with this name already exists."]}
+            else:
+                taken_slugs.add(row["slug"])
+                taken_names.add(row["name"])
+                accepted.append((line, row))
+                continue
+            bad.append({"line": line, "errors": errors})
+
+        if not accepted:
+            return bad
+
+        rows = [row for _, row in accepted]
+        try:
+            with transaction.atomic():
+                if self.method == COPY:
+                    self._copy(rows)
+                else:
+                    self._insert(rows)
+        except IntegrityError as exc:
+            # Lost a race with a concurrent writer: report the whole chunk
+            bad.extend(
+                {"line": line, "errors": {"non_field_errors": [str(exc)]}}
+                for line, _ in accepted
+            )
+            return bad
+
+        self.report["imported"] += len(rows)
+        return bad
+
+    def _copy(self, rows):
+        # COPY bypasses the ORM, so the version stamps are bumped and the
+        # product summaries updated by hand
+        bump_version(Product)
+        bump_version(StockManagement)
+        products_added(
+            Product(
+                category_id=self.category_ids[row["category"]],
+                price=row["price"],
+                is_active=row["is_active"],
+            )
+            for row in rows
+        )
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            _copy_rows(
+                cursor,
+                Product._meta.db_table,
+                PRODUCT_COLUMNS,
+                (
+                    (
+                        self.category_ids[row["category"]],
+                        row["name"],
+                        row["slug"],
+                        row.get("description"),
+                        row["is_digital"],
+                        row["is_active"],
+                        now.isoformat(),
+                        now.isoformat(),
+                        row["price"],
+                    )
+                    for row in rows
+                ),
+            )
+            product_ids = dict(
+                Product.objects.filter(
+                    slug__in=[row["slug"] for row in rows]
+                ).values_list("slug", "id")
+            )
+            _copy_rows(
+                cursor,
+                StockManagement._meta.db_table,
+                STOCK_COLUMNS,
+                (
+                    (product_ids[row["slug"]], row["quantity"], now.isoformat())
+                    for row in rows
+                ),
+            )
+
+    def _insert(self, rows):
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    category_id=self.category_ids[row["category"]],
+                    name=row["name"],
+                    slug=row["slug"],
+                    description=row.get("description"),
+                    is_digital=row["is_digital"],
+                    is_active=row["is_active"],
+                    price=row["price"],
+                )
+                for row in rows
+            ]
+        )
+        if any(product.pk is None for product in products):
+            # Backend cannot return ids from a bulk insert
+            ids = dict(
+                Product.objects.filter(
+                    slug__in=[row["slug"] for row in rows]
+                ).values_list("slug", "id")
+            )
+            for product in products:
+                product.pk = ids[product.slug]
+        StockManagement.objects.bulk_create(
+            [
+                StockManagement(product=product, quantity=row["quantity"])
+                for product, row in zip(products, rows)
+            ]
+        )
@@ -0,0 +1,82 @@
+import time
+import uuid
+from decimal import Decimal
+
+from core.serializers import compiled
+from django.core.management.base import BaseCommand
+from inventory.models import Category, Product
+from module5.serializers import ProductSerializer as FlatProductSerializer
+from module7.serializers import ProductSerializer as NestedProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ProductSerializer(many=True).data against the compiled "
+        "read-only serializer on a temporary set of products, end to end "
+        "(query + serialization) and serialization only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3, help="Best of n runs")
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(
+            name=f"bench-{suffix}", slug=f"bench-{suffix}", is_active=True
+        )
+        Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"bench-{suffix}-{i}",
+                slug=f"bench-{suffix}-{i}",
+                description="Benchmark product",
+                price=Decimal(i % 1000) + Decimal("0.99"),
+                is_active=bool(i % 2),
+            )
+            for i in range(options["rows"])
+        )
+        try:
+            products = Product.objects.filter(category=category).order_by("id")
+            for label, serializer_class, queryset in (
+                ("flat", FlatProductSerializer, products),
+                (
+                    "nested",
+                    NestedProductSerializer,
+                    products.select_related("category"),
+                ),
+            ):
+                self.compare(label, serializer_class, queryset, options["repeat"])
+        finally:
+            category.delete()
+
+    def compare(self, label, serializer_class, products, repeat):
+        fast = compiled(serializer_class)
+        if serializer_class(products, many=True).data != fast.serialize(products):
+            self.stderr.write(self.style.ERROR(f"{label}: outputs differ"))
+            return
+
+        instances = list(products)
+        rows = list(products.values_list(*fast.columns))
+        timings = {
+            "drf, end to end": lambda: serializer_class(products.all(), many=True).data,
+            "compiled, end to end": lambda: fast.serialize(products),
+            "drf, serialize only": lambda: serializer_class(instances, many=True).data,
+            "compiled, serialize only": lambda: fast.serialize(rows),
+        }
+        best = {name: self.best_of(run, repeat) for name, run in timings.items()}
+
+        self.stdout.write(f"{label} ({serializer_class.__module__}), {len(rows)} rows:")
+        for name, elapsed in best.items():
+            self.stdout.write(f"  {name:>24}: {elapsed * 1000:8.1f} ms")
+        for scope in ("end to end", "serialize only"):
+            speedup = best[f"drf, {scope}"] / best[f"compiled, {scope}"]
+            self.stdout.write(f"  {f'speedup, {scope}':>24}: {speedup:8.1f}x")
+
+    def best_of(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,132 @@
+import time
+import uuid
+from decimal import Decimal
+
+from core.pagination import KeysetPagination
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from inventory.models import Category, Product
+from inventory.snapshot import CatalogSnapshot, np
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark keyset pages of broad product filters served by SQL "
+        "against the in-memory columnar snapshot (inventory.snapshot), on "
+        "the product table plus a temporary set of products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50_000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5, help="Best of n runs")
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("The snapshot needs numpy installed.")
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(
+            name=f"bench-{suffix}", slug=f"bench-{suffix}", is_active=True
+        )
+        Product.objects.bulk_create(
+            (
+                Product(
+                    category=category,
+                    name=f"bench-{suffix}-{i}",
+                    slug=f"bench-{suffix}-{i}",
+                    description="Benchmark product",
+                    price=Decimal(i * 7919 % 1000) + Decimal("0.99"),
+                    is_active=bool(i % 3),
+                    is_digital=not i % 5,
+                )
+                for i in range(options["rows"])
+            ),
+            batch_size=5_000,
+        )
+        try:
+            snapshot = CatalogSnapshot()
+            load = self.best_of(snapshot.load, 1)
+            self.stdout.write(
+                f"snapshot of {Product.objects.count()} products: "
+                f"loaded in {load * 1000:.1f} ms"
+            )
+            cases = {
+                "price range, by price": (
+                    {"price__range": (100, 500)},
+                    ("price", "id"),
+                ),
+                "active and cheap, newest": (
+                    {"is_active__exact": True, "price__lt": 300},
+                    ("-created_at", "-id"),
+                ),
+                "digital, by -price": (
+                    {"is_digital__exact": True},
+                    ("-price", "-id"),
+                ),
+            }
+            for label, (filters, ordering) in cases.items():
+                self.compare(
+                    label,
+                    snapshot,
+                    filters,
+                    ordering,
+                    options["page_size"],
+                    options["repeat"],
+                )
+
+            changed = Product.objects.filter(category=category).values_list(
+                "pk", flat=True
+            )
+            Product.objects.filter(
+                pk__in=list(changed[: options["rows"] // 100])
+            ).update(price=Decimal("1.00"))
+            # Nothing is in flight: reaching back would re-read the new rows
+            with override_settings(PRODUCT_SNAPSHOT_LAG=0):
+                poll = self.best_of(snapshot.refresh, 1)
+            self.stdout.write(
+                f"poll after updating 1% of the rows: {poll * 1000:.1f} ms"
+            )
+        finally:
+            category.delete()
+
+    def compare(self, label, snapshot, filters, ordering, page_size, repeat):
+        products = Product.objects.all()
+        paginator = KeysetPagination()
+        matched = snapshot.select(filters, ordering)
+        # A page from the middle: the seek costs SQL more the deeper it is
+        middle = products.get(pk=matched[len(matched) // 2]) if len(matched) else None
+        positions = {"first page": None}
+        if middle is not None:
+            positions["middle page"] = [
+                getattr(middle, name.lstrip("-")) for name in ordering
+            ]
+
+        self.stdout.write(f"{label}, {len(matched)} matches:")
+        for where, position in positions.items():
+
+            def sql():
+                return paginator.fetch(
+                    products.filter(**filters), ordering, position, page_size + 1
+                )
+
+            def memory():
+                return snapshot.page(
+                    products, filters, ordering, position, page_size + 1
+                )
+
+            if [row.pk for row in sql()] != [row.pk for row in memory()]:
+                self.stderr.write(self.style.ERROR(f"  {where}: pages differ"))
+                continue
+            slow, fast = self.best_of(sql, repeat), self.best_of(memory, repeat)
+            self.stdout.write(
+                f"  {where:>12}: sql {slow * 1000:7.1f} ms, snapshot "
+                f"{fast * 1000:7.1f} ms, {slow / fast:5.1f}x"
+            )
+
+    def best_of(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
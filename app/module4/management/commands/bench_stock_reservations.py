@@ -0,0 +1,98 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from inventory.models import Category, Product, StockManagement
+
+from module4.reservations import commit, reserve, shard_stock
+from module4.stock import decrement_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent checkouts of one product: a guarded UPDATE on "
+        "the StockManagement row against sharded SKIP LOCKED reservations. "
+        "Meaningful on PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--checkouts", type=int, default=50, help="Per thread")
+        parser.add_argument(
+            "--work-ms",
+            type=float,
+            default=5,
+            help="Time each checkout transaction spends after taking stock",
+        )
+        parser.add_argument("--shards", type=int, default=8)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Running on {connection.vendor}: row locks and SKIP LOCKED "
+                    "are not available, numbers are not representative."
+                )
+            )
+
+        total = options["threads"] * options["checkouts"]
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(
+            name=f"bench-{suffix}", slug=f"bench-{suffix}"
+        )
+        product = Product.objects.create(
+            category=category, name=f"bench-{suffix}", slug=f"bench-{suffix}", price=1
+        )
+        stock = StockManagement.objects.create(product=product, quantity=total)
+        work = options["work_ms"] / 1000
+
+        def naive():
+            with transaction.atomic():
+                decrement_stock({product.pk: 1})
+                time.sleep(work)  # the rest of the order transaction
+
+        def reserved():
+            with transaction.atomic():
+                reservations = reserve({product.pk: 1})
+                time.sleep(work)
+                commit([r.token for r in reservations])
+
+        try:
+            for label, checkout in (("row update", naive), ("reservations", reserved)):
+                StockManagement.objects.filter(pk=stock.pk).update(quantity=total)
+                shard_stock([product.pk], shards=options["shards"])
+                elapsed, errors = self.run_threads(
+                    checkout, options["threads"], options["checkouts"]
+                )
+                done = total - errors
+                self.stdout.write(
+                    f"{label:>12}: {done} checkouts in {elapsed:.2f}s "
+                    f"({done / elapsed:.0f}/s), {errors} errors"
+                )
+        finally:
+            category.delete()
+
+    def run_threads(self, checkout, threads, checkouts):
+        errors = []
+        start_line = threading.Barrier(threads)
+
+        def worker():
+            try:
+                start_line.wait()
+                for _ in range(checkouts):
+                    try:
+                        checkout()
+                    except Exception:
+                        errors.append(1)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - started, len(errors)
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import Category
+
+from module4.deletion import (
+    DEFAULT_DELETE_CHUNK_SIZE,
+    ChunkedCascadeDelete,
+    DeleteBlocked,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete categories and everything that cascades from them in bounded "
+        "chunks, without loading the cascade into memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="+", type=int, help="Category ids")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_DELETE_CHUNK_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rows would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        def on_progress(report):
+            deleted = ", ".join(
+                f"{label}={count}" for label, count in report["deleted"].items()
+            )
+            self.stdout.write(f"chunk {report['chunks']}: {deleted}")
+
+        deleter = ChunkedCascadeDelete(
+            Category,
+            options["ids"],
+            chunk_size=options["chunk_size"],
+            on_progress=on_progress,
+        )
+
+        if options["dry_run"]:
+            counts = deleter.count()
+            for label, count in counts["deleted"].items():
+                self.stdout.write(f"would delete {count} {label}")
+            for label, count in counts["set_null"].items():
+                self.stdout.write(f"would set null on {count} {label}")
+            for label, count in counts["blocked_by"].items():
+                self.stdout.write(self.style.WARNING(f"blocked by {count} {label}"))
+            return
+
+        try:
+            report = deleter.run()
+        except DeleteBlocked as e:
+            raise CommandError(f"Delete blocked by {e.blockers}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {report['deleted'].get(Category._meta.label, 0)} "
+                f"categories in {report['chunks']} chunks"
+            )
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from module4.reservations import expire_reservations, settle
+
+
+class Command(BaseCommand):
+    help = (
+        "Release pending stock reservations past their expiry and fold "
+        "committed ones into StockManagement."
+    )
+
+    def handle(self, *args, **options):
+        released = expire_reservations()
+        settled = settle()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Released {released} expired reservations, settled {settled}"
+            )
+        )
@@ -0,0 +1,80 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from module4.importers import (
+    DEFAULT_CHUNK_SIZE,
+    FORMATS,
+    METHODS,
+    ProductStockImporter,
+    detect_format,
+    read_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products and their stock rows from a CSV or NDJSON file "
+        "(use '-' for stdin) into the inventory tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or '-' to read stdin")
+        parser.add_argument("--format", choices=FORMATS, dest="input_format")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Validate chunks in a pool of this many processes",
+        )
+        parser.add_argument("--method", choices=METHODS, default="auto")
+        parser.add_argument(
+            "--errors-file",
+            help="Write every rejected row to this file as NDJSON",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["input_format"] or detect_format(filename=path)
+        errors_file = None
+        if options["errors_file"]:
+            errors_file = open(options["errors_file"], "w", encoding="utf-8")
+
+        def on_progress(report):
+            self.stdout.write(
+                f"chunk {report['chunks']}: {report['processed']} processed, "
+                f"{report['imported']} imported, {report['failed']} failed"
+            )
+
+        def on_error(error):
+            if errors_file:
+                errors_file.write(json.dumps(error) + "\n")
+
+        try:
+            importer = ProductStockImporter(
+                chunk_size=options["chunk_size"],
+                workers=options["workers"],
+                method=options["method"],
+                on_progress=on_progress,
+                on_error=on_error,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            report = importer.run(read_records(stream, input_format))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+            if errors_file:
+                errors_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report['imported']} of {report['processed']} rows "
+                f"({report['failed']} failed) using {importer.method}"
+            )
+        )
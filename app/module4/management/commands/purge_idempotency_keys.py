@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from module4.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records whose TTL has expired."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired keys"))
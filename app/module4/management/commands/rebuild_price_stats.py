@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from inventory.prices import price_statistics, rebuild_price_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the price statistics summary (PriceBucket) from the "
+        "products: after changing PRICE_STATS_BUCKETS or writes that bypassed "
+        "the ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids", nargs="*", type=int, help="Category ids (default: all)"
+        )
+
+    def handle(self, *args, **options):
+        rebuild_price_stats(options["ids"] or None)
+        overall = price_statistics()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{overall['count']} products, "
+                f"{overall['min_price']} - {overall['max_price']}, "
+                f"average {overall['avg_price']}"
+            )
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from module4.reservations import shard_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Split (or re-sync) the reservable stock of products over sub-counters "
+        "so concurrent reservations do not queue on one row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="+", type=int, help="Product ids")
+        parser.add_argument("--shards", type=int, help="Sub-counters per product")
+
+    def handle(self, *args, **options):
+        if options["shards"] is not None and options["shards"] < 1:
+            raise CommandError("--shards must be greater than zero")
+
+        available = shard_stock(options["ids"], shards=options["shards"])
+        for product_id in options["ids"]:
+            if product_id in available:
+                self.stdout.write(f"product {product_id}: {available[product_id]}")
+            else:
+                self.stdout.write(
+                    self.style.WARNING(f"product {product_id}: no stock row")
+                )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.counts import check_product_counts, rebuild_product_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the maintained per-category product counters with the "
+        "products and, with --repair, rebuild the ones that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids", nargs="*", type=int, help="Category ids (default: all)"
+        )
+        parser.add_argument(
+            "--repair", action="store_true", help="Rebuild mismatched counters"
+        )
+
+    def handle(self, *args, **options):
+        category_ids = options["ids"] or None
+        mismatches = check_product_counts(category_ids)
+        for category_id, (stored, actual) in sorted(mismatches.items()):
+            self.stdout.write(
+                f"category {category_id}: stored {stored[0]} ({stored[1]} active), "
+                f"actual {actual[0]} ({actual[1]} active)"
+            )
+
+        if options["repair"]:
+            repaired = rebuild_product_counts(category_ids)
+            self.stdout.write(self.style.SUCCESS(f"{repaired} counters rebuilt"))
+        elif mismatches:
+            raise CommandError(f"{len(mismatches)} counters are out of date")
+        else:
+            self.stdout.write(self.style.SUCCESS("All counters match"))
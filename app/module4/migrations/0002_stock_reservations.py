@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:05
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_category_path'),
+        ('module4', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('quantity', models.PositiveIntegerField()),
+                ('allocations', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('committed', 'Committed'), ('released', 'Released')], default='pending', max_length=10)),
+                ('settled', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='reservation_status_exp_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shards', to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'shard'), name='stock_shard_product_shard_uniq')],
+            },
+        ),
+    ]
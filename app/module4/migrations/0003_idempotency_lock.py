@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('module4', '0002_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,97 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+# Idempotency Key Model
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a write request sent with an ``Idempotency-Key``
+    header. ``status_code`` stays null while the first request is running;
+    its claim lasts until ``locked_until``, after which a retry may take
+    it over.
+    """
+
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="idempotency_scope_key_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+# Stock Shard Model
+class StockShard(models.Model):
+    """
+    One of several sub-counters holding the reservable stock of a product,
+    so concurrent reservations for the same product lock different rows.
+    """
+
+    product = models.ForeignKey(
+        "inventory.Product", on_delete=models.CASCADE, related_name="stock_shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "shard"], name="stock_shard_product_shard_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} of product {self.product_id}"
+
+
+# Stock Reservation Model
+class StockReservation(models.Model):
+    """
+    Stock taken out of the shards for a pending checkout. ``allocations``
+    maps shard id to the quantity taken from it so a release can put it
+    back. Committed reservations are folded into ``StockManagement`` when
+    they are settled.
+    """
+
+    PENDING = "pending"
+    COMMITTED = "committed"
+    RELEASED = "released"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (COMMITTED, "Committed"),
+        (RELEASED, "Released"),
+    ]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    product = models.ForeignKey(
+        "inventory.Product", on_delete=models.CASCADE, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    allocations = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    settled = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "expires_at"], name="reservation_status_exp_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} ({self.status})"
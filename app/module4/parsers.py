@@ -0,0 +1,171 @@
+"""
+Incremental JSON parsing for bulk list payloads.
+
+DRF's ``JSONParser`` decodes the whole body into one Python list before the
+view runs, so a large bulk request costs several times its size in worker
+memory. ``StreamingJSONParser`` instead returns a ``JSONStream`` for
+top-level arrays: the body is read in blocks and the items are decoded one
+at a time as the view iterates, so the bulk helpers can validate and write
+chunk by chunk with memory bounded by the chunk size.
+"""
+
+import codecs
+import hashlib
+import io
+import json
+import tempfile
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, get_encoding
+from rest_framework.utils.json import strict_constant
+
+READ_BLOCK_SIZE = 64 * 1024
+MAX_ITEM_SIZE = 1024 * 1024  # characters buffered for a single array item
+SPOOL_MAX_SIZE = 1024 * 1024  # bytes kept in memory before spooling to disk
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789+-.eE"
+
+
+class JSONStream:
+    """
+    The items of a top-level JSON array, decoded lazily from ``stream``.
+
+    ``head`` holds the bytes the parser already read from ``stream``. A
+    stream can be iterated only once; malformed input raises ``ParseError``
+    from the iteration.
+    """
+
+    def __init__(self, stream, head=b"", encoding="utf-8", strict=True):
+        self.stream = stream
+        self.head = head
+        self.encoding = encoding
+        self.decoder = json.JSONDecoder(
+            parse_constant=strict_constant if strict else None
+        )
+        self._consumed = False
+        self._digest = None
+
+    def digest(self):
+        """
+        SHA-256 of the raw body. The rest of the body is spooled (to disk
+        past ``SPOOL_MAX_SIZE``) so it can still be iterated afterwards.
+        """
+        if self._digest is None:
+            if self._consumed:
+                raise RuntimeError("JSONStream.digest() called after iteration.")
+            sha = hashlib.sha256(self.head)
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            while block := self.stream.read(READ_BLOCK_SIZE):
+                sha.update(block)
+                spool.write(block)
+            spool.seek(0)
+            self.stream = spool
+            self._digest = sha.hexdigest()
+        return self._digest
+
+    def _blocks(self):
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        if self.head:
+            yield decoder.decode(self.head)
+        while block := self.stream.read(READ_BLOCK_SIZE):
+            yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+
+    def __iter__(self):
+        if self._consumed:
+            raise RuntimeError("A JSONStream can only be iterated once.")
+        self._consumed = True
+        try:
+            yield from self._items()
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+    def _items(self):
+        blocks = self._blocks()
+        buffer, pos, eof = "", 0, False
+
+        def fill():
+            # Drop what was already decoded and append the next block
+            nonlocal buffer, pos, eof
+            block = next(blocks, None)
+            if block is None:
+                eof = True
+                return False
+            buffer, pos = buffer[pos:] + block, 0
+            return True
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    return
+
+        skip_whitespace()
+        if buffer[pos : pos + 1] != "[":
+            raise ValueError(f"Expected '[' at offset {pos}")
+        pos += 1
+        skip_whitespace()
+        if buffer[pos : pos + 1] == "]":
+            pos += 1
+        else:
+            while True:
+                while True:
+                    try:
+                        item, end = self.decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        # The item may span the block boundary; a bounded
+                        # lookahead keeps malformed input from being buffered
+                        if len(buffer) - pos < MAX_ITEM_SIZE and fill():
+                            continue
+                        raise
+                    # A number cut at the block boundary decodes as a prefix
+                    truncated = isinstance(item, (int, float)) and (
+                        end == len(buffer) or buffer[end] in NUMBER_CHARS
+                    )
+                    if not truncated or eof or not fill():
+                        break
+                pos = end
+                yield item
+
+                skip_whitespace()
+                separator = buffer[pos : pos + 1]
+                pos += 1
+                if separator == "]":
+                    break
+                if separator != ",":
+                    raise ValueError(f"Expected ',' or ']', got {separator!r}")
+                skip_whitespace()
+
+        skip_whitespace()
+        if pos < len(buffer):
+            raise ValueError("Extra data after the top-level array")
+
+
+class StreamingJSONParser(JSONParser):
+    """
+    ``JSONParser`` that hands top-level arrays to the view as a
+    ``JSONStream`` instead of a list. Any other document is parsed whole,
+    exactly as ``JSONParser`` does.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = get_encoding(parser_context)
+        head = b""
+        while not head.lstrip():
+            block = stream.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            head += block
+
+        if head.lstrip()[:1] != b"[":
+            body = io.BytesIO(head + stream.read())
+            return super().parse(body, media_type, parser_context)
+        return JSONStream(stream, head, encoding, strict=self.strict)
+
+
+def is_list_payload(data):
+    """True for request data that is a JSON array, streamed or not."""
+    return isinstance(data, (list, JSONStream))
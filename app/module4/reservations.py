@@ -0,0 +1,265 @@
+"""
+Stock reservations on sharded sub-counters.
+
+``decrement_stock`` updates the single ``StockManagement`` row of a product,
+so during a sale every checkout of a hot product queues on that row lock
+until its order transaction commits. Here the reservable stock of a product
+is split over ``StockShard`` rows and a reservation locks a shard with
+``SELECT ... FOR UPDATE SKIP LOCKED``: concurrent checkouts take different
+shards instead of waiting for each other.
+
+A reservation is pending until it is committed or released; pending
+reservations past ``expires_at`` are released by ``expire_reservations``.
+Committed quantities are subtracted from ``StockManagement`` in batches by
+``settle``, so the commit path does not touch the hot row either.
+
+The shards hold the stock that is neither sold nor reserved. Orders go
+through ``decrement_stock``, which takes the quantity from the shards as
+well as from ``StockManagement`` in one transaction, so orders and
+reservations cannot both sell the same unit.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+from inventory.models import StockManagement
+
+from .models import StockReservation, StockShard
+from .stock import InsufficientStock, take_from_shards
+
+DEFAULT_SHARDS = 8
+
+
+def reservation_ttl():
+    return getattr(settings, "STOCK_RESERVATION_TTL", 15 * 60)
+
+
+class ReservationError(Exception):
+    """Raised when reservations are missing or no longer pending."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        super().__init__(f"Reservations not pending: {tokens}")
+
+
+####
+#  Shards
+####
+
+
+def shard_stock(product_ids, shards=None):
+    """
+    Spread the available stock of ``product_ids`` evenly over ``shards``
+    sub-counters (``STOCK_SHARDS``, default 8). Available stock is the
+    settled ``StockManagement`` quantity minus pending reservations, so
+    this also re-syncs shards after stock was changed directly.
+
+    Returns ``{product_id: available}``.
+    """
+    shards = shards or getattr(settings, "STOCK_SHARDS", DEFAULT_SHARDS)
+    product_ids = sorted(set(product_ids))
+    with transaction.atomic():
+        settle(product_ids)
+        stock = dict(
+            StockManagement.objects.select_for_update()
+            .filter(product_id__in=product_ids)
+            .order_by("product_id")
+            .values_list("product_id", "quantity")
+        )
+        list(
+            StockShard.objects.select_for_update()
+            .filter(product_id__in=product_ids)
+            .order_by("product_id", "shard")
+            .values_list("pk", flat=True)
+        )
+        pending = dict(
+            StockReservation.objects.filter(
+                product_id__in=product_ids, status=StockReservation.PENDING
+            )
+            .values_list("product_id")
+            .annotate(total=Sum("quantity"))
+        )
+
+        available, rows = {}, []
+        for product_id, quantity in stock.items():
+            available[product_id] = max(quantity - pending.get(product_id, 0), 0)
+            base, extra = divmod(available[product_id], shards)
+            rows.extend(
+                StockShard(
+                    product_id=product_id, shard=shard, quantity=base + (shard < extra)
+                )
+                for shard in range(shards)
+            )
+        StockShard.objects.filter(
+            product_id__in=product_ids, shard__gte=shards
+        ).delete()
+        StockShard.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["product", "shard"],
+            update_fields=["quantity"],
+        )
+    return available
+
+
+####
+#  Reservation lifecycle
+####
+
+
+def reserve(quantities, ttl=None):
+    """
+    Reserve ``{product_id: quantity}``, all or nothing.
+
+    Products without shards are sharded on first use. Returns one pending
+    ``StockReservation`` per product; raises ``InsufficientStock`` listing
+    the products that could not be covered.
+    """
+    if not quantities:
+        return []
+    expires_at = timezone.now() + timedelta(seconds=ttl or reservation_ttl())
+    product_ids = sorted(quantities)
+
+    sharded = set(
+        StockShard.objects.filter(product_id__in=product_ids).values_list(
+            "product_id", flat=True
+        )
+    )
+    if len(sharded) < len(product_ids):
+        shard_stock(set(product_ids) - sharded)
+
+    with transaction.atomic():
+        allocations, short = {}, []
+        # Lock in product order so multi-product checkouts cannot deadlock
+        for product_id in product_ids:
+            taken = take_from_shards(product_id, quantities[product_id])
+            if taken is None:
+                short.append(product_id)
+            else:
+                allocations[product_id] = taken
+        if short:
+            transaction.set_rollback(True)
+            raise InsufficientStock(short)
+
+        return StockReservation.objects.bulk_create(
+            StockReservation(
+                product_id=product_id,
+                quantity=quantities[product_id],
+                allocations={str(shard): n for shard, n in taken.items()},
+                expires_at=expires_at,
+            )
+            for product_id, taken in allocations.items()
+        )
+
+
+def _pending(tokens):
+    """Lock the reservations for ``tokens``; all must be pending."""
+    tokens = set(tokens)
+    reservations = list(
+        StockReservation.objects.select_for_update()
+        .filter(token__in=tokens, status=StockReservation.PENDING)
+        .order_by("pk")
+    )
+    missing = tokens - {reservation.token for reservation in reservations}
+    if missing:
+        raise ReservationError(sorted(str(token) for token in missing))
+    return reservations
+
+
+def commit(tokens):
+    """
+    Turn pending reservations into sold stock. Raises ``ReservationError``
+    (and commits nothing) if any token is unknown, expired or not pending.
+    """
+    with transaction.atomic():
+        reservations = _pending(tokens)
+        now = timezone.now()
+        expired = [str(r.token) for r in reservations if r.expires_at < now]
+        if expired:
+            raise ReservationError(expired)
+        return StockReservation.objects.filter(
+            pk__in=[r.pk for r in reservations]
+        ).update(status=StockReservation.COMMITTED)
+
+
+def _put_back(reservations):
+    """Return reserved quantities to their shards and mark them released."""
+    returned = {}
+    for reservation in reservations:
+        for shard, n in reservation.allocations.items():
+            key = (reservation.product_id, int(shard))
+            returned[key] = returned.get(key, 0) + n
+
+    for (product_id, shard), n in sorted(returned.items()):
+        updated = StockShard.objects.filter(product_id=product_id, shard=shard).update(
+            quantity=F("quantity") + n
+        )
+        if not updated:
+            # The shard was dropped by a re-shard; any shard will do
+            StockShard.objects.filter(product_id=product_id, shard=0).update(
+                quantity=F("quantity") + n
+            )
+    return StockReservation.objects.filter(
+        pk__in=[reservation.pk for reservation in reservations]
+    ).update(status=StockReservation.RELEASED)
+
+
+def release(tokens):
+    """
+    Give pending reservations back. Raises ``ReservationError`` (and
+    releases nothing) if any token is unknown or not pending.
+    """
+    with transaction.atomic():
+        return _put_back(_pending(tokens))
+
+
+def expire_reservations(batch_size=1000):
+    """Release pending reservations past ``expires_at``. Returns the count."""
+    released = 0
+    while True:
+        with transaction.atomic():
+            # SKIP LOCKED: concurrent sweepers and commits are not waited on
+            reservations = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status=StockReservation.PENDING, expires_at__lt=timezone.now())
+                .order_by("pk")[:batch_size]
+            )
+            if not reservations:
+                return released
+            released += _put_back(reservations)
+
+
+def settle(product_ids=None):
+    """
+    Subtract committed, unsettled reservations from ``StockManagement`` with
+    one UPDATE. Returns the number of reservations settled.
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update(
+            skip_locked=True
+        ).filter(status=StockReservation.COMMITTED, settled=False)
+        if product_ids is not None:
+            reservations = reservations.filter(product_id__in=product_ids)
+        rows = list(reservations.values_list("pk", "product_id", "quantity"))
+        if not rows:
+            return 0
+
+        totals = {}
+        for _, product_id, quantity in rows:
+            totals[product_id] = totals.get(product_id, 0) + quantity
+        StockManagement.objects.filter(product_id__in=totals).update(
+            quantity=F("quantity")
+            - Case(
+                *(
+                    When(product_id=product_id, then=Value(total))
+                    for product_id, total in totals.items()
+                )
+            ),
+            last_checked_at=timezone.now(),
+        )
+        return StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+            settled=True
+        )
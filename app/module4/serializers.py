@@ -1,3 +1,4 @@
+from django.db import models, transaction
 from inventory.models import (
     Category,
     Order,
@@ -8,6 +9,9 @@ from inventory.models import (
 )
 from rest_framework import serializers
 
+from .models import StockReservation
+from .stock import InsufficientStock, decrement_stock
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +23,45 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "parent", "name", "slug", "is_active", "level"]
+        read_only_fields = ["level"]  # derived from parent
+
+    def validate_parent(self, parent):
+        if (
+            parent
+            and self.instance
+            and self.instance.path
+            and parent.path.startswith(self.instance.path)
+        ):
+            raise serializers.ValidationError(
+                "A category cannot be moved under itself or its descendants."
+            )
+        return parent
+
+
+class CategoryUpsertSerializer(serializers.ModelSerializer):
+    """
+    Row shape for bulk upserts. Uniqueness and parent existence are checked
+    for the whole batch at once, so the per-row database validators are off.
+    """
+
+    parent = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = Category
+        fields = ["parent", "name", "slug", "is_active"]
+        extra_kwargs = {
+            "name": {"validators": []},
+            "slug": {"validators": []},
+        }
+
+
+class CategoryBulkUpdateSerializer(CategoryUpsertSerializer):
+    """Documents one item of a bulk partial update: an id plus any fields."""
+
+    id = serializers.IntegerField()
+
+    class Meta(CategoryUpsertSerializer.Meta):
+        fields = ["id", *CategoryUpsertSerializer.Meta.fields]
 
 
 class CategoryReturnSerializer(serializers.ModelSerializer):
@@ -48,6 +91,39 @@ class CreateProductSerializer(serializers.ModelSerializer):
         ]
 
 
+def attach_stock(products):
+    """
+    Cache each product's StockManagement row on ``product.stockmanagement``
+    with one query, skipping products that already have it loaded (e.g. via
+    ``select_related("stockmanagement")``).
+    """
+    related = Product.stockmanagement.related
+    missing = [product for product in products if not related.is_cached(product)]
+    if not missing:
+        return products
+
+    stocks = {
+        stock.product_id: stock
+        for stock in StockManagement.objects.filter(
+            product_id__in=[product.pk for product in missing]
+        )
+    }
+    for product in missing:
+        stock = stocks.get(product.pk)
+        related.set_cached_value(product, stock)
+        if stock is not None:
+            related.field.set_cached_value(stock, product)
+    return products
+
+
+class ProductStockListSerializer(serializers.ListSerializer):
+    """Loads stock for the whole list up front instead of once per product."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation(attach_stock(list(iterable)))
+
+
 class CreateProductStockSerializer(serializers.ModelSerializer):
     stock_data = StockManagementSerializer(write_only=True, required=True)
 
@@ -64,11 +140,15 @@ class CreateProductStockSerializer(serializers.ModelSerializer):
             "category",
             "stock_data",
         ]
+        list_serializer_class = ProductStockListSerializer
 
     def create(self, validated_data):
         stock_data = validated_data.pop("stock_data", None)
         product = Product.objects.create(**validated_data)
-        StockManagement.objects.create(product=product, **stock_data)
+        # Creating through the relation caches it, so the response is query-free
+        product.stockmanagement = StockManagement.objects.create(
+            product=product, **stock_data
+        )
 
         return product
 
@@ -77,8 +157,12 @@ class CreateProductStockSerializer(serializers.ModelSerializer):
         # Start with the default representation
         data = super().to_representation(instance)
 
-        # Fetch the related stock data from the StockManagement model
-        stock_instance = StockManagement.objects.filter(product=instance).first()
+        # Related stock data; already cached when loaded with select_related or
+        # serialized with many=True, otherwise fetched here
+        try:
+            stock_instance = instance.stockmanagement
+        except StockManagement.DoesNotExist:
+            stock_instance = None
 
         # If stock data exists, add it to the response
         if stock_instance:
@@ -89,14 +173,35 @@ class CreateProductStockSerializer(serializers.ModelSerializer):
         return data
 
 
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk product import. ``category`` is a category slug and
+    ``quantity`` seeds the product's StockManagement row. Only field-level
+    checks run here so rows can be validated away from the database.
+    """
+
+    name = serializers.CharField(max_length=50)
+    slug = serializers.SlugField(max_length=55)
+    description = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True
+    )
+    is_digital = serializers.BooleanField(required=False, default=False)
+    is_active = serializers.BooleanField(required=False, default=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    category = serializers.SlugField(max_length=55)
+    quantity = serializers.IntegerField(required=False, default=0)
+
+
 class OrderProductSerializer(serializers.ModelSerializer):
     """Handles individual product entries within an order"""
 
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    # Plain id here; OrderSerializer resolves all lines with a single query
+    product = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = OrderProduct
         fields = ["product", "quantity"]
+        extra_kwargs = {"quantity": {"min_value": 1}}
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -110,15 +215,45 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ["user", "created_at", "updated_at", "products"]
 
+    def validate_products(self, value):
+        """Resolve every product id in one query instead of one per line."""
+        product_ids = [line["product"] for line in value]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError("Each product may appear only once.")
+
+        products = Product.objects.in_bulk(product_ids)
+        missing = [pk for pk in product_ids if pk not in products]
+        if missing:
+            raise serializers.ValidationError(
+                f"Invalid pk {missing} - object does not exist."
+            )
+
+        for line in value:
+            line["product"] = products[line["product"]]
+        return value
+
     def create(self, validated_data):
         products_data = validated_data.pop("products")  # Extract product list
-        order = Order.objects.create(**validated_data)  # Create the order
 
-        # Create OrderProduct entries for each product in the request
-        order_products = [
-            OrderProduct(order=order, **product_data) for product_data in products_data
-        ]
-        OrderProduct.objects.bulk_create(order_products)  # Bulk insert
+        with transaction.atomic():
+            # One guarded UPDATE for every line; rolls back the order if short
+            try:
+                decrement_stock(
+                    {line["product"].pk: line["quantity"] for line in products_data}
+                )
+            except InsufficientStock as e:
+                raise serializers.ValidationError(
+                    {"products": [f"Insufficient stock for products {e.product_ids}."]}
+                )
+
+            order = Order.objects.create(**validated_data)  # Create the order
+
+            # Create OrderProduct entries for each product in the request
+            order_products = [
+                OrderProduct(order=order, **product_data)
+                for product_data in products_data
+            ]
+            OrderProduct.objects.bulk_create(order_products)  # Bulk insert
 
         return order
 
@@ -131,6 +266,36 @@ class CategoryBulkDeleteSerializer(serializers.Serializer):
     )
 
 
+class StockReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockReservation
+        fields = ["token", "product", "quantity", "status", "expires_at"]
+
+
+class ReserveStockSerializer(serializers.Serializer):
+    products = OrderProductSerializer(many=True, allow_empty=False)
+    ttl = serializers.IntegerField(
+        min_value=1,
+        max_value=24 * 60 * 60,
+        required=False,
+        help_text="Seconds before an uncommitted reservation is released",
+    )
+
+    def validate_products(self, value):
+        product_ids = [line["product"] for line in value]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError("Each product may appear only once.")
+        return value
+
+
+class ReservationTokensSerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        help_text="Tokens returned when the stock was reserved",
+    )
+
+
 # class CreateProductSerializer(serializers.ModelSerializer):
 #     new_category = serializers.SerializerMethodField()
 #     stock = StockManagementSerializer(write_only=True, required=True)
@@ -0,0 +1,122 @@
+"""
+Set-based stock movements on StockManagement and its reservable shards.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from inventory.models import StockManagement
+
+from .models import StockShard
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more products cannot cover the requested quantity."""
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(f"Insufficient stock for products {product_ids}")
+
+
+def decrement_stock(quantities):
+    """
+    Subtract ``{product_id: quantity}`` from stock in a single UPDATE.
+
+    Rows are only touched when they hold enough stock. Products sharded for
+    reservations (``module4.reservations``) also have the quantity taken
+    from their shards in the same transaction; the shards hold what is
+    neither sold nor reserved, so stock a reservation holds counts as
+    short. If any product is short (or has no stock row) the update is
+    rolled back to a savepoint, stock is left untouched and
+    ``InsufficientStock`` lists the products.
+    """
+    if not quantities:
+        return
+
+    enough_stock = Q()
+    for product_id, quantity in quantities.items():
+        enough_stock |= Q(product_id=product_id, quantity__gte=quantity)
+
+    try:
+        with transaction.atomic():
+            updated = StockManagement.objects.filter(enough_stock).update(
+                quantity=F("quantity")
+                - Case(
+                    *(
+                        When(product_id=product_id, then=Value(quantity))
+                        for product_id, quantity in quantities.items()
+                    )
+                ),
+                last_checked_at=timezone.now(),
+            )
+            if updated != len(quantities):
+                raise InsufficientStock([])
+
+            # The stock rows are locked now, and shard_stock() locks them
+            # before it (re)writes shards, so the shards read here are final
+            sharded = (
+                StockShard.objects.filter(product_id__in=quantities)
+                .values_list("product_id", flat=True)
+                .distinct()
+            )
+            short = [
+                product_id
+                for product_id in sorted(sharded)
+                if take_from_shards(product_id, quantities[product_id]) is None
+            ]
+            if short:
+                raise InsufficientStock(short)
+    except InsufficientStock as e:
+        if e.product_ids:
+            raise
+        # Only reached on failure: work out which products were short
+        covered = set(
+            StockManagement.objects.filter(enough_stock).values_list(
+                "product_id", flat=True
+            )
+        )
+        raise InsufficientStock(sorted(set(quantities) - covered))
+
+
+def take_from_shards(product_id, quantity):
+    """
+    Take ``quantity`` from the shards of one product; call inside a
+    transaction. Returns ``{shard: taken}`` or ``None`` when short.
+    """
+    shards = StockShard.objects.filter(product_id=product_id, quantity__gt=0)
+
+    # 1. Any unlocked shard that covers the whole quantity (the common case)
+    shard = (
+        shards.select_for_update(skip_locked=True)
+        .filter(quantity__gte=quantity)
+        .order_by("?")
+        .first()
+    )
+    if shard is not None:
+        locked = [shard]
+    else:
+        # 2. Combine unlocked shards, then wait for the locked ones
+        locked = list(shards.select_for_update(skip_locked=True).order_by("shard"))
+        if sum(s.quantity for s in locked) < quantity:
+            locked = list(shards.select_for_update().order_by("shard"))
+        random.shuffle(locked)
+
+    taken, remaining = {}, quantity
+    for shard in locked:
+        take = min(shard.quantity, remaining)
+        if take:
+            taken[shard.shard] = take
+            remaining -= take
+        if not remaining:
+            break
+    if remaining:
+        return None
+
+    shards = StockShard.objects.filter(product_id=product_id, shard__in=taken)
+    shards.update(
+        quantity=F("quantity")
+        - Case(*(When(shard=shard, then=Value(n)) for shard, n in taken.items()))
+    )
+    return taken
@@ -0,0 +1,729 @@
+import io
+import json
+import re
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.db import connection, models, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from inventory.counts import check_product_counts
+from inventory.models import (
+    Category,
+    CategoryProductCount,
+    Order,
+    OrderProduct,
+    PriceBucket,
+    Product,
+    StockManagement,
+    User,
+)
+from inventory.prices import rebuild_price_stats
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import idempotency, parsers
+from .deletion import ChunkedCascadeDelete, DeleteBlocked
+from .importers import COPY, INSERT, NDJSON, ProductStockImporter, read_records
+from .models import IdempotencyKey, StockShard
+from .reservations import commit, release, reserve, settle, shard_stock
+from .serializers import CreateProductStockSerializer, OrderSerializer
+from .stock import InsufficientStock, decrement_stock
+from .views import BulkUpdateCategoryViewSet, CategoryBulkInsertViewSet
+
+
+class CreateProductStockSerializerQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Shoes", slug="shoes")
+        for i in range(10):
+            product = Product.objects.create(
+                category=category, name=f"Product {i}", slug=f"product-{i}", price=10
+            )
+            if i != 9:  # last product has no stock row
+                StockManagement.objects.create(product=product, quantity=i)
+
+    def test_many_uses_one_stock_query(self):
+        with self.assertNumQueries(2):  # products + one bulk stock lookup
+            data = CreateProductStockSerializer(
+                Product.objects.order_by("id"), many=True
+            ).data
+
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[3]["stock_data"], {"quantity": 3})
+        self.assertIsNone(data[9]["stock_data"])
+
+    def test_reuses_select_related_stock(self):
+        products = Product.objects.select_related("stockmanagement").order_by("id")
+
+        with self.assertNumQueries(1):
+            data = CreateProductStockSerializer(products, many=True).data
+
+        self.assertEqual(data[0]["stock_data"], {"quantity": 0})
+        self.assertIsNone(data[9]["stock_data"])
+
+    def test_single_instance(self):
+        product = Product.objects.get(slug="product-5")
+
+        with self.assertNumQueries(1):
+            data = CreateProductStockSerializer(product).data
+
+        self.assertEqual(data["stock_data"], {"quantity": 5})
+
+    def test_create_response_needs_no_extra_query(self):
+        serializer = CreateProductStockSerializer(
+            data={
+                "name": "New",
+                "slug": "new",
+                "price": "5.00",
+                "category": Category.objects.get().pk,
+                "stock_data": {"quantity": 7},
+            }
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        with self.assertNumQueries(0):
+            data = serializer.data
+
+        self.assertEqual(data["stock_data"], {"quantity": 7})
+
+
+class CategoryUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        cls.boots = Category.objects.create(name="Boots", slug="boots")
+        cls.hiking = Category.objects.create(
+            name="Hiking", slug="hiking", parent=cls.shoes
+        )
+        cls.winter = Category.objects.create(
+            name="Winter", slug="winter", parent=cls.hiking
+        )
+
+    def upsert(self, rows, batch_size=2):
+        view = CategoryBulkInsertViewSet.as_view({"post": "create"})
+        request = APIRequestFactory().post(
+            f"/?mode=upsert&batch_size={batch_size}", rows, format="json"
+        )
+        return view(request)
+
+    def test_existing_slug_moves_its_subtree(self):
+        response = self.upsert(
+            [
+                {"name": "Hiking", "slug": "hiking", "parent": self.boots.pk},
+                {"name": "Trail", "slug": "trail", "parent": self.hiking.pk},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["summary"], {"created": 1, "updated": 1, "failed": 0}
+        )
+        trail = Category.objects.get(slug="trail")
+        self.hiking.refresh_from_db()
+        self.winter.refresh_from_db()
+        self.assertEqual(self.hiking.path, f"/{self.boots.pk}/{self.hiking.pk}/")
+        self.assertEqual(
+            self.winter.path, f"/{self.boots.pk}/{self.hiking.pk}/{self.winter.pk}/"
+        )
+        self.assertEqual((self.winter.level, trail.level), (2, 2))
+        self.assertEqual(trail.path, f"{self.hiking.path}{trail.pk}/")
+
+    def test_rows_fail_by_index(self):
+        response = self.upsert(
+            [
+                {"name": "Sandals", "slug": "sandals"},
+                {"name": "Other", "slug": "sandals"},
+                {"name": "Boots", "slug": "not-boots"},
+                {"name": "Loafers", "slug": "loafers", "parent": 10**6},
+                {"name": "Shoes", "slug": "shoes", "parent": self.winter.pk},
+                {"slug": "no-name"},
+            ]
+        )
+
+        failed = {
+            result["index"]: sorted(result["errors"])
+            for result in response.data["results"]
+            if result["status"] == "failed"
+        }
+        self.assertEqual(
+            failed,
+            {1: ["slug"], 2: ["name"], 3: ["parent"], 4: ["parent"], 5: ["name"]},
+        )
+        self.assertEqual(
+            set(Category.objects.values_list("slug", flat=True)),
+            {"shoes", "boots", "hiking", "winter", "sandals"},
+        )
+        self.assertEqual(Category.objects.get(slug="shoes").parent, None)
+
+
+class CategoryBulkPatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        cls.boots = Category.objects.create(
+            name="Boots", slug="boots", parent=cls.shoes
+        )
+        cls.hats = Category.objects.create(name="Hats", slug="hats")
+        cls.socks = Category.objects.create(name="Socks", slug="socks")
+
+    def patch(self, rows, batch_size=2):
+        view = BulkUpdateCategoryViewSet.as_view({"patch": "bulk_update"})
+        request = APIRequestFactory().patch(
+            f"/?batch_size={batch_size}", rows, format="json"
+        )
+        return view(request)
+
+    def test_statuses_and_errors_by_index(self):
+        response = self.patch(
+            [
+                {"id": self.hats.pk, "is_active": True},
+                {"id": "x", "name": "Caps"},
+                {"id": self.boots.pk, "name": "Boots"},
+                {"id": self.hats.pk, "name": "Caps"},
+                {"id": self.socks.pk, "name": "Hats"},
+                {"id": self.shoes.pk + 1000, "name": "Gone"},
+                {"id": self.shoes.pk, "parent": self.boots.pk},
+                {"id": self.shoes.pk + 1001, "slug": "not a slug"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([result["index"] for result in results], list(range(8)))
+        self.assertEqual(
+            [result["status"] for result in results],
+            [
+                "updated",
+                "failed",
+                "unchanged",
+                "failed",
+                "failed",
+                "not_found",
+                "failed",
+                "failed",
+            ],
+        )
+        self.assertEqual(sorted(results[1]["errors"]), ["id"])
+        self.assertEqual(sorted(results[3]["errors"]), ["id"])
+        self.assertEqual(sorted(results[4]["errors"]), ["name"])
+        self.assertEqual(sorted(results[6]["errors"]), ["parent"])
+        self.assertEqual(sorted(results[7]["errors"]), ["slug"])
+        self.assertEqual(
+            response.data["summary"],
+            {"updated": 1, "unchanged": 1, "not_found": 1, "failed": 5},
+        )
+        self.assertEqual(
+            list(Category.objects.order_by("pk").values_list("name", "is_active")),
+            [("Shoes", False), ("Boots", False), ("Hats", True), ("Socks", False)],
+        )
+
+    def test_moves_write_paths(self):
+        response = self.patch(
+            [
+                {"id": self.boots.pk, "parent": self.hats.pk},
+                {"id": self.shoes.pk, "name": "Footwear", "is_active": True},
+            ]
+        )
+
+        self.assertEqual(response.data["summary"]["updated"], 2)
+        self.boots.refresh_from_db()
+        self.assertEqual(self.boots.path, f"/{self.hats.pk}/{self.boots.pk}/")
+        self.assertEqual(response.data["results"][1]["fields"], ["is_active", "name"])
+
+    def test_swaps_names_and_slugs(self):
+        response = self.patch(
+            [
+                {"id": self.hats.pk, "name": "Socks", "slug": "socks"},
+                {"id": self.socks.pk, "name": "Boots", "slug": "hats"},
+                {"id": self.boots.pk, "name": "Hats", "slug": "boots"},
+            ],
+            batch_size=3,
+        )
+
+        self.assertEqual(response.data["summary"]["updated"], 3)
+        self.assertEqual(
+            dict(Category.objects.values_list("pk", "name")),
+            {
+                self.shoes.pk: "Shoes",
+                self.boots.pk: "Hats",
+                self.hats.pk: "Socks",
+                self.socks.pk: "Boots",
+            },
+        )
+        self.assertEqual(
+            sorted(Category.objects.values_list("slug", flat=True)),
+            ["boots", "hats", "shoes", "socks"],
+        )
+
+    def test_swap_with_a_failed_row_is_a_conflict(self):
+        response = self.patch(
+            [
+                {"id": self.hats.pk, "name": "Socks"},
+                {"id": self.socks.pk, "name": "Hats", "parent": 10**6},
+            ]
+        )
+
+        results = response.data["results"]
+        self.assertEqual([result["status"] for result in results], ["failed"] * 2)
+        self.assertEqual(sorted(results[0]["errors"]), ["name"])
+        self.assertEqual(sorted(results[1]["errors"]), ["parent"])
+        self.assertEqual(Category.objects.get(pk=self.hats.pk).name, "Hats")
+
+
+class StreamingJSONParserTests(TestCase):
+    def post(self, body, query="?batch_size=1"):
+        view = CategoryBulkInsertViewSet.as_view({"post": "create"})
+        request = APIRequestFactory().post(
+            f"/{query}", body, content_type="application/json"
+        )
+        return view(request)
+
+    def test_items_across_block_boundaries(self):
+        rows = [
+            {"name": f"Category {i}", "slug": f"category-{i}", "is_active": True}
+            for i in range(20)
+        ]
+        with mock.patch.object(parsers, "READ_BLOCK_SIZE", 7):
+            response = self.post(json.dumps(rows).encode())
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(Category.objects.order_by("pk").values_list("slug", flat=True)),
+            [row["slug"] for row in rows],
+        )
+
+    def test_numbers_across_block_boundaries(self):
+        body = b"[123456, 7.5e3, -42]"
+        for size in range(1, len(body)):
+            with (
+                self.subTest(size=size),
+                mock.patch.object(parsers, "READ_BLOCK_SIZE", size),
+            ):
+                stream = parsers.StreamingJSONParser().parse(io.BytesIO(body))
+                self.assertEqual(list(stream), [123456, 7500.0, -42])
+
+    def test_malformed_arrays_write_nothing(self):
+        valid = b'{"name": "Shoes", "slug": "shoes"}, {"name": "Hats", "slug": "hats"}'
+        for body in (
+            b"[" + valid,  # truncated before the closing bracket
+            b"[" + valid + b', {"name": "Bo',  # truncated inside an item
+            b"[" + valid + b" {}]",  # missing separator
+            b"[" + valid + b"] []",  # trailing data
+        ):
+            for query in ("?batch_size=1", "?batch_size=1&mode=upsert"):
+                with self.subTest(body=body, query=query):
+                    response = self.post(body, query)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertFalse(Category.objects.exists())
+
+
+class ProductStockImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        Product.objects.create(
+            category=cls.shoes, name="Existing", slug="existing", price=1
+        )
+
+    def records(self):
+        lines = [
+            {"name": "Boot", "slug": "boot", "price": "10.00", "category": "shoes"},
+            {"name": "Sandal", "slug": "sandal", "price": "5", "category": "hats"},
+            {"name": "Boot 2", "slug": "boot", "price": "11", "category": "shoes"},
+            {"name": "Other", "slug": "existing", "price": "1", "category": "shoes"},
+            "{not json",
+            {"name": "Loafer", "slug": "loafer", "price": "x", "category": "shoes"},
+            {
+                "name": "Slipper",
+                "slug": "slipper",
+                "price": "7.50",
+                "category": "shoes",
+                "quantity": 4,
+                "is_active": True,
+            },
+        ]
+        body = "\n".join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        )
+        return read_records(io.BytesIO(body.encode()), NDJSON)
+
+    def test_error_report(self):
+        report = ProductStockImporter(chunk_size=4, method=INSERT).run(self.records())
+
+        self.assertEqual(
+            {key: report[key] for key in ("processed", "imported", "failed", "chunks")},
+            {"processed": 7, "imported": 2, "failed": 5, "chunks": 2},
+        )
+        errors = {error["line"]: sorted(error["errors"]) for error in report["errors"]}
+        self.assertEqual(
+            errors,
+            {
+                2: ["category"],  # unknown category slug
+                3: ["slug"],  # duplicate of line 1 in the same chunk
+                4: ["slug"],  # already in the table
+                5: ["non_field_errors"],  # invalid JSON
+                6: ["price"],
+            },
+        )
+        self.assertEqual(
+            dict(StockManagement.objects.values_list("product__slug", "quantity")),
+            {"boot": 0, "slipper": 4},
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_and_insert_load_the_same(self):
+        loaded = {}
+        for method in (INSERT, COPY):
+            with transaction.atomic():
+                report = ProductStockImporter(chunk_size=4, method=method).run(
+                    self.records()
+                )
+                products = Product.objects.order_by("slug")
+                loaded[method] = (
+                    report,
+                    list(
+                        products.values_list(
+                            "category_id",
+                            "name",
+                            "slug",
+                            "description",
+                            "is_digital",
+                            "is_active",
+                            "price",
+                            "stockmanagement__quantity",
+                        )
+                    ),
+                    products.filter(updated_at__isnull=True).exists(),
+                    list(
+                        CategoryProductCount.objects.values_list(
+                            "category_id", "products", "active_products"
+                        )
+                    ),
+                    check_product_counts(),
+                )
+                transaction.set_rollback(True)
+
+        self.assertEqual(loaded[INSERT], loaded[COPY])
+        self.assertEqual(loaded[COPY][-1], {})
+
+
+class OrderSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username="buyer", email="buyer@example.com", password="x"
+        )
+        category = Category.objects.create(name="Shoes", slug="shoes")
+        cls.boot, cls.sandal = (
+            Product.objects.create(
+                category=category, name=name, slug=name.lower(), price=10
+            )
+            for name in ("Boot", "Sandal")
+        )
+        StockManagement.objects.create(product=cls.boot, quantity=5)
+        StockManagement.objects.create(product=cls.sandal, quantity=2)
+
+    def order(self, **quantities):
+        lines = [
+            {"product": getattr(self, name).pk, "quantity": quantity}
+            for name, quantity in quantities.items()
+        ]
+        return OrderSerializer(data={"user": self.user.pk, "products": lines})
+
+    def stock(self):
+        return dict(StockManagement.objects.values_list("product__slug", "quantity"))
+
+    def test_decrements_every_line(self):
+        serializer = self.order(boot=5, sandal=1)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        order = serializer.save()
+
+        self.assertEqual(self.stock(), {"boot": 0, "sandal": 1})
+        self.assertEqual(order.orderproduct_set.count(), 2)
+
+    def test_short_line_rolls_back_the_order(self):
+        serializer = self.order(boot=1, sandal=3)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(ValidationError) as raised:
+            serializer.save()
+
+        self.assertIn(str(self.sandal.pk), str(raised.exception.detail["products"]))
+        self.assertEqual(self.stock(), {"boot": 5, "sandal": 2})
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderProduct.objects.exists())
+
+
+class ChunkedCascadeDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name="Shoes", slug="shoes")
+        cls.boots = Category.objects.create(
+            name="Boots", slug="boots", parent=cls.shoes
+        )
+        for i in range(5):
+            product = Product.objects.create(
+                category=cls.boots if i % 2 else cls.shoes,
+                name=f"Product {i}",
+                slug=f"product-{i}",
+                price=i,
+            )
+            StockManagement.objects.create(product=product, quantity=i)
+
+    def test_drains_dependents_before_parents(self):
+        progress = []
+        deleter = ChunkedCascadeDelete(
+            Category,
+            [self.shoes.pk, self.boots.pk],
+            chunk_size=2,
+            on_progress=lambda report: progress.append(report["chunks"]),
+        )
+        with CaptureQueriesContext(connection) as queries:
+            report = deleter.run()
+
+        deleted = report["deleted"]
+        self.assertEqual(
+            (deleted["inventory.Category"], deleted["inventory.Product"]), (2, 5)
+        )
+        self.assertEqual(deleted["inventory.StockManagement"], 5)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(StockManagement.objects.exists())
+        self.assertEqual(progress, [*range(1, report["chunks"] + 1), report["chunks"]])
+
+        tables = [
+            match[1]
+            for query in queries.captured_queries
+            if (match := re.match(r'DELETE FROM "(\w+)"', query["sql"]))
+        ]
+        products = [i for i, table in enumerate(tables) if table == "inventory_product"]
+        # Three chunks of at most two products, then the final sweep
+        self.assertEqual(len(products), 4)
+        for start, end in zip([-1, *products], products):
+            self.assertIn("inventory_stockmanagement", tables[start + 1 : end])
+        self.assertGreater(tables.index("inventory_category"), products[-1])
+
+    def test_blocked_delete_removes_nothing(self):
+        deleter = ChunkedCascadeDelete(Category, [self.shoes.pk])
+
+        self.assertEqual(deleter.count()["blocked_by"], {"inventory.Category": 1})
+        with self.assertRaises(DeleteBlocked) as raised:
+            deleter.run()
+
+        self.assertEqual(raised.exception.blockers, {"inventory.Category": 1})
+        self.assertEqual(Product.objects.count(), 5)
+
+    def test_blocker_added_while_draining(self):
+        def add_blocker(report):
+            if report["chunks"] == 1:
+                Category.objects.create(name="Late", slug="late", parent=self.boots)
+
+        deleter = ChunkedCascadeDelete(
+            Category, [self.boots.pk], chunk_size=1, on_progress=add_blocker
+        )
+        with self.assertRaises(DeleteBlocked) as raised:
+            deleter.run()
+
+        self.assertEqual(raised.exception.blockers, {"inventory.Category": 1})
+        self.assertTrue(Category.objects.filter(pk=self.boots.pk).exists())
+        # The drained products stay deleted, and counted out
+        self.assertFalse(Product.objects.filter(category=self.boots).exists())
+        self.assertSummariesCurrent()
+
+    def test_failure_while_draining_keeps_summaries(self):
+        def fail(report):
+            raise RuntimeError("worker stopped")
+
+        deleter = ChunkedCascadeDelete(
+            Category, [self.shoes.pk, self.boots.pk], chunk_size=2, on_progress=fail
+        )
+        with self.assertRaises(RuntimeError):
+            deleter.run()
+
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertSummariesCurrent()
+
+    def assertSummariesCurrent(self):
+        self.assertEqual(check_product_counts(), {})
+        buckets = PriceBucket.objects.filter(count__gt=0).order_by("pk")
+        fields = ("category_id", "bucket", "count", "total", "min_price", "max_price")
+        incremental = sorted(buckets.values_list(*fields), key=str)
+        rebuild_price_stats()
+        self.assertEqual(sorted(buckets.values_list(*fields), key=str), incremental)
+
+    def test_unsupported_relation_names_the_field(self):
+        rel = StockManagement._meta.get_field("product").remote_field
+        deleter = ChunkedCascadeDelete(Category, [self.shoes.pk, self.boots.pk])
+        with mock.patch.object(rel, "on_delete", models.SET_DEFAULT):
+            with self.assertRaisesMessage(
+                ValueError, "inventory.StockManagement.product"
+            ):
+                deleter.run()
+
+        self.assertEqual(Product.objects.count(), 5)
+
+
+class IdempotencyKeyTests(TestCase):
+    scope = "CategoryBulkInsertViewSet.create"
+    rows = [{"name": "A", "slug": "a"}]
+
+    def setUp(self):
+        idempotency.local_cache.clear()
+
+    def post(self, rows, key="key-1"):
+        view = CategoryBulkInsertViewSet.as_view({"post": "create"})
+        request = APIRequestFactory().post(
+            "/", rows, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+        return view(request)
+
+    def claim(self, **fields):
+        """A claim left behind by a request that has not finished."""
+        request = Request(
+            APIRequestFactory().post("/", self.rows, format="json"),
+            parsers=[parsers.StreamingJSONParser()],
+        )
+        return IdempotencyKey.objects.create(
+            scope=self.scope,
+            key="key-1",
+            fingerprint=idempotency.fingerprint(request),
+            expires_at=timezone.now() + timedelta(days=1),
+            **fields,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post(self.rows)
+        idempotency.local_cache.clear()  # replay from the table
+        retry = self.post(self.rows)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertIsNone(IdempotencyKey.objects.get().locked_until)
+
+    def test_different_payload_is_rejected(self):
+        self.post(self.rows)
+        response = self.post([{"name": "B", "slug": "b"}])
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Category.objects.count(), 1)
+
+    def test_claim_in_progress_conflicts(self):
+        self.claim(locked_until=timezone.now() + timedelta(minutes=1))
+        response = self.post(self.rows)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Category.objects.exists())
+
+    def test_abandoned_claim_is_taken_over(self):
+        abandoned = timezone.now() - timedelta(seconds=1)
+        self.claim(locked_until=abandoned)
+        response = self.post(self.rows)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Category.objects.count(), 1)
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual(stored.status_code, 201)
+
+        # The worker that lost its claim can no longer overwrite the outcome
+        IdempotencyKey.objects.filter(
+            scope=self.scope, key="key-1", locked_until=abandoned
+        ).update(status_code=500)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+
+class StockWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Shoes", slug="shoes")
+        cls.product = Product.objects.create(
+            category=category, name="Boot", slug="boot", price=10
+        )
+        StockManagement.objects.create(product=cls.product, quantity=5)
+        shard_stock([cls.product.pk], shards=3)
+
+    def quantities(self):
+        shards = StockShard.objects.filter(product=self.product)
+        return (
+            StockManagement.objects.get(product=self.product).quantity,
+            sum(shards.values_list("quantity", flat=True)),
+        )
+
+    def test_orders_cannot_sell_reserved_stock(self):
+        reservations = reserve({self.product.pk: 4})
+
+        with self.assertRaises(InsufficientStock):
+            decrement_stock({self.product.pk: 2})
+        self.assertEqual(self.quantities(), (5, 1))
+
+        decrement_stock({self.product.pk: 1})
+        self.assertEqual(self.quantities(), (4, 0))
+        with self.assertRaises(InsufficientStock):
+            reserve({self.product.pk: 1})
+
+        commit([reservation.token for reservation in reservations])
+        settle()
+        self.assertEqual(self.quantities(), (0, 0))
+
+    def test_released_stock_can_be_ordered(self):
+        reservations = reserve({self.product.pk: 5})
+        release([reservation.token for reservation in reservations])
+
+        decrement_stock({self.product.pk: 5})
+        self.assertEqual(self.quantities(), (0, 0))
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row locks")
+class ConcurrentStockTests(TransactionTestCase):
+    stock = 40
+
+    def setUp(self):
+        category = Category.objects.create(name="Shoes", slug="shoes")
+        self.product = Product.objects.create(
+            category=category, name="Boot", slug="boot", price=10
+        )
+        StockManagement.objects.create(product=self.product, quantity=self.stock)
+        shard_stock([self.product.pk], shards=4)
+
+    def test_orders_and_reservations_never_oversell(self):
+        sold, start_line = [], threading.Barrier(8)
+
+        def order():
+            decrement_stock({self.product.pk: 1})
+
+        def checkout():
+            reservations = reserve({self.product.pk: 1})
+            commit([reservation.token for reservation in reservations])
+
+        def worker(sell):
+            try:
+                start_line.wait()
+                for _ in range(10):
+                    try:
+                        with transaction.atomic():
+                            sell()
+                        sold.append(1)
+                    except InsufficientStock:
+                        pass
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker, args=(order if i % 2 else checkout,))
+            for i in range(8)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        settle()
+
+        self.assertEqual(len(sold), self.stock)
+        self.assertEqual(StockManagement.objects.get(product=self.product).quantity, 0)
+        self.assertFalse(
+            StockShard.objects.filter(product=self.product, quantity__lt=0).exists()
+        )
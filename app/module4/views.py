@@ -1,21 +1,55 @@
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
+    OpenApiParameter,
     extend_schema,
 )
-from inventory.models import Category
+from inventory.models import Category, Product
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
+from .bulk import (
+    PATCH_STATUSES,
+    bulk_patch_categories,
+    chunked,
+    parse_batch_size,
+    summarize,
+    upsert_categories,
+)
+from .deletion import (
+    DEFAULT_DELETE_CHUNK_SIZE,
+    ChunkedCascadeDelete,
+    DeleteBlocked,
+)
+from .idempotency import IDEMPOTENCY_PARAMETER, idempotent
+from .importers import (
+    DEFAULT_CHUNK_SIZE,
+    FORMATS,
+    METHODS,
+    ProductStockImporter,
+    detect_format,
+    read_records,
+)
+from .parsers import StreamingJSONParser, is_list_payload
+from .reservations import ReservationError, commit, release, reserve
 from .serializers import (
     CategoryBulkDeleteSerializer,
+    CategoryBulkUpdateSerializer,
     CategoryReturnSerializer,
     CategorySerializer,
     CreateProductSerializer,
     CreateProductStockSerializer,
     OrderSerializer,
+    ReservationTokensSerializer,
+    ReserveStockSerializer,
+    StockReservationSerializer,
     UserSerializer,
 )
+from .stock import InsufficientStock
 
 # class InventoryCategoryModelViewSet(ModelViewSet):
 #     queryset = Category.objects.all()  # Fetch all categories
@@ -60,39 +94,80 @@ class CategoryInsertViewSet(ViewSet):
 
 
 class CategoryBulkInsertViewSet(ViewSet):
+    # JSON arrays arrive as a lazily decoded JSONStream
+    parser_classes = [StreamingJSONParser, FormParser, MultiPartParser]
+
     @extend_schema(
         request=CategorySerializer(many=True),  # Accepts multiple objects
         responses={
             201: CategorySerializer(many=True)
         },  # Returns multiple inserted objects
+        parameters=[
+            OpenApiParameter(
+                name="mode",
+                type=str,
+                enum=["insert", "upsert"],
+                description="'upsert' inserts or updates on conflict on slug "
+                "and reports a status per row",
+                required=False,
+            ),
+            OpenApiParameter(
+                name="batch_size",
+                type=int,
+                description="Rows validated and written per INSERT statement",
+                required=False,
+            ),
+            IDEMPOTENCY_PARAMETER,
+        ],
         tags=["Module 4"],
     )
+    @idempotent
     def create(self, request):
         # Ensure request contains a list of items
-        if not isinstance(request.data, list):
+        if not is_list_payload(request.data):
             return Response(
                 {"error": "Expected a list of objects"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Deserialize data (many=True allows multiple objects)
-        serializer = CategorySerializer(data=request.data, many=True)
-
-        if serializer.is_valid():
-            # Convert validated data to model instances (without saving yet)
-            categories = [Category(**item) for item in serializer.validated_data]
-
-            # Use bulk_create() to insert all at once
-            created_categories = Category.objects.bulk_create(categories)
-
-            # Serialize the created objects and return response
+        batch_size = parse_batch_size(request.query_params.get("batch_size"))
+        if request.query_params.get("mode") == "upsert":
+            results = upsert_categories(request.data, batch_size=batch_size)
             return Response(
-                CategorySerializer(created_categories, many=True).data,
-                status=status.HTTP_201_CREATED,
+                {"summary": summarize(results), "results": results},
+                status=status.HTTP_200_OK,
             )
-        else:
+
+        # Validate and insert one chunk at a time inside a single transaction,
+        # so only batch_size parsed rows are held at once
+        created, errors, offset = [], {}, 0
+        with transaction.atomic():
+            for chunk in chunked(request.data, batch_size):
+                # Deserialize data (many=True allows multiple objects)
+                serializer = CategorySerializer(data=chunk, many=True)
+                if not serializer.is_valid():
+                    # Errors are keyed by position; shift them to the payload's
+                    errors.update(
+                        (offset + position, detail)
+                        for position, detail in serializer.errors.items()
+                    )
+                offset += len(chunk)
+                if errors:
+                    continue  # keep validating to report every error
+
+                # Use bulk_create() to insert the chunk, then derive path/level
+                categories = [Category(**item) for item in serializer.validated_data]
+                Category.objects.bulk_create(categories)
+                Category.objects.sync_paths(categories)
+                created.extend(CategorySerializer(categories, many=True).data)
+
+            if errors:
+                transaction.set_rollback(True)
+
+        if errors:
             # Return validation errors
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(created, status=status.HTTP_201_CREATED)
 
 
 ####
@@ -153,6 +228,51 @@ class CategoryPartialUpdateWithSaveViewSet(ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+####
+#  Ex.5 Bulk partial update of categories.
+####
+
+
+class BulkUpdateCategoryViewSet(ViewSet):
+    parser_classes = [StreamingJSONParser, FormParser, MultiPartParser]
+
+    @extend_schema(
+        request=CategoryBulkUpdateSerializer(many=True),
+        responses={200: OpenApiTypes.OBJECT},
+        parameters=[
+            OpenApiParameter(
+                name="batch_size",
+                type=int,
+                description="Rows per UPDATE statement",
+                required=False,
+            ),
+        ],
+        tags=["Module 4"],
+    )
+    @action(detail=False, methods=["patch"], url_path="bulk-update")
+    def bulk_update(self, request):
+        """
+        Partially updates many categories. The body is a list of
+        {"id": ..., <fields>} objects; only changed columns are written and
+        the response reports a status per id.
+        """
+        if not is_list_payload(request.data):
+            return Response(
+                {"error": "Expected a list of objects"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        batch_size = parse_batch_size(request.query_params.get("batch_size"))
+        results = bulk_patch_categories(request.data, batch_size=batch_size)
+        return Response(
+            {
+                "summary": summarize(results, statuses=PATCH_STATUSES),
+                "results": results,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 ####
 #  Ex.7 API to insert a Product.
 ####
@@ -160,8 +280,10 @@ class ProductInsertViewSet(ViewSet):
     @extend_schema(
         request=CreateProductSerializer,
         responses={201: CreateProductSerializer},
+        parameters=[IDEMPOTENCY_PARAMETER],
         tags=["Module 4"],
     )
+    @idempotent
     def create(self, request):
         """
         Creates a Product
@@ -197,6 +319,91 @@ class ProductStockInsertViewSet(ViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+####
+#  Ex.8b Streaming bulk import of products and their stock data.
+####
+class ProductBulkImportViewSet(ViewSet):
+    @extend_schema(
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            },
+            "text/csv": OpenApiTypes.BINARY,
+            "application/x-ndjson": OpenApiTypes.BINARY,
+        },
+        responses={200: OpenApiTypes.OBJECT},
+        parameters=[
+            OpenApiParameter(
+                name="input",
+                type=str,
+                enum=list(FORMATS),
+                description="Input format, guessed from the content type or "
+                "file name when omitted",
+                required=False,
+            ),
+            OpenApiParameter(
+                name="batch_size",
+                type=int,
+                description="Rows validated and written per transaction",
+                required=False,
+            ),
+            OpenApiParameter(
+                name="method",
+                type=str,
+                enum=list(METHODS),
+                description="'copy' uses PostgreSQL COPY, 'insert' multi-row INSERTs",
+                required=False,
+            ),
+        ],
+        tags=["Module 4"],
+    )
+    def create(self, request):
+        """
+        Imports products and their stock from a CSV or NDJSON upload (field
+        "file") or raw body. Rows are streamed and written in chunks; the
+        response reports counts and the rows that failed.
+        """
+        if request.content_type.startswith("multipart/"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response(
+                    {"error": "Expected a 'file' upload"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            stream, filename = upload, upload.name
+        else:
+            stream, filename = request.stream, ""
+            if stream is None:
+                return Response(
+                    {"error": "Empty request body"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        input_format = request.query_params.get("input") or detect_format(
+            request.content_type, filename
+        )
+        if input_format not in FORMATS:
+            return Response(
+                {"error": f"Unsupported input format '{input_format}'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        batch_size = parse_batch_size(
+            request.query_params.get("batch_size"), default=DEFAULT_CHUNK_SIZE
+        )
+        try:
+            importer = ProductStockImporter(
+                chunk_size=batch_size,
+                method=request.query_params.get("method", "auto"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = importer.run(read_records(stream, input_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+
 ####
 # Ex.9 API endpoint to create user and orders with multiple products.
 ####
@@ -214,8 +421,12 @@ class CreateUserViewSet(ViewSet):
 
 class OrderViewSet(ViewSet):
     @extend_schema(
-        request=OrderSerializer, responses={201: OrderSerializer}, tags=["Module 4"]
+        request=OrderSerializer,
+        responses={201: OrderSerializer},
+        parameters=[IDEMPOTENCY_PARAMETER],
+        tags=["Module 4"],
     )
+    @idempotent
     def create(self, request):
         serializer = OrderSerializer(data=request.data)
 
@@ -230,13 +441,66 @@ class OrderViewSet(ViewSet):
 # Ex.10 Delete.
 ####
 
+CHUNKED_DELETE_PARAMETERS = [
+    OpenApiParameter(
+        name="mode",
+        type=str,
+        enum=["default", "chunked"],
+        description="'chunked' deletes the cascade with set-based SQL in "
+        "bounded transactions instead of loading it into memory",
+        required=False,
+    ),
+    OpenApiParameter(
+        name="dry_run",
+        type=bool,
+        description="Chunked mode only: report row counts without deleting",
+        required=False,
+    ),
+    OpenApiParameter(
+        name="batch_size",
+        type=int,
+        description="Chunked mode only: products deleted per transaction",
+        required=False,
+    ),
+]
+
+
+def chunked_category_delete(request, category_ids):
+    """Run (or dry-run) a ChunkedCascadeDelete and build the response."""
+    deleter = ChunkedCascadeDelete(
+        Category,
+        category_ids,
+        chunk_size=parse_batch_size(
+            request.query_params.get("batch_size"), default=DEFAULT_DELETE_CHUNK_SIZE
+        ),
+    )
+
+    if request.query_params.get("dry_run", "").lower() in ("1", "true"):
+        return Response(deleter.count(), status=status.HTTP_200_OK)
+
+    try:
+        report = deleter.run()
+    except DeleteBlocked as e:
+        return Response(
+            {"error": "Category is still referenced", "blocked_by": e.blockers},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(report, status=status.HTTP_200_OK)
+
 
 class DeleteCategoryViewSet(ViewSet):
-    @extend_schema(tags=["Module 4"])
+    @extend_schema(parameters=CHUNKED_DELETE_PARAMETERS, tags=["Module 4"])
     def destroy(self, request, pk=None):
         """
         Deletes a category.
         """
+        if request.query_params.get("mode") == "chunked":
+            if not Category.objects.filter(pk=pk).exists():
+                return Response(
+                    {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            return chunked_category_delete(request, [pk])
+
         try:
             category = Category.objects.get(pk=pk)
             category.delete()  # Deletes Order and related OrderProducts due to ForeignKey
@@ -256,7 +520,11 @@ class DeleteCategoryViewSet(ViewSet):
 
 
 class BulkDeleteCategoryViewSet(ViewSet):
-    @extend_schema(request=CategoryBulkDeleteSerializer, tags=["Module 4"])
+    @extend_schema(
+        request=CategoryBulkDeleteSerializer,
+        parameters=CHUNKED_DELETE_PARAMETERS,
+        tags=["Module 4"],
+    )
     @action(detail=False, methods=["post"], url_path="bulk-delete")
     def bulk_delete(self, request):
         """
@@ -277,6 +545,9 @@ class BulkDeleteCategoryViewSet(ViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
+            if request.query_params.get("mode") == "chunked":
+                return chunked_category_delete(request, category_ids)
+
             # Perform the deletion of the categories
             deleted_count, _ = Category.objects.filter(id__in=category_ids).delete()
 
@@ -291,3 +562,137 @@ class BulkDeleteCategoryViewSet(ViewSet):
                 {"error": "Invalid data", "details": serializer.errors},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+
+
+####
+# Ex.12 Category tree: descendants, ancestors and products of a subtree.
+####
+
+
+class CategoryTreeViewSet(ViewSet):
+    """
+    Reads the category hierarchy through the materialized path that the
+    write endpoints keep up to date; each listing is one indexed query.
+    """
+
+    def get_category(self, pk):
+        try:
+            return Category.objects.only("id", "path").get(pk=pk)
+        except Category.DoesNotExist:
+            return None
+
+    @extend_schema(responses={200: CategorySerializer(many=True)}, tags=["Module 4"])
+    @action(detail=True, methods=["get"])
+    def descendants(self, request, pk=None):
+        category = self.get_category(pk)
+        if category is None:
+            return Response(
+                {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        categories = Category.objects.descendants(category).order_by("path")
+        return Response(CategorySerializer(categories, many=True).data)
+
+    @extend_schema(responses={200: CategorySerializer(many=True)}, tags=["Module 4"])
+    @action(detail=True, methods=["get"])
+    def ancestors(self, request, pk=None):
+        category = self.get_category(pk)
+        if category is None:
+            return Response(
+                {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        categories = Category.objects.ancestors(category).order_by("level")
+        return Response(CategorySerializer(categories, many=True).data)
+
+    @extend_schema(
+        responses={200: CreateProductSerializer(many=True)}, tags=["Module 4"]
+    )
+    @action(detail=True, methods=["get"])
+    def products(self, request, pk=None):
+        category = self.get_category(pk)
+        if category is None:
+            return Response(
+                {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        products = Product.objects.in_category_tree(category).order_by("id")
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        return paginator.get_paginated_response(
+            CreateProductSerializer(page, many=True).data
+        )
+
+
+####
+# Ex.13 Stock reservations for checkouts.
+####
+
+
+class StockReservationViewSet(ViewSet):
+    """
+    Reserve stock for a checkout, then commit it once the order is placed
+    or release it if the checkout is abandoned. Concurrent reservations of
+    the same product lock different stock shards instead of queueing.
+    """
+
+    @extend_schema(
+        request=ReserveStockSerializer,
+        responses={201: StockReservationSerializer(many=True)},
+        parameters=[IDEMPOTENCY_PARAMETER],
+        tags=["Module 4"],
+    )
+    @idempotent
+    def create(self, request):
+        serializer = ReserveStockSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        quantities = {
+            line["product"]: line["quantity"]
+            for line in serializer.validated_data["products"]
+        }
+        try:
+            reservations = reserve(quantities, ttl=serializer.validated_data.get("ttl"))
+        except InsufficientStock as e:
+            return Response(
+                {"error": "Insufficient stock", "products": e.product_ids},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(
+            StockReservationSerializer(reservations, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    def _apply(self, request, operation):
+        serializer = ReservationTokensSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            count = operation(serializer.validated_data["tokens"])
+        except ReservationError as e:
+            return Response(
+                {"error": "Reservations are not pending", "tokens": e.tokens},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({"count": count}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        request=ReservationTokensSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+        tags=["Module 4"],
+    )
+    @action(detail=False, methods=["post"])
+    def commit(self, request):
+        """Marks pending reservations as sold."""
+        return self._apply(request, commit)
+
+    @extend_schema(
+        request=ReservationTokensSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+        tags=["Module 4"],
+    )
+    @action(detail=False, methods=["post"])
+    def release(self, request):
+        """Returns pending reservations to the available stock."""
+        return self._apply(request, release)
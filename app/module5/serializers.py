@@ -19,3 +19,28 @@ class ProductSerializer(serializers.ModelSerializer):
             "price",
             "is_active",
         ]
+
+
+class PriceBucketSerializer(serializers.Serializer):
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, allow_null=True
+    )
+    count = serializers.IntegerField()
+
+
+class PriceStatisticsSerializer(serializers.Serializer):
+    category = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, allow_null=True
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, allow_null=True
+    )
+    avg_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, allow_null=True
+    )
+    histogram = PriceBucketSerializer(many=True)
+    cheapest_product = ProductSerializer(allow_null=True)
+    most_expensive_product = ProductSerializer(allow_null=True)
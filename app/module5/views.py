@@ -1,14 +1,19 @@
 import traceback
 
+from core.cache import cache_response, response_cache_stats
+from core.conditional import conditional
+from core.pagination import CountStrategyPagination, KeysetPagination
 from django.http import JsonResponse
 from drf_spectacular.utils import OpenApiParameter, extend_schema
-from inventory.models import Category, Product
-from rest_framework import pagination
+from inventory.models import Category, CategoryProductCount, Product
+from inventory.prices import price_extremes, price_statistics
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ViewSet, mixins
 
 from .serializers import (
     CategorySerializer,
+    PriceStatisticsSerializer,
     ProductSerializer,
 )
 
@@ -18,6 +23,8 @@ from .serializers import (
 )
 # en este view use try solo a modo de ejemplo
 class CategoryListViewSet(ViewSet):
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request):
         try:
             categories = Category.objects.all()
@@ -36,6 +43,8 @@ class CategoryListValuesViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request):
         categories = Category.objects.values("name", "slug")
         serializer = CategorySerializer(categories, many=True)
@@ -46,6 +55,8 @@ class CategoryListOnlyViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request):
         categories = Category.objects.only("name", "slug")
         serializer = CategorySerializer(categories, many=True)
@@ -56,6 +67,8 @@ class CategoryFilterViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request):
         categories = Category.objects.filter(is_active=False)
         serializer = CategorySerializer(categories, many=True)
@@ -68,6 +81,8 @@ class DynamicCategoryQueryFilterViewSet(ViewSet):
         parameters=[OpenApiParameter("active", exclude=False)],
         tags=["Module 5"],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request):
         active_param = request.query_params.get("active")
         categories = Category.objects.all()
@@ -86,6 +101,8 @@ class DynamicCategoryURLFilterViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request, active_status=None):
         # active_param = request.query_params.get("active")
         categories = Category.objects.all()
@@ -103,6 +120,8 @@ class InactiveCategoryExcludeViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request):
         # active_param = request.query_params.get("active")
         categories = Category.objects.exclude(is_active=True).exclude(
@@ -125,6 +144,8 @@ class SortedCategoryViewSet(ViewSet):
             )
         ],
     )
+    @conditional(Category)
+    @cache_response(Category)
     def list(self, request, order="asc"):
         order = request.GET.get("order")
         if order == "desc":
@@ -144,13 +165,10 @@ class PriceRangeProductViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Product)
     def list(self, request):
-        cheapest_product = Product.objects.order_by(
-            "price"
-        ).first()  # Get the cheapest product
-        expensive_product = Product.objects.order_by(
-            "-price"
-        ).first()  # Get the most expensive product
+        # Both ends of the (price, id) index in one query
+        cheapest_product, expensive_product = price_extremes()
 
         # Serialize data
         data = {
@@ -166,23 +184,59 @@ class PriceRangeProductViewSet(ViewSet):
 ####
 
 
-class ProductPagination(pagination.PageNumberPagination):
+class ProductPagination(CountStrategyPagination):
     page_size = 2
     page_size_query_param = "page_size"
     max_page_size = 50
 
 
+class ProductKeysetPagination(KeysetPagination):
+    """
+    Seeks on (sort key, id) instead of COUNT(*) + OFFSET, so deep pages
+    cost the same as the first one.
+    """
+
+    page_size = 2
+    max_page_size = 50
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+        "created_at": ("created_at", "id"),
+        "-created_at": ("-created_at", "-id"),
+    }
+
+
 @extend_schema(
     tags=["Module 5"],
 )
 class ProductListViewSet(GenericViewSet, mixins.ListModelMixin):
     """
-    Retrieves a paginated list of products.
+    Retrieves a paginated list of products in numbered pages. Requests with
+    "cursor" (empty for the first page) opt in to keyset pages instead:
+    follow the "next"/"previous" cursors to page, "ordering" picks the sort
+    key, and there is no total count.
     """
 
     queryset = Product.objects.all().order_by("id")  # Ordered QuerySet
     serializer_class = ProductSerializer
     pagination_class = ProductPagination  # Enable Pagination
+    keyset_pagination_class = ProductKeysetPagination
+
+    @conditional(Product)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            cursor = self.keyset_pagination_class.cursor_query_param
+            if cursor in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
 
 ####
@@ -198,16 +252,77 @@ class DistinctCategoryViewSet(ViewSet):
     @extend_schema(
         tags=["Module 5"],
     )
+    @conditional(Product)
     def list(self, request):
-        # Get distinct category IDs that products are connected to
-        distinct_categories = (
-            Product.objects.values("category")
-            .distinct()
-            .order_by("category")
-            .exclude(category__isnull=True)
+        # The maintained counters answer this from a partial index, without
+        # reading the products
+        data = list(
+            CategoryProductCount.objects.filter(products__gt=0)
+            .order_by("category_id")
+            .values_list("category_id", flat=True)
         )
 
-        # Return the distinct category IDs
-        data = [category["category"] for category in distinct_categories]
+        return Response(data)
+
+
+####
+# Ex.12 Hit/miss counters of the category response cache.
+####
+
+
+class ResponseCacheStatsViewSet(ViewSet):
+    """
+    Reports this process's response cache hits (local LRU and shared tier)
+    and misses per view.
+    """
+
+    @extend_schema(
+        tags=["Module 5"],
+    )
+    def list(self, request):
+        return Response(response_cache_stats.snapshot())
+
+
+####
+# Ex.13 Price statistics from the maintained summary table.
+####
+
+
+@extend_schema(
+    tags=["Module 5"],
+    responses=PriceStatisticsSerializer,
+)
+class PriceStatisticsViewSet(ViewSet):
+    """
+    Count, min/max/average price and a price histogram of all products
+    (list) or of one category (retrieve), read from the PriceBucket summary
+    rows instead of aggregating the products, plus the cheapest and most
+    expensive product.
+    """
+
+    @conditional(Product, Category)
+    def list(self, request):
+        return Response(self.statistics(None, Product.objects.all()))
 
+    @conditional(Product, Category)
+    def retrieve(self, request, pk=None):
+        try:
+            category_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        data = self.statistics(
+            category_id, Product.objects.filter(category_id=category_id)
+        )
+        if not data["count"] and not Category.objects.filter(pk=category_id).exists():
+            raise NotFound()
         return Response(data)
+
+    def statistics(self, category_id, products):
+        data = price_statistics(category_id)
+        if data["count"]:
+            cheapest, most_expensive = price_extremes(products)
+        else:
+            cheapest = most_expensive = None
+        data["cheapest_product"] = cheapest
+        data["most_expensive_product"] = most_expensive
+        return PriceStatisticsSerializer(data).data
@@ -1,4 +1,7 @@
+from core.filters import IndexedFilterBackend
+from django.core.exceptions import ValidationError as DjangoValidationError
 from inventory.models import Category, Product
+from inventory.search import FIELDS
 from rest_framework import serializers
 
 
@@ -12,3 +15,72 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ["id", "name", "slug", "description", "price", "is_active", "category"]
+
+
+class ProductSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    prefix = serializers.BooleanField(default=False)
+    fields = serializers.CharField(
+        default=",".join(FIELDS), help_text="Comma separated: " + ", ".join(FIELDS)
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate_fields(self, value):
+        fields = [field.strip() for field in value.split(",") if field.strip()]
+        unknown = set(fields) - set(FIELDS)
+        if unknown or not fields:
+            raise serializers.ValidationError(f"Choose from: {', '.join(FIELDS)}.")
+        return fields
+
+
+class ProductSearchResultSerializer(serializers.Serializer):
+    score = serializers.FloatField()
+    product = ProductSerializer()
+
+
+class ProductSeekQuerySerializer(serializers.Serializer):
+    """
+    ``ordering`` must be one of ``context["orderings"]``; ``after`` is
+    parsed into a key of that ordering.
+    """
+
+    ordering = serializers.CharField(default="id")
+    after = serializers.CharField(
+        required=False,
+        help_text=(
+            "Comma separated values of the ordering's fields, e.g. "
+            "19.99,1234 for ordering=price (price, id)"
+        ),
+    )
+
+    def validate_ordering(self, value):
+        orderings = self.context["orderings"]
+        if value not in orderings:
+            raise serializers.ValidationError(f"Choose from: {', '.join(orderings)}.")
+        return value
+
+    def validate(self, attrs):
+        if "after" not in attrs:
+            return attrs
+        names = [
+            name.lstrip("-") for name in self.context["orderings"][attrs["ordering"]]
+        ]
+        values = attrs["after"].split(",")
+        if len(values) != len(names):
+            raise serializers.ValidationError(
+                {"after": [f"Give comma separated values of: {', '.join(names)}."]}
+            )
+        backend = IndexedFilterBackend()
+        try:
+            attrs["after"] = [
+                backend.to_python(Product._meta.get_field(name), value)
+                for name, value in zip(names, values)
+            ]
+        except (DjangoValidationError, ValueError) as error:
+            messages = getattr(error, "messages", None) or [str(error)]
+            raise serializers.ValidationError({"after": messages})
+        return attrs
+
+
+class ProductWindowQuerySerializer(ProductSeekQuerySerializer):
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
@@ -17,6 +17,12 @@ for name, cls in getmembers(views, isclass):
             rf"{name.lower().replace('viewset', '')}", cls, basename=name.lower()
         )
 
+router.register(r"productquery", views.ProductQueryViewSet, basename="productquery")
+router.register(
+    r"facetedproduct", views.FacetedProductViewSet, basename="facetedproduct"
+)
+router.register(r"categoryquery", views.CategoryQueryViewSet, basename="categoryquery")
+
 urlpatterns = [
     path("api/mod6/", include(router.urls)),  # Register the routes under '/api/m4/'
 ]
@@ -1,11 +1,30 @@
+import json
+
+from core.conditional import conditional
+from core.filters import IndexedFilterBackend
+from core.pagination import KeysetPagination, keyset_chunks, row_key, seek
+from core.serializers import compiled
+from django.conf import settings
 from django.db.models import Q
-from drf_spectacular.utils import extend_schema
-from inventory.models import Product
+from django.http import StreamingHttpResponse
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from inventory.facets import FACET_NAMES, cached_facet_counts
+from inventory.models import Category, Product, ProductPromotionEvent
+from inventory.search import product_search
+from inventory.snapshot import product_snapshot
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.viewsets import ViewSet
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.viewsets import GenericViewSet, ViewSet, mixins
 
 from .serializers import (
+    CategorySerializer,
+    ProductSearchQuerySerializer,
+    ProductSearchResultSerializer,
+    ProductSeekQuerySerializer,
     ProductSerializer,
+    ProductWindowQuerySerializer,
 )
 
 
@@ -18,6 +37,7 @@ class ProductsInCategoryListViewSet(ViewSet):
     @extend_schema(
         tags=["Module 6"],
     )
+    @conditional(Product, ProductPromotionEvent)
     def list(self, request):
         # Example 1: Using AND (Default behavior)
         # Find products that are active and belong to the category with ID=1
@@ -54,50 +74,48 @@ class ComparisonOperatorViewSet(ViewSet):
     Retrieves products using comparison operators, including equal to, not equal to, and negation (~).
     """
 
+    @conditional(Product)
     def list(self, request):
-        # Example 1: Greater Than (gt)
-        # Find products with a price greater than 100
-        products_gt = Product.objects.filter(price__gt=100)
-
-        # Example 2: Less Than (lt)
-        # Find products with a price less than 50
-        products_lt = Product.objects.filter(price__lt=50)
-
-        # Example 3: Greater Than or Equal to (gte)
-        # Find products with a price greater than or equal to 30
-        products_gte = Product.objects.filter(price__gte=30)
-
-        # Example 4: Less Than or Equal to (lte)
-        # Find products with a price less than or equal to 200
-        products_lte = Product.objects.filter(price__lte=200)
-
-        # Example 5: Exact Match (exact)
-        # Find products whose name is exactly 'Product A'
-        products_exact = Product.objects.filter(name__exact="Product A")
-
-        # Example 6: Equal To (equal)
-        # Find products whose name is 'Product B' (same as exact)
-        products_equal = Product.objects.filter(name="Product B")
-
-        # Example 7: Not Equal To (exclude)
-        # Find products whose name is NOT 'Product A'
-        products_not_equal = Product.objects.exclude(name="Product A")
-
-        # Example 8: Using ~ (Negation)
-        # Find products that do NOT belong to Category 1 (negating the condition)
-        products_negation = Product.objects.filter(~Q(category__id=1))
-
-        # Serialize data to return response
-        products_data = {
-            "products_gt": ProductSerializer(products_gt, many=True).data,
-            "products_lt": ProductSerializer(products_lt, many=True).data,
-            "products_gte": ProductSerializer(products_gte, many=True).data,
-            "products_lte": ProductSerializer(products_lte, many=True).data,
-            "products_exact": ProductSerializer(products_exact, many=True).data,
-            "products_equal": ProductSerializer(products_equal, many=True).data,
-            "products_not_equal": ProductSerializer(products_not_equal, many=True).data,
-            "products_negation": ProductSerializer(products_negation, many=True).data,
-        }
+        # Each example is a predicate; all of them are evaluated in one query
+        # and every product is serialized once (compiled: no per-field DRF
+        # calls), however many examples it appears in
+        products_data = compiled(ProductSerializer).serialize_groups(
+            Product.objects.all(),
+            {
+                # Example 1: Greater Than (gt)
+                # Find products with a price greater than 100
+                # products_gt = Product.objects.filter(price__gt=100)
+                "products_gt": Q(price__gt=100),
+                # Example 2: Less Than (lt)
+                # Find products with a price less than 50
+                # products_lt = Product.objects.filter(price__lt=50)
+                "products_lt": Q(price__lt=50),
+                # Example 3: Greater Than or Equal to (gte)
+                # Find products with a price greater than or equal to 30
+                # products_gte = Product.objects.filter(price__gte=30)
+                "products_gte": Q(price__gte=30),
+                # Example 4: Less Than or Equal to (lte)
+                # Find products with a price less than or equal to 200
+                # products_lte = Product.objects.filter(price__lte=200)
+                "products_lte": Q(price__lte=200),
+                # Example 5: Exact Match (exact)
+                # Find products whose name is exactly 'Product A'
+                # products_exact = Product.objects.filter(name__exact="Product A")
+                "products_exact": Q(name__exact="Product A"),
+                # Example 6: Equal To (equal)
+                # Find products whose name is 'Product B' (same as exact)
+                # products_equal = Product.objects.filter(name="Product B")
+                "products_equal": Q(name="Product B"),
+                # Example 7: Not Equal To (exclude)
+                # Find products whose name is NOT 'Product A'
+                # products_not_equal = Product.objects.exclude(name="Product A")
+                "products_not_equal": ~Q(name="Product A"),
+                # Example 8: Using ~ (Negation)
+                # Find products that do NOT belong to Category 1 (negating the condition)
+                # products_negation = Product.objects.filter(~Q(category__id=1))
+                "products_negation": ~Q(category__id=1),
+            },
+        )
 
         return Response(products_data)
 
@@ -116,7 +134,11 @@ class PatternMatchingViewSet(ViewSet):
     Retrieves products using pattern matching methods: .contains() and .startswith().
     """
 
+    @conditional(Product)
     def list(self, request):
+        # On PostgreSQL the UPPER(...) pattern and trigram indexes of Product
+        # serve these LIKE lookups, leading wildcards included
+
         # Example 1: Using contains()
         # Find products whose name contains the substring 'shoe'
         products_contains = Product.objects.filter(name__icontains="Skirt")
@@ -188,50 +210,50 @@ class ListFilteringViewSet(ViewSet):
     Retrieves products using list filtering methods: `in_()` and `not_in()`.
     """
 
+    @conditional(Product)
     def list(self, request):
-        # Example 1: Using __in to filter products by a list of category IDs
-        # Find products that belong to either Category 1, 2, or 3
         categories_list = [1, 2, 3]
-        products_in = Product.objects.filter(category__in=categories_list)
-
-        # Example 2: Using exclude() with __in to filter products not in a list of category IDs
-        # Find products that are not in Category 1, 2, or 3
-        products_not_in = Product.objects.exclude(category__in=categories_list)
-
-        # Example 3: Using __in to filter products by a list of product IDs
-        # Find products with specific IDs (e.g., 1, 2, and 3)
         product_ids = [1, 2, 3]
-        specific_products = Product.objects.filter(id__in=product_ids)
-
-        # Example 4: Using exclude() with __in to exclude products with specific IDs
-        # Find products that are not 1, 2, or 3
         exclude_product_ids = [1, 2, 3]
-        exclude_products = Product.objects.exclude(id__in=exclude_product_ids)
-
-        # Example 5: Filtering products by multiple attributes with __in
-        # Find products that belong to Category 1 or 2, and are active
         active_categories = [1, 2]
-        active_products = Product.objects.filter(
-            category__id__in=active_categories, is_active=True
-        )
 
-        # Example 6: Filtering products by multiple attributes with exclude() and __in
-        # Find products that are not active and not in Category 1 or 2
-        exclude_active_products = Product.objects.exclude(
-            category__id__in=active_categories
-        ).exclude(is_active=True)
-
-        # Serialize data to return response
-        products_data = {
-            "products_in": ProductSerializer(products_in, many=True).data,
-            "products_not_in": ProductSerializer(products_not_in, many=True).data,
-            "specific_products": ProductSerializer(specific_products, many=True).data,
-            "exclude_products": ProductSerializer(exclude_products, many=True).data,
-            "active_products": ProductSerializer(active_products, many=True).data,
-            "exclude_active_products": ProductSerializer(
-                exclude_active_products, many=True
-            ).data,
-        }
+        # All examples in one query, each product serialized once
+        products_data = compiled(ProductSerializer).serialize_groups(
+            Product.objects.all(),
+            {
+                # Example 1: Using __in to filter products by a list of category IDs
+                # Find products that belong to either Category 1, 2, or 3
+                # products_in = Product.objects.filter(category__in=categories_list)
+                "products_in": Q(category__in=categories_list),
+                # Example 2: Using exclude() with __in to filter products not in a list of category IDs
+                # Find products that are not in Category 1, 2, or 3
+                # products_not_in = Product.objects.exclude(category__in=categories_list)
+                "products_not_in": ~Q(category__in=categories_list),
+                # Example 3: Using __in to filter products by a list of product IDs
+                # Find products with specific IDs (e.g., 1, 2, and 3)
+                # specific_products = Product.objects.filter(id__in=product_ids)
+                "specific_products": Q(id__in=product_ids),
+                # Example 4: Using exclude() with __in to exclude products with specific IDs
+                # Find products that are not 1, 2, or 3
+                # exclude_products = Product.objects.exclude(id__in=exclude_product_ids)
+                "exclude_products": ~Q(id__in=exclude_product_ids),
+                # Example 5: Filtering products by multiple attributes with __in
+                # Find products that belong to Category 1 or 2, and are active
+                # active_products = Product.objects.filter(
+                #     category__id__in=active_categories, is_active=True
+                # )
+                "active_products": Q(
+                    category__id__in=active_categories, is_active=True
+                ),
+                # Example 6: Filtering products by multiple attributes with exclude() and __in
+                # Find products that are not active and not in Category 1 or 2
+                # exclude_active_products = Product.objects.exclude(
+                #     category__id__in=active_categories
+                # ).exclude(is_active=True)
+                "exclude_active_products": ~Q(category__id__in=active_categories)
+                & ~Q(is_active=True),
+            },
+        )
 
         return Response(products_data)
 
@@ -249,49 +271,49 @@ class RangeFilteringViewSet(ViewSet):
     Retrieves products using value range filtering: `range()`.
     """
 
+    @conditional(Product)
     def list(self, request):
-        # Example 1: Using __range to filter products by price range
-        # Find products with a price between 100 and 500
         price_range = (100, 500)
-        products_by_price = Product.objects.filter(price__range=price_range)
-
-        # Example 2: Using __range to filter products by creation date range
-        # Find products created between January 1, 2023, and December 31, 2023
         date_range = ("2023-01-01", "2026-12-31")
-        products_by_date = Product.objects.filter(created_at__range=date_range)
-
-        # Example 3: Using __range to filter products by ID range
-        # Find products with IDs between 1 and 10
         id_range = (1, 10)
-        products_by_id = Product.objects.filter(id__range=id_range)
-
-        # Example 4: Filtering active products with price range
-        # Find active products with a price between 50 and 200
         active_price_range = (50, 200)
-        active_products_in_range = Product.objects.filter(
-            is_active=True, price__range=active_price_range
-        )
-
-        # Example 5: Combining multiple ranges (price range and created date range)
-        # Find products with a price between 100 and 500 created between January 1, 2023, and December 31, 2023
         combined_range = (100, 500)
         date_combined_range = ("2023-01-01", "2023-12-31")
-        products_combined_range = Product.objects.filter(
-            price__range=combined_range, created_at__range=date_combined_range
-        )
 
-        # Serialize data to return response
-        products_data = {
-            "products_by_price": ProductSerializer(products_by_price, many=True).data,
-            "products_by_date": ProductSerializer(products_by_date, many=True).data,
-            "products_by_id": ProductSerializer(products_by_id, many=True).data,
-            "active_products_in_range": ProductSerializer(
-                active_products_in_range, many=True
-            ).data,
-            "products_combined_range": ProductSerializer(
-                products_combined_range, many=True
-            ).data,
-        }
+        # All examples in one query, each product serialized once
+        products_data = compiled(ProductSerializer).serialize_groups(
+            Product.objects.all(),
+            {
+                # Example 1: Using __range to filter products by price range
+                # Find products with a price between 100 and 500
+                # products_by_price = Product.objects.filter(price__range=price_range)
+                "products_by_price": Q(price__range=price_range),
+                # Example 2: Using __range to filter products by creation date range
+                # Find products created between January 1, 2023, and December 31, 2023
+                # products_by_date = Product.objects.filter(created_at__range=date_range)
+                "products_by_date": Q(created_at__range=date_range),
+                # Example 3: Using __range to filter products by ID range
+                # Find products with IDs between 1 and 10
+                # products_by_id = Product.objects.filter(id__range=id_range)
+                "products_by_id": Q(id__range=id_range),
+                # Example 4: Filtering active products with price range
+                # Find active products with a price between 50 and 200
+                # active_products_in_range = Product.objects.filter(
+                #     is_active=True, price__range=active_price_range
+                # )
+                "active_products_in_range": Q(
+                    is_active=True, price__range=active_price_range
+                ),
+                # Example 5: Combining multiple ranges (price range and created date range)
+                # Find products with a price between 100 and 500 created between January 1, 2023, and December 31, 2023
+                # products_combined_range = Product.objects.filter(
+                #     price__range=combined_range, created_at__range=date_combined_range
+                # )
+                "products_combined_range": Q(
+                    price__range=combined_range, created_at__range=date_combined_range
+                ),
+            },
+        )
 
         return Response(products_data)
 
@@ -307,13 +329,26 @@ class RangeFilteringViewSet(ViewSet):
 class ListSlicingViewSet(ViewSet):
     """
     Retrieves products using List Slicing.
+
+    Slices past the first window are taken after the last key seen
+    (``seek``) instead of with an ``OFFSET``, which reads and throws away
+    every row before the window; see ``ProductWindowViewSet`` (Ex.10) for
+    walking the whole catalog.
     """
 
+    @conditional(Product)
     def list(self, request):
         # Example 1: Get the first 10 products
-        first_10_products = Product.objects.all()[:10]
-        # Example 2: Get products from 11th to 20th record
-        next_10_products = Product.objects.all()[10:20]
+        # first_10_products = Product.objects.all()[:10]
+        first_10_products = list(seek(Product.objects.all(), ("id",))[:10])
+        # Example 2: Get products from 11th to 20th record: the 10 after the
+        # last one of Example 1
+        # next_10_products = Product.objects.all()[10:20]
+        next_10_products = (
+            seek(Product.objects.all(), ("id",), [first_10_products[-1].id])[:10]
+            if first_10_products
+            else []
+        )
         # Example 3: Using slicing with order_by
         first_last_products = Product.objects.order_by("-id")[:1]
 
@@ -327,3 +362,315 @@ class ListSlicingViewSet(ViewSet):
         }
 
         return Response(products_data)
+
+
+####
+#  Ex.7 Ranked product search.
+####
+
+
+@extend_schema(
+    tags=["Module 6"],
+)
+class ProductSearchViewSet(ViewSet):
+    """
+    Searches product names, slugs and descriptions for a substring
+    (``?q=``) or a prefix (``&prefix=true``), best matches first, through
+    the product search backend instead of LIKE scans.
+    """
+
+    @extend_schema(
+        parameters=[ProductSearchQuerySerializer],
+        responses=ProductSearchResultSerializer(many=True),
+    )
+    @conditional(Product)
+    def list(self, request):
+        params = ProductSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        hits = product_search().search(
+            params.validated_data["q"],
+            prefix=params.validated_data["prefix"],
+            fields=params.validated_data["fields"],
+            limit=params.validated_data["limit"],
+        )
+        products = Product.objects.in_bulk([pk for pk, _ in hits])
+        results = [
+            {"score": score, "product": products[pk]}
+            for pk, score in hits
+            if pk in products
+        ]
+        return Response(ProductSearchResultSerializer(results, many=True).data)
+
+
+####
+#  Ex.8 Client-side filters over indexed fields.
+####
+
+
+class ProductQueryPagination(KeysetPagination):
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+        "created_at": ("created_at", "id"),
+        "-created_at": ("-created_at", "-id"),
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.snapshot_filters = getattr(view, "snapshot_filters", None)
+        return super().paginate_queryset(queryset, request, view)
+
+    def fetch(self, queryset, ordering, position, limit):
+        if self.snapshot_filters is None:
+            return super().fetch(queryset, ordering, position, limit)
+        return product_snapshot().page(
+            queryset, self.snapshot_filters, ordering, position, limit
+        )
+
+
+@extend_schema(
+    tags=["Module 6"],
+)
+class ProductQueryViewSet(GenericViewSet, mixins.ListModelMixin):
+    """
+    Products filtered by query parameters instead of hardcoded predicates,
+    e.g. ``?price__range=100,500&is_active=true&ordering=-price``. Only
+    indexed fields can be filtered on; combinations that would read most
+    of the table are rejected with a 400.
+
+    With ``PRODUCT_SNAPSHOT_ENABLED``, filters on the snapshot columns are
+    matched in memory (``inventory.snapshot``) and only the page is read
+    from the database; broad filters are then accepted too.
+    """
+
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    pagination_class = ProductQueryPagination
+    filter_backends = [IndexedFilterBackend]
+    filter_fields = {
+        "id": ["exact", "in", "range"],
+        "price": ["exact", "gt", "gte", "lt", "lte", "range"],
+        "created_at": ["gt", "gte", "lt", "lte", "range"],
+        "category": ["exact", "in"],
+        "name": ["exact", "istartswith", "icontains"],
+        "slug": ["exact", "istartswith"],
+    }
+    residual_filter_fields = ["is_active"]
+    use_snapshot = True
+
+    @conditional(Product)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        self.snapshot_filters = None
+        snapshot = product_snapshot() if self.use_snapshot else None
+        if snapshot is not None:
+            filters = IndexedFilterBackend().get_query_filters(
+                self.request, queryset, self
+            )
+            if filters and snapshot.supports(filters):
+                # Left to the paginator, which reads only the page's rows
+                self.snapshot_filters = filters
+                return queryset
+        return super().filter_queryset(queryset)
+
+
+class CategoryQueryPagination(KeysetPagination):
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "name": ("name",),
+        "-name": ("-name",),
+    }
+
+
+@extend_schema(
+    tags=["Module 6"],
+)
+class CategoryQueryViewSet(GenericViewSet, mixins.ListModelMixin):
+    """
+    Categories filtered by query parameters, e.g. ``?parent=3`` or
+    ``?path__startswith=/1/&is_active=true``.
+    """
+
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    pagination_class = CategoryQueryPagination
+    filter_backends = [IndexedFilterBackend]
+    filter_fields = {
+        "id": ["exact", "in", "range"],
+        "parent": ["exact", "in"],
+        "name": ["exact", "in"],
+        "slug": ["exact", "in"],
+        "path": ["startswith"],
+    }
+    residual_filter_fields = ["is_active"]
+
+    @conditional(Category)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+####
+#  Ex.9 Facet counts next to a filtered product listing.
+####
+
+
+@extend_schema(
+    tags=["Module 6"],
+)
+class FacetedProductViewSet(ProductQueryViewSet):
+    """
+    A page of ``ProductQueryViewSet`` results plus the facet counts
+    (``?facets=category,price``; all facets by default) of every product
+    matching the filters, computed in one query and cached per filter.
+    """
+
+    reserved_query_params = ["facets"]
+    # The counts need the filtered queryset
+    use_snapshot = False
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "facets",
+                str,
+                description=f"Comma separated, of: {', '.join(FACET_NAMES)}",
+            )
+        ],
+    )
+    @conditional(Product)
+    def list(self, request, *args, **kwargs):
+        names = self.get_facet_names(request)
+        products = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(products)
+        response = self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+        response.data["facets"] = cached_facet_counts(products, names)
+        return response
+
+    def get_facet_names(self, request):
+        raw = request.query_params.get("facets")
+        if raw is None:
+            return FACET_NAMES
+        names = [name for name in raw.split(",") if name]
+        if not names or set(names) - set(FACET_NAMES):
+            raise ValidationError(
+                {"facets": [f"Comma separated, of: {', '.join(FACET_NAMES)}."]}
+            )
+        return tuple(names)
+
+
+####
+#  Ex.10 Walking the catalog by key instead of by offset.
+####
+
+# Sort keys of the walks, all served by an index
+WALK_ORDERINGS = ProductQueryPagination.orderings
+# The stream's lines must carry their key for a sync to resume from
+STREAM_ORDERINGS = {
+    name: ordering
+    for name, ordering in WALK_ORDERINGS.items()
+    if all(field.lstrip("-") in ProductSerializer.Meta.fields for field in ordering)
+}
+
+
+def walk_rows(ordering):
+    """``values()`` of the products with the compiled serializer's columns and the key."""
+    names = [name.lstrip("-") for name in ordering]
+    columns = compiled(ProductSerializer).columns
+    return Product.objects.values(*dict.fromkeys([*columns, *names]))
+
+
+def key_param(key):
+    return ",".join(
+        value.isoformat() if hasattr(value, "isoformat") else str(value)
+        for value in key
+    )
+
+
+@extend_schema(
+    tags=["Module 6"],
+)
+class ProductWindowViewSet(ViewSet):
+    """
+    The next ``limit`` products after a key, e.g.
+    ``?ordering=price&after=19.99,1234&limit=500``: the seek form of
+    ``Product.objects.all()[offset:offset + limit]``. Every window costs
+    the same, so following ``next`` (or ``next_after``) through the
+    catalog reads each product once instead of re-reading the skipped
+    ones on every page.
+    """
+
+    @extend_schema(parameters=[ProductWindowQuerySerializer])
+    @conditional(Product)
+    def list(self, request):
+        params = ProductWindowQuerySerializer(
+            data=request.query_params, context={"orderings": WALK_ORDERINGS}
+        )
+        params.is_valid(raise_exception=True)
+        ordering = WALK_ORDERINGS[params.validated_data["ordering"]]
+        limit = params.validated_data["limit"]
+        after = params.validated_data.get("after")
+        # One extra row tells whether there is a further window
+        rows = list(seek(walk_rows(ordering), ordering, after)[: limit + 1])
+        next_after = next_link = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = key_param(row_key(rows[-1], ordering))
+            next_link = replace_query_param(
+                request.build_absolute_uri(), "after", next_after
+            )
+        from_values = compiled(ProductSerializer).from_values
+        return Response(
+            {
+                "next": next_link,
+                "next_after": next_after,
+                "results": [from_values(row) for row in rows],
+            }
+        )
+
+
+@extend_schema(
+    tags=["Module 6"],
+)
+class ProductStreamViewSet(ViewSet):
+    """
+    Every product (after ``?after=``) in ``?ordering=`` as newline
+    delimited JSON, one product per line, for full catalog syncs. Rows are
+    read ``PRODUCT_STREAM_CHUNK_SIZE`` at a time by seek queries, so the
+    walk is linear in the catalog size and memory stays flat. An
+    interrupted sync resumes with ``after`` set to the ordering fields of
+    the last line it received.
+    """
+
+    @extend_schema(
+        parameters=[ProductSeekQuerySerializer],
+        responses={(200, "application/x-ndjson"): ProductSerializer},
+    )
+    def list(self, request):
+        # No ETag: the stream reads the table while it is being sent
+        params = ProductSeekQuerySerializer(
+            data=request.query_params, context={"orderings": STREAM_ORDERINGS}
+        )
+        params.is_valid(raise_exception=True)
+        ordering = STREAM_ORDERINGS[params.validated_data["ordering"]]
+        chunks = keyset_chunks(
+            walk_rows(ordering),
+            ordering,
+            getattr(settings, "PRODUCT_STREAM_CHUNK_SIZE", 1000),
+            params.validated_data.get("after"),
+        )
+        from_values = compiled(ProductSerializer).from_values
+
+        def lines():
+            for chunk in chunks:
+                yield "".join(
+                    json.dumps(from_values(row), cls=JSONEncoder) + "\n"
+                    for row in chunk
+                )
+
+        return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
@@ -59,7 +59,7 @@ class ProductStockManagementSerializerSerializer(serializers.ModelSerializer):
 
 
 class ProductStockSerializer(serializers.ModelSerializer):
-    stock = ProductStockManagementSerializerSerializer()
+    stock = ProductStockManagementSerializerSerializer(source="stockmanagement")
 
     class Meta:
         model = Product
@@ -1,8 +1,17 @@
 # views.py
+from core.conditional import conditional
+from core.renderers import NormalizedResponseMixin
+from core.serializers import compiled, normalized
 from django.db import connection
 from django.db.models import F
 from drf_spectacular.utils import extend_schema
-from inventory.models import Category, Product, StockManagement
+from inventory.models import (
+    Category,
+    Product,
+    ProductPromotionEvent,
+    PromotionEvent,
+    StockManagement,
+)
 from rest_framework import viewsets
 from rest_framework.response import Response
 
@@ -22,11 +31,16 @@ from .serializers import (
 @extend_schema(
     tags=["Module 7 - Inner Join"],
 )
-class ProductCategoryViewSet(viewsets.ViewSet):
+class ProductCategoryViewSet(NormalizedResponseMixin, viewsets.ViewSet):
     """
     Demonstrates the use of Inner Join for One-to-Many relationships.
+
+    ``Accept: application/vnd.normalized+json`` (or ``?format=normalized``)
+    returns ``{"results": [...], "categories": {id: {...}}}`` instead:
+    products carry the category id and each category is serialized once.
     """
 
+    @conditional(Product, Category)
     def list(self, request):
         # Ex1 Return all data from both product and category
         # products = Product.objects.all()
@@ -37,8 +51,17 @@ class ProductCategoryViewSet(viewsets.ViewSet):
         #     "category"
         # )
 
+        if self.normalized:
+            products_data = normalized(
+                ProductSerializer, category="categories"
+            ).serialize(products)
+            return Response(products_data)
+
         # Serialize data to return response
-        products_data = ProductSerializer(products, many=True).data
+        # products_data = ProductSerializer(products, many=True).data
+
+        # Same output, built straight from one joined values_list() query
+        products_data = compiled(ProductSerializer).serialize(products)
 
         return Response(products_data)
 
@@ -56,6 +79,7 @@ class ReturnWithValuesViewSet(viewsets.ViewSet):
     Demonstrates the use of Values.
     """
 
+    @conditional(Product, Category)
     def list(self, request):
         # Ex1
         products = Product.objects.select_related("category").values(
@@ -73,17 +97,27 @@ class ReturnWithValuesViewSet(viewsets.ViewSet):
 @extend_schema(
     tags=["Module 7 - Inner Join"],
 )
-class ReturnWithOnlyViewSet(viewsets.ViewSet):
+class ReturnWithOnlyViewSet(NormalizedResponseMixin, viewsets.ViewSet):
     """
     Demonstrates the use of Only
+
+    Side-loads the categories with ``Accept: application/vnd.normalized+json``,
+    as ``ProductCategoryViewSet`` does.
     """
 
+    @conditional(Product, Category)
     def list(self, request):
         # Ex1
         products = Product.objects.select_related("category").only(
             "id", "name", "category__name"
         )
 
+        if self.normalized:
+            products_data = normalized(
+                ProductSerializer, category="categories"
+            ).serialize(products)
+            return Response(products_data)
+
         # Serialize data to return response
         products_data = ProductSerializer(products, many=True).data
 
@@ -103,6 +137,7 @@ class AnnotateReturnWithValuesViewSet(viewsets.ViewSet):
     Demonstrates the use of Values.
     """
 
+    @conditional(Product, Category)
     def list(self, request):
         # Ex1
         products = (
@@ -127,6 +162,7 @@ class RevProductCategoryViewSet(viewsets.ViewSet):
     Demonstrates the use of Inner Join for One-to-Many relationships.
     """
 
+    @conditional(Category, Product)
     def list(self, request):
         # Ex1 Return all data from both product and category
         category = Category.objects.prefetch_related("products")
@@ -150,11 +186,14 @@ class RevValuesProductCategoryViewSet(viewsets.ViewSet):
     Demonstrates the use of Inner Join for One-to-Many relationships and `.values()`.
     """
 
+    @conditional(Category, Product)
     def list(self, request):
         # Fetch all product data for categories, including category name and product name
+        # Categories without products are skipped through the maintained
+        # counters instead of .filter(products__isnull=False)
         categories_data = (
             Category.objects.filter(is_active=True)
-            .filter(products__isnull=False)
+            .with_products()
             .values(
                 "id",
                 "name",
@@ -177,15 +216,25 @@ class RevValuesProductCategoryViewSet(viewsets.ViewSet):
 @extend_schema(
     tags=["Module 7 - Inner Join"],
 )
-class StockManagementViewSet(viewsets.ViewSet):
+class StockManagementViewSet(NormalizedResponseMixin, viewsets.ViewSet):
     """
     Demonstrates the use of Inner Join for One-to-One relationships.
+
+    Side-loads the products under ``products`` with
+    ``Accept: application/vnd.normalized+json``.
     """
 
+    @conditional(StockManagement, Product)
     def list(self, request):
         # Ex1 Return all data from both stock management and products
         stock = StockManagement.objects.select_related("product")
 
+        if self.normalized:
+            stock_data = normalized(
+                StockManagementSerializer, product="products"
+            ).serialize(stock)
+            return Response(stock_data)
+
         # Serialize data to return response
         stock_data = StockManagementSerializer(stock, many=True).data
 
@@ -200,14 +249,28 @@ class StockManagementViewSet(viewsets.ViewSet):
 @extend_schema(
     tags=["Module 7 - Inner Join"],
 )
-class RevStockManagementViewSet(viewsets.ViewSet):
+class RevStockManagementViewSet(NormalizedResponseMixin, viewsets.ViewSet):
     """
     Demonstrates the use of Inner Join for One-to-One relationships.
+
+    Side-loads the stock records under ``stock`` with
+    ``Accept: application/vnd.normalized+json``.
     """
 
+    @conditional(Product, StockManagement)
     def list(self, request):
         # Ex1 Return all data from both stock management and products
-        product = Product.objects.filter(stock__isnull=False).select_related("stock")
+        # product = Product.objects.filter(stock__isnull=False).select_related("stock")
+        # The reverse one-to-one is named after the model: "stockmanagement"
+        product = Product.objects.filter(stockmanagement__isnull=False).select_related(
+            "stockmanagement"
+        )
+
+        if self.normalized:
+            product_data = normalized(ProductStockSerializer, stock="stock").serialize(
+                product
+            )
+            return Response(product_data)
 
         # Serialize data to return response
         product_data = ProductStockSerializer(product, many=True).data
@@ -228,6 +291,7 @@ class RawSQLProductCategoryViewSet(viewsets.ViewSet):
     Demonstrates the use of Inner Join using Raw SQL.
     """
 
+    @conditional(Product, Category)
     def list(self, request):
         # Write a raw SQL query to simulate an INNER JOIN
         query = """
@@ -263,6 +327,7 @@ class RawQuerySetProductCategoryViewSet(viewsets.ViewSet):
     Demonstrates the use of Inner Join using Raw SQL.
     """
 
+    @conditional(Product, Category)
     def list(self, request):
         # Write a raw SQL query to simulate an INNER JOIN
         query = """
@@ -288,18 +353,29 @@ class RawQuerySetProductCategoryViewSet(viewsets.ViewSet):
 @extend_schema(
     tags=["Module 7 - Reverse Inner Join"],
 )
-class ProductPromotionEventViewSet(viewsets.ViewSet):
+class ProductPromotionEventViewSet(NormalizedResponseMixin, viewsets.ViewSet):
     """
     Demonstrates INNER JOIN between Product and PromotionEvent.
     This view set returns a list of products with their related promotion events.
+
+    With ``Accept: application/vnd.normalized+json`` each product's
+    promotion events hold the event id, and the events are side-loaded once
+    under ``promotion_events``.
     """
 
+    @conditional(Product, ProductPromotionEvent, PromotionEvent)
     def list(self, request):
         # Perform an inner join between Product and PromotionEvent using prefetch_related
         products_with_promotions = Product.objects.prefetch_related(
             "productpromotionevent_set__promotion_event"
         ).filter(productpromotionevent__promotion_event__isnull=False)
 
+        if self.normalized:
+            products_data = normalized(
+                ProductPromotionSerializer, promotion_event="promotion_events"
+            ).serialize(products_with_promotions)
+            return Response(products_data)
+
         # # Serialize the product data with promotion events
         # products_data = []
         # for product in products_with_promotions: